@@ -0,0 +1,298 @@
+"""
+Agent Shards - Session-affinity process pool for agent execution
+The API process hashes session_id to one of N worker processes that own those sessions' agents and state
+"""
+
+import os
+import time
+import atexit
+import zlib
+import asyncio
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from types import GeneratorType
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+AGENT_SHARDS = int(os.getenv("AGENT_SHARDS", "0"))                # 0 = run agents in the API process
+AGENT_SHARD_THREADS = int(os.getenv("AGENT_SHARD_THREADS", "8"))  # Sessions a shard runs at once (LLM/tool waits)
+
+SHARD_REQUESTS = REGISTRY.counter("agent_shard_requests_total", "Requests sent to agent shards", ("op",))
+SHARD_ROUNDTRIP = REGISTRY.histogram("agent_shard_roundtrip_seconds", "Shard request time including agent work", ("op",))
+SHARD_RESTARTS = REGISTRY.counter("agent_shard_restarts_total", "Agent shard processes restarted after dying")
+
+class ShardUnavailable(Exception):
+    """The shard owning the session died while handling the request"""
+    pass
+
+class ShardError(Exception):
+    """The agent raised inside the shard"""
+    pass
+
+def shard_for(session_id: str, shards: int) -> int:
+    """Stable session → shard mapping (hash() is randomized per process)"""
+    return zlib.crc32(session_id.encode("utf-8")) % shards
+
+# ============================================================================
+# SHARD HOSTS - run inside the worker process
+# ============================================================================
+
+class EnhancedShardHost:
+    """EnhancedAIAgent sessions; snapshots (and their summary index rows) go to SQLite after each turn
+
+    A restarted shard resumes them, and the API process lists sessions from the same table.
+    """
+
+    def __init__(self, config, index: int, shards: int):
+        from session_store import SessionStore, SQLiteSessionBackend, SESSION_DB
+        self.store = SessionStore(SQLiteSessionBackend(SESSION_DB), lambda: config)
+
+    def op_turn(self, session_id: str, message: str, fields: tuple = ()) -> Dict[str, Any]:
+        with self.store.session(session_id) as agent:
+            return {"response": agent.run(message), "stats": agent.get_stats_json(fields) if fields else None}
+
+    def op_stats(self, session_id: str, fields: tuple) -> Optional[Tuple[str, str]]:
+        """(serialized stats, etag), cached in this shard until the session's next turn"""
+        agent = self.store.get(session_id)
+        return agent.get_stats_json(fields) if agent else None
+
+    def op_timing(self, session_id: str) -> Optional[list]:
+        agent = self.store.get(session_id)
+        return list(agent.turn_timings) if agent else None
+
+    def op_reset(self, session_id: str) -> bool:
+        return self.store.reset(session_id)
+
+    def op_configure(self, session_id: str, updates: Dict[str, Any]) -> bool:
+        with self.store.session(session_id, create=False) as agent:
+            if agent is None:
+                return False
+            agent.configure(**updates)
+            return True
+
+class LangGraphShardHost:
+    """One LangGraphAgent per shard; threads live in the (shared) SQLite checkpointer"""
+
+    def __init__(self, config, index: int, shards: int):
+        from full_langgraph_agent import LangGraphAgent, project_state
+        self.agent = LangGraphAgent(config)
+        self.project = project_state
+
+    def op_turn(self, session_id: str, message: str, fields: tuple = ()) -> Dict[str, Any]:
+        # Only the requested state keys cross the pipe
+        state = self.agent.run_turn(message, session_id)
+        return {"response": state["final_response"], "node": state.get("current_node"),
+                "state": self.project(state, fields) if fields else None}
+
+    def op_stream(self, session_id: str, message: str):
+        yield from self.agent.stream_sync(message, session_id)
+
+    def op_state(self, session_id: str, fields: tuple = None) -> Dict[str, Any]:
+        return self.project(self.agent.get_state(session_id), fields)
+
+    def op_reset(self, session_id: str) -> bool:
+        self.agent.reset_session(session_id)
+        return True
+
+    def op_graph(self, _session_id=None) -> Dict[str, Any]:
+        return self.agent.get_graph_info()
+
+HOSTS = {"enhanced": EnhancedShardHost, "langgraph": LangGraphShardHost}
+
+def _shard_main(index: int, shards: int, conn, kind: str, config, threads: int):
+    """Worker process: per-session FIFO queues drained by a thread pool
+
+    Turns of one session run strictly in arrival order; different sessions
+    run concurrently on the pool.
+    """
+    host = HOSTS[kind](config, index, shards)
+    send_lock = threading.Lock()
+    queues: Dict[Any, deque] = {}
+    queues_lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f"shard{index}")
+
+    def reply(request_id: int, kind: str, payload):
+        with send_lock:
+            conn.send((request_id, kind, payload))
+
+    def handle(request_id: int, op: str, session_id, args: tuple):
+        try:
+            result = getattr(host, f"op_{op}")(session_id, *args)
+            if isinstance(result, GeneratorType):
+                for event in result:
+                    reply(request_id, "event", event)
+                result = None
+            reply(request_id, "result", result)
+        except Exception as e:
+            reply(request_id, "error", f"{type(e).__name__}: {e}")
+
+    def drain(session_id):
+        while True:
+            with queues_lock:
+                queue = queues[session_id]
+                if not queue:
+                    del queues[session_id]
+                    return
+                request = queue.popleft()
+            handle(*request)
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        request_id, op, session_id, args = message
+        if session_id is None:  # Shard-wide ops (listing, graph info) need no ordering
+            executor.submit(handle, request_id, op, None, args)
+            continue
+        with queues_lock:
+            queue = queues.get(session_id)
+            idle = queue is None
+            if idle:
+                queue = queues[session_id] = deque()
+            queue.append((request_id, op, session_id, args))
+        if idle:
+            executor.submit(drain, session_id)
+
+    executor.shutdown(wait=True)
+
+# ============================================================================
+# POOL - runs in the API process
+# ============================================================================
+
+class _Shard:
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.pending: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = {}
+
+class ShardPool:
+    """N agent worker processes; requests for a session always go to the same one
+
+    IPC is a multiprocessing Pipe per shard (pickled tuples). A reader thread
+    per shard hands replies back to the event loop; when a shard dies, its
+    in-flight requests fail with ShardUnavailable and it is respawned - the
+    new process recovers sessions from the same persistent store.
+    """
+
+    def __init__(self, kind: str, shards: int, config, threads: int = AGENT_SHARD_THREADS):
+        if kind not in HOSTS:
+            raise ValueError(f"Unknown shard kind: {kind} (known: {', '.join(HOSTS)})")
+        self.kind = kind
+        self.size = shards
+        # Pickled by value: a factory would be pickled by reference and make every shard
+        # import its module (the whole server app) just to build a config
+        self.config = config
+        self.threads = threads
+        self.context = multiprocessing.get_context("spawn")  # No forking a process that runs an event loop
+        self.shards: List[Optional[_Shard]] = [None] * shards
+        self.request_ids = itertools.count(1)
+        self.closing = False
+
+    def start(self):
+        for index in range(self.size):
+            self._spawn(index)
+        atexit.register(self.close)  # Runs before multiprocessing reaps daemons, so nothing respawns
+        print(f"🧩 Agent shards: {self.size} {self.kind} worker processes")
+
+    def _spawn(self, index: int):
+        parent, child = self.context.Pipe()
+        process = self.context.Process(
+            target=_shard_main, name=f"agent-shard-{index}", daemon=True,
+            args=(index, self.size, child, self.kind, self.config, self.threads)
+        )
+        process.start()
+        child.close()
+        shard = self.shards[index] = _Shard(index, process, parent)
+        threading.Thread(target=self._read_replies, args=(shard,), name=f"shard{index}-reader", daemon=True).start()
+
+    def _read_replies(self, shard: _Shard):
+        while True:
+            try:
+                request_id, kind, payload = shard.conn.recv()
+            except (EOFError, OSError):
+                break
+            waiter = shard.pending.get(request_id)
+            if waiter is not None:
+                loop, queue = waiter
+                loop.call_soon_threadsafe(queue.put_nowait, (kind, payload))
+
+        # The process exited (crash, OOM kill): fail what it held, then replace it
+        shard.process.join(timeout=1)
+        for loop, queue in list(shard.pending.values()):
+            loop.call_soon_threadsafe(queue.put_nowait, ("lost", None))
+        if not self.closing:
+            SHARD_RESTARTS.inc()
+            print(f"⚠️ Agent shard {shard.index} exited ({shard.process.exitcode}); restarting")
+            self._spawn(shard.index)
+
+    async def _request(self, index: int, op: str, session_id: Optional[str], args: tuple):
+        """Yield ("event", payload)... then ("result", payload) for one request"""
+        shard = self.shards[index]
+        request_id = next(self.request_ids)
+        queue: asyncio.Queue = asyncio.Queue()
+        shard.pending[request_id] = (asyncio.get_running_loop(), queue)
+        SHARD_REQUESTS.labels(op).inc()
+        start = time.perf_counter()
+        try:
+            try:
+                with shard.send_lock:
+                    shard.conn.send((request_id, op, session_id, args))
+            except (OSError, ValueError):
+                raise ShardUnavailable(f"Agent shard {index} is restarting")
+            while True:
+                kind, payload = await queue.get()
+                if kind == "error":
+                    raise ShardError(payload)
+                if kind == "lost":
+                    raise ShardUnavailable(f"Agent shard {index} died during {op}")
+                yield kind, payload
+                if kind == "result":
+                    return
+        finally:
+            shard.pending.pop(request_id, None)
+            SHARD_ROUNDTRIP.labels(op).observe(time.perf_counter() - start)
+
+    async def _call_shard(self, index: int, op: str, session_id: Optional[str], args: tuple):
+        result = None
+        async for kind, payload in self._request(index, op, session_id, args):
+            if kind == "result":
+                result = payload
+        return result
+
+    async def call(self, session_id: str, op: str, *args):
+        """Run host.op_<op>(session_id, *args) on the session's shard"""
+        return await self._call_shard(shard_for(session_id, self.size), op, session_id, args)
+
+    async def stream(self, session_id: str, op: str, *args):
+        """Yield the events of a generator op (e.g. graph streaming) as the shard produces them"""
+        async for kind, payload in self._request(shard_for(session_id, self.size), op, session_id, args):
+            if kind == "event":
+                yield payload
+
+    async def broadcast(self, op: str, *args) -> list:
+        """Run a shard-wide op on every shard; results in shard order"""
+        return await asyncio.gather(*(self._call_shard(index, op, None, args) for index in range(self.size)))
+
+    def close(self, timeout: float = 10.0):
+        if self.closing:
+            return
+        self.closing = True
+        for shard in self.shards:
+            try:
+                with shard.send_lock:
+                    shard.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for shard in self.shards:
+            shard.process.join(timeout)
+            if shard.process.is_alive():
+                shard.process.terminate()
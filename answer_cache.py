@@ -0,0 +1,298 @@
+"""
+Answer Cache - Two-tier cache for general-question LLM answers
+Exact match on normalized text, then nearest neighbour over hashing-vector embeddings (NumPy), LRU-bounded
+"""
+
+import os
+import re
+import time
+import zlib
+import sqlite3
+import threading
+import importlib.util
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List
+
+from metrics import REGISTRY, record_cache
+
+# Optional: NumPy for the semantic tier - only located here; importing it costs more than the
+# whole agent module, so it is loaded when the first cache is built (see _numpy)
+HAS_NUMPY = importlib.util.find_spec("numpy") is not None
+if not HAS_NUMPY:
+    print("NumPy not installed - answer cache uses exact matching only. Run: pip install numpy")
+np = None
+
+def _numpy():
+    """Import NumPy on first use (module global np afterwards)"""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+# ============================================================================
+# SETTINGS
+# ============================================================================
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2048"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.9"))   # Cosine similarity for a semantic hit
+ANSWER_CACHE_DB = os.getenv("ANSWER_CACHE_DB", "")                           # SQLite path; empty = memory only
+EMBEDDING_DIM = 512
+
+ANSWER_CACHE_HITS = REGISTRY.counter("answer_cache_hits_total", "Answer cache hits by tier", ("tier",))
+TOKENS_SAVED = REGISTRY.counter("answer_cache_tokens_saved_total", "LLM tokens not spent thanks to the answer cache", ("model",))
+
+# ============================================================================
+# NORMALIZATION AND EMBEDDING
+# ============================================================================
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_SPACES = re.compile(r"\s+")
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+
+# Filler only; pronouns, question words and everything in GUARD_WORDS are kept
+STOPWORDS = frozenset({"the", "a", "an", "so", "of", "to", "it", "please", "really", "just"})
+
+# Words that flip or re-time a question ("should I (not) buy", "who was/is"): a semantic
+# hit needs exactly the same ones, as do numbers ("10" vs "100 miles")
+NEGATIONS = frozenset({"not", "no", "never", "nor", "none", "nothing", "without"})
+AUXILIARIES = frozenset({"is", "are", "was", "were", "be", "been", "am", "do", "does", "did", "have", "has",
+                         "had", "will", "would", "shall", "should", "can", "could", "may", "might", "must"})
+GUARD_WORDS = NEGATIONS | AUXILIARIES
+
+_CONTRACTIONS = [
+    (re.compile(r"\bcan't\b"), "can not"),
+    (re.compile(r"\bwon't\b"), "will not"),
+    (re.compile(r"n't\b"), " not"),
+    (re.compile(r"\b(what|who|where|when|how|that|there|it|he|she)'s\b"), r"\1 is"),
+]
+
+def _words(normalized: str) -> List[str]:
+    for pattern, replacement in _CONTRACTIONS:
+        normalized = pattern.sub(replacement, normalized)
+    return [word for word in normalized.replace("'", " ").split() if word not in STOPWORDS]
+
+def _is_guard(word: str) -> bool:
+    return word in GUARD_WORDS or any(char.isdigit() for char in word)
+
+def guard_terms(normalized: str) -> tuple:
+    """Negations, auxiliaries and numbers of a question; near-duplicates must agree on these"""
+    return tuple(sorted(word for word in _words(normalized) if _is_guard(word)))
+
+def _features(normalized: str) -> List[tuple]:
+    """(feature, weight): words, their bigrams, and character trigrams of non-guard words
+
+    Trigrams dominate so a typo ("teh") keeps most of a word's weight while a
+    different word ("red" vs "blue") loses all of it. Guard words and numbers
+    get no trigrams - "10" and "100" must not look alike.
+    """
+    words = _words(normalized)
+    features = [(word, 0.5) for word in words]
+    features += [(f"{first} {second}", 0.5) for first, second in zip(words, words[1:])]
+    for word in words:
+        if _is_guard(word):
+            continue
+        padded = f"<{word}>"
+        features += [(padded[index:index + 3], 1.0) for index in range(len(padded) - 2)]
+    return features
+
+def embed(normalized: str, dim: int = EMBEDDING_DIM):
+    """Signed feature hashing into a unit-length float32 vector"""
+    _numpy()
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(normalized):
+        hashed = zlib.crc32(feature.encode("utf-8"))
+        vector[hashed % dim] += weight if hashed & 0x80000000 else -weight
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class SemanticAnswerCache:
+    """LRU answer cache: dict for exact hits, embedding matrix for near-duplicates"""
+
+    def __init__(self, model: str, capacity: int = ANSWER_CACHE_SIZE, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 db_path: str = ANSWER_CACHE_DB, dim: int = EMBEDDING_DIM):
+        self.model = model
+        self.capacity = capacity
+        self.threshold = threshold
+        self.dim = dim
+        self.lock = threading.Lock()
+
+        # key -> slot, least recently used first; slots index the parallel arrays below
+        self.slots: "OrderedDict[str, int]" = OrderedDict()
+        self.keys: List[Optional[str]] = [None] * capacity
+        self.answers: List[Optional[str]] = [None] * capacity
+        self.tokens: List[int] = [0] * capacity
+        self.guards: List[tuple] = [()] * capacity
+        self.free = list(range(capacity - 1, -1, -1))
+        self.matrix = None
+        if HAS_NUMPY:
+            _numpy()
+            self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+
+        self.exact_hits = self.semantic_hits = self.misses = 0
+        self.tokens_saved = 0
+
+        self.db = None
+        if db_path:
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.execute("""CREATE TABLE IF NOT EXISTS answer_cache (
+                model TEXT, key TEXT, answer TEXT, tokens INTEGER, created REAL, PRIMARY KEY (model, key))""")
+            self._load()
+
+    def _load(self):
+        rows = self.db.execute(
+            "SELECT key, answer, tokens FROM answer_cache WHERE model = ? ORDER BY created DESC LIMIT ?",
+            (self.model, self.capacity)
+        ).fetchall()
+        for key, answer, tokens in reversed(rows):  # Oldest first so LRU order is preserved
+            self._store(key, answer, tokens)
+
+    def _store(self, key: str, answer: str, tokens: int) -> Optional[str]:
+        """Insert or refresh an entry; returns the evicted key, if any"""
+        evicted = None
+        slot = self.slots.get(key)
+        if slot is None:
+            if not self.free:
+                evicted, slot = self.slots.popitem(last=False)
+            else:
+                slot = self.free.pop()
+            self.slots[key] = slot
+            self.keys[slot] = key
+            if self.matrix is not None:
+                self.matrix[slot] = embed(key, self.dim)
+                self.guards[slot] = guard_terms(key)
+        else:
+            self.slots.move_to_end(key)
+        self.answers[slot] = answer
+        self.tokens[slot] = tokens
+        return evicted
+
+    def _hit(self, key: str, slot: int, tier: str) -> str:
+        self.slots.move_to_end(key)
+        tokens = self.tokens[slot]
+        self.tokens_saved += tokens
+        ANSWER_CACHE_HITS.labels(tier).inc()
+        TOKENS_SAVED.labels(self.model).inc(tokens)
+        record_cache("answer", True)
+        return self.answers[slot]
+
+    def get(self, question: str) -> Optional[str]:
+        """Cached answer for this question or a near-duplicate of it"""
+        key = normalize(question)
+        with self.lock:
+            slot = self.slots.get(key)
+            if slot is not None:
+                self.exact_hits += 1
+                return self._hit(key, slot, "exact")
+
+            if self.matrix is not None and self.slots:
+                scores = self.matrix @ embed(key, self.dim)
+                guards = guard_terms(key)
+                candidates = np.flatnonzero(scores >= self.threshold)
+                for slot in candidates[np.argsort(-scores[candidates])]:
+                    slot = int(slot)
+                    if self.keys[slot] is not None and self.guards[slot] == guards:
+                        self.semantic_hits += 1
+                        return self._hit(self.keys[slot], slot, "semantic")
+
+            self.misses += 1
+        record_cache("answer", False)
+        return None
+
+    def put(self, question: str, answer: str, tokens: int = 0):
+        """Remember an answer and the tokens it cost"""
+        key = normalize(question)
+        if not key:
+            return
+        with self.lock:
+            evicted = self._store(key, answer, tokens)
+            if self.db is not None:
+                if evicted is not None:
+                    self.db.execute("DELETE FROM answer_cache WHERE model = ? AND key = ?", (self.model, evicted))
+                self.db.execute("INSERT OR REPLACE INTO answer_cache VALUES (?, ?, ?, ?, ?)",
+                                (self.model, key, answer, tokens, time.time()))
+                self.db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "model": self.model,
+            "size": len(self.slots),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "semantic": self.matrix is not None,
+            "persistent": self.db is not None,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+        }
+
+# ============================================================================
+# REGISTRY - one cache per model, shared by every session
+# ============================================================================
+
+_caches: Dict[str, SemanticAnswerCache] = {}
+_caches_lock = threading.Lock()
+
+def get_answer_cache(model: str) -> SemanticAnswerCache:
+    cache = _caches.get(model)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(model)
+            if cache is None:
+                cache = _caches[model] = SemanticAnswerCache(model)
+    return cache
+
+def get_answer_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {model: cache.get_stats() for model, cache in list(_caches.items())}
+
+# ============================================================================
+# SELF-CHECK - python answer_cache.py
+# ============================================================================
+
+# Different questions that must not share an answer
+DISTINCT_PAIRS = [
+    ("should I buy bitcoin", "should I not buy bitcoin"),
+    ("should I buy bitcoin", "shouldn't I buy bitcoin"),
+    ("who was the first US president?", "who is the US president?"),
+    ("how long does it take to walk 10 miles", "how long does it take to walk 100 miles"),
+    ("what was the population in 1990", "what was the population in 1999"),
+    ("what is the capital of australia", "what is the capital of austria"),
+    ("why is the sky blue", "why is the sky red"),
+]
+
+# Rephrasings that should hit
+NEAR_DUPLICATE_PAIRS = [
+    ("What is the capital of France?", "what's the capital of france"),
+    ("why is the sky blue", "Why is the sky blue??"),
+    ("how does photosynthesis work", "how does photosynthesis works"),
+    ("What is machine learning?", "what is machine-learning"),
+    ("tell me about the roman empire", "tell me about roman empire"),
+]
+
+if __name__ == "__main__":
+    import sys
+
+    if not HAS_NUMPY:
+        sys.exit("NumPy is required for the semantic tier")
+    failures = 0
+    for pairs, should_hit in ((DISTINCT_PAIRS, False), (NEAR_DUPLICATE_PAIRS, True)):
+        for cached, asked in pairs:
+            cache = SemanticAnswerCache("self-check", capacity=8, db_path="")
+            cache.put(cached, "answer")
+            hit = cache.get(asked) is not None
+            score = float(embed(normalize(cached)) @ embed(normalize(asked)))
+            ok = hit == should_hit
+            failures += not ok
+            print(f"{'✅' if ok else '❌'} {'hit ' if hit else 'miss'} {score:.3f}  {cached!r} / {asked!r}")
+    print(f"\n{failures} unexpected result(s) at threshold {ANSWER_CACHE_THRESHOLD}")
+    sys.exit(1 if failures else 0)
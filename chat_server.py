@@ -3,19 +3,29 @@ Chat Server - FastAPI backend for the AI Agent Chat Interface
 Connects the web interface to the Enhanced AI Agent
 """
 
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Header, Request, WebSocket
+from fastapi.responses import HTMLResponse, StreamingResponse, Response
 from pydantic import BaseModel
-import uvicorn
 import json
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import os
 from datetime import datetime
 
 # Import our enhanced agent
-from enhanced_ai_agent import EnhancedAIAgent, AgentConfig
+from enhanced_ai_agent import AgentConfig, STATS_SECTIONS
+from session_store import create_session_store, SessionStore, SQLiteSessionBackend, SESSION_DB
+from agent_shards import ShardPool, ShardUnavailable, AGENT_SHARDS
+from session_turns import SESSION_TURNS, SessionBusy, get_session_turn_stats
+from resilience import get_resilience_stats
+from single_flight import get_single_flight_stats
+from llm_scheduler import get_scheduler_stats
+from answer_cache import get_answer_cache_stats
+from stage_timing import AGENT_STAGE_TIMER
+from metrics import REGISTRY, install_metrics, render_histogram_family
+from profiling import install_profiling
+from compression import StaticAssets, install_compression, matching_etag
+from chat_socket import ChatSocketHub
 
 app = FastAPI(title="AI Agent Chat Server", version="1.0.0")
 
@@ -23,73 +33,214 @@ app = FastAPI(title="AI Agent Chat Server", version="1.0.0")
 class ChatRequest(BaseModel):
     message: str
     session_id: str = "default"
+    stats: List[str] = None   # Stats sections to return (e.g. ["basic_stats"], ["all"]); none by default
+    stats_etag: str = None    # stats_etag from an earlier reply; unchanged stats are not resent
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
     timestamp: str
     agent_stats: Dict[str, Any] = None
+    stats_etag: str = None
 
-# Global agent instances (in production, use proper session management)
-agent_sessions: Dict[str, EnhancedAIAgent] = {}
+# Default configuration shared by every session (agents copy it on configure)
+_default_config: AgentConfig = None
 
-def get_or_create_agent(session_id: str) -> EnhancedAIAgent:
-    """Get or create agent for session"""
-    if session_id not in agent_sessions:
-        # Setup configuration
+def get_default_config() -> AgentConfig:
+    """Build the shared default configuration once per process"""
+    global _default_config
+    if _default_config is None:
         config = AgentConfig()
         config.openai_api_key = os.getenv("OPENAI_API_KEY", "")
+        config.openai_base_url = os.getenv("OPENAI_BASE_URL", "")
         config.weather_api_key = os.getenv("WEATHER_API_KEY", "")
+        config.tool_backend_url = os.getenv("TOOL_BACKEND_URL", "")
         
         # Disable LLM if no API key (for demo purposes)
         if not config.openai_api_key:
             config.use_llm = False
         
-        agent_sessions[session_id] = EnhancedAIAgent(config)
-    
-    return agent_sessions[session_id]
+        _default_config = config
+    return _default_config
+
+# Session agents; SESSION_BACKEND=sqlite shares them between `uvicorn --workers N` processes.
+# With AGENT_SHARDS=N the agents run in N shard processes instead and this store is only counted.
+agent_sessions = SessionStore(SQLiteSessionBackend(SESSION_DB), get_default_config) if AGENT_SHARDS \
+    else create_session_store(get_default_config)
+shard_pool: ShardPool = None
+
+# A shared (SQLite) store answers reads with queries, which stay off the event loop; memory lookups run inline
+SHARED_STORE = agent_sessions.backend.stores_snapshots
+SESSION_COUNT_INTERVAL = 15.0  # Seconds between background counts of a shared store (live_sessions gauge)
+live_session_count = 0
+
+async def read_store(fn, *args):
+    """Call a session store read, in a thread if it queries a shared store"""
+    if SHARED_STORE:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+async def count_sessions():
+    """Refresh live_session_count so a /metrics scrape never runs SELECT COUNT(*)"""
+    global live_session_count
+    while True:
+        try:
+            live_session_count = await asyncio.to_thread(len, agent_sessions)
+        except Exception as e:
+            print(f"⚠️ Session count failed: {e}")
+        await asyncio.sleep(SESSION_COUNT_INTERVAL)
+
+# Prometheus /metrics (request, session, LLM, cache and loop-lag metrics + agent stages)
+install_metrics(app, lambda: live_session_count if SHARED_STORE else len(agent_sessions))
+install_profiling(app)  # Off unless PROFILING_ENABLED=1
+install_compression(app)  # JSON bodies >= COMPRESS_MIN_BYTES, when the client accepts gzip/br
+
+# Pages served from memory, precompressed once at startup
+static_assets = StaticAssets()
+REGISTRY.add_collector(lambda: render_histogram_family(
+    "agent_stage_duration_seconds", "EnhancedAIAgent.run stage latency",
+    {(stage,): histogram for stage, histogram in list(AGENT_STAGE_TIMER.histograms.items())}, ("stage",)
+))
+
+@app.on_event("startup")
+async def start_agent_shards():
+    """Spawn the session-affinity agent processes (AGENT_SHARDS > 0)"""
+    global shard_pool
+    if AGENT_SHARDS > 0:
+        shard_pool = ShardPool("enhanced", AGENT_SHARDS, get_default_config())
+        shard_pool.start()
+
+@app.on_event("startup")
+async def start_session_count():
+    if SHARED_STORE:
+        app.state.session_count_task = asyncio.create_task(count_sessions())
+
+@app.on_event("shutdown")
+async def stop_agent_shards():
+    if shard_pool:
+        shard_pool.close()
+
+def session_busy(e: SessionBusy) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": f"{e.retry_after:.0f}"})
+
+def stats_fields(requested: Optional[List[str]]) -> Tuple[str, ...]:
+    """Validated stats sections for a request; () = no stats"""
+    if not requested:
+        return ()
+    if "all" in requested:
+        return STATS_SECTIONS
+    unknown = [name for name in requested if name not in STATS_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown stats sections: {', '.join(unknown)} "
+                                                    f"(known: {', '.join(STATS_SECTIONS)}, all)")
+    return tuple(dict.fromkeys(requested))
+
+def local_turn(session_id: str, message: str, fields: Tuple[str, ...]):
+    with agent_sessions.session(session_id) as agent:
+        return agent.run(message), agent.get_stats_json(fields) if fields else None
+
+async def run_turn(session_id: str, message: str, fields: Tuple[str, ...] = ()):
+    """One agent turn in this process or on the session's shard
+
+    Returns (response, stats) where stats is (serialized stats, etag) for the
+    requested sections, or None. Turns of a session wait for the previous one
+    (bounded queue, SessionBusy when full or too slow); other sessions' turns
+    run alongside.
+    """
+    async with SESSION_TURNS.turn(session_id):
+        if shard_pool:
+            result = await shard_pool.call(session_id, "turn", message, fields)
+            return result["response"], result["stats"]
+        return await SESSION_TURNS.offload(local_turn, session_id, message, fields)
+
+def clean_agent_response(response: str) -> str:
+    """Strip the console prefix ("🤖 Agent: ", or an emoji and "Agent: ") from an agent reply"""
+    prefix = "🤖 Agent: "
+    if response.startswith(prefix):
+        return response[len(prefix):]
+    if response.startswith(("🌤️", "🕐", "👋", "❓")):
+        parts = response.split("Agent: ", 1)
+        if len(parts) > 1:
+            return parts[1]
+    return response
+
+async def socket_turn_events(session_id: str, message: str):
+    """/ws turn events; the agent answers in one piece, so that is a single text event"""
+    response, _ = await run_turn(session_id, message)
+    yield {"type": "text", "content": clean_agent_response(response), "is_complete": True}
+
+def socket_status() -> Dict[str, Any]:
+    """Health pushed to /ws clients instead of them polling /health"""
+    return {"status": "healthy", "busy_sessions": get_session_turn_stats()["busy_sessions"],
+            "timestamp": datetime.now().isoformat()}
+
+# Chat over one WebSocket per client (WS_MAX_CONNECTIONS, WS_MAX_SESSIONS per socket, ...)
+chat_sockets = ChatSocketHub(socket_turn_events, socket_status)
+
+def json_with_stats(payload: Dict[str, Any], stats_json: Optional[str]) -> Response:
+    """Append pre-serialized agent stats to a JSON body without re-encoding them"""
+    body = json.dumps(payload)
+    if stats_json is not None:
+        body = body[:-1] + ', "agent_stats": ' + stats_json + "}"
+    return Response(content=body, media_type="application/json")
+
+@app.on_event("startup")
+async def load_static_assets():
+    static_assets.add_file("chat_interface.html")
+    static_assets.add("advanced", ADVANCED_HTML)
 
 @app.get("/", response_class=HTMLResponse)
-async def serve_chat_interface():
-    """Serve the chat interface HTML"""
-    try:
-        with open("chat_interface.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
+async def serve_chat_interface(request: Request):
+    """Serve the chat interface HTML (from memory, with ETag revalidation)"""
+    response = static_assets.response("chat_interface.html", request.headers)
+    if response is None:
         raise HTTPException(status_code=404, detail="Chat interface not found")
+    return response
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
-@app.post("/chat", response_model=ChatResponse)
+@app.get("/resilience")
+async def resilience_stats():
+    """Circuit breaker state, timeouts, hedging, call coalescing and LLM rate-limit queues"""
+    return {"backends": get_resilience_stats(), "single_flight": get_single_flight_stats(),
+            "llm_scheduler": get_scheduler_stats(), "session_turns": get_session_turn_stats(),
+            "timestamp": datetime.now().isoformat()}
+
+@app.get("/chat/answer-cache")
+async def answer_cache_stats():
+    """Hit rates and tokens saved by the shared answer cache, per model"""
+    return {"caches": get_answer_cache_stats(), "timestamp": datetime.now().isoformat()}
+
+@app.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
 async def chat_endpoint(request: ChatRequest):
     """Main chat endpoint"""
     try:
-        # Get agent for this session
-        agent = get_or_create_agent(request.session_id)
+        # Process message with this session's agent (locked and saved by the session store)
+        fields = stats_fields(request.stats)
+        response, stats = await run_turn(request.session_id, request.message, fields)
         
-        # Process message with agent
-        response = agent.run(request.message)
-        
-        # Clean up the response (remove emoji prefix if present)
-        clean_response = response
-        if clean_response.startswith("🤖 Agent: "):
-            clean_response = clean_response[11:]  # Remove "🤖 Agent: "
-        elif clean_response.startswith(("🌤️", "🕐", "👋", "❓")):
-            # Remove emoji and "Agent: " prefix
-            parts = clean_response.split("Agent: ", 1)
-            if len(parts) > 1:
-                clean_response = parts[1]
+        payload = {
+            "response": clean_agent_response(response),
+            "session_id": request.session_id,
+            "timestamp": datetime.now().isoformat()
+        }
+        if stats is None:
+            return payload
         
-        return ChatResponse(
-            response=clean_response,
-            session_id=request.session_id,
-            timestamp=datetime.now().isoformat(),
-            agent_stats=agent.get_enhanced_stats()
-        )
+        # Stats are cached pre-serialized per session version; skip them if the client has this version
+        stats_json, etag = stats
+        payload["stats_etag"] = etag
+        return json_with_stats(payload, None if etag == request.stats_etag else stats_json)
     
+    except HTTPException:
+        raise
+    except SessionBusy as e:
+        raise session_busy(e)
+    except ShardUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=f"Chat processing error: {str(e)}")
@@ -99,15 +250,10 @@ async def chat_stream_endpoint(request: ChatRequest):
     """Streaming chat endpoint for real-time responses"""
     async def generate_response():
         try:
-            agent = get_or_create_agent(request.session_id)
-            
             # For demo, we'll simulate streaming by yielding parts of response
-            response = agent.run(request.message)
+            response, _ = await run_turn(request.session_id, request.message)
             
-            # Clean response
-            clean_response = response
-            if clean_response.startswith("🤖 Agent: "):
-                clean_response = clean_response[11:]
+            clean_response = clean_agent_response(response)
             
             # Simulate streaming by yielding words
             words = clean_response.split()
@@ -141,60 +287,111 @@ async def chat_stream_endpoint(request: ChatRequest):
         headers={"Cache-Control": "no-cache", "Connection": "keep-alive"}
     )
 
+@app.websocket("/ws")
+async def chat_socket(websocket: WebSocket, session_id: str = "default"):
+    """Chat turns, their output and periodic status over one connection (see chat_socket.py for frames)"""
+    await chat_sockets.serve(websocket, session_id)
+
+@app.get("/ws/stats")
+async def chat_socket_stats():
+    """Open WebSocket connections, in-flight turns and limits"""
+    return {**chat_sockets.get_stats(), "timestamp": datetime.now().isoformat()}
+
+def local_stats(session_id: str, sections: Tuple[str, ...]) -> Optional[Tuple[str, str]]:
+    agent = agent_sessions.get(session_id)
+    return agent.get_stats_json(sections) if agent else None
+
+def local_timing(session_id: str) -> Optional[List[Dict[str, Any]]]:
+    agent = agent_sessions.get(session_id)
+    return list(agent.turn_timings) if agent else None
+
 @app.get("/chat/stats/{session_id}")
-async def get_agent_stats(session_id: str):
-    """Get agent statistics for a session"""
-    if session_id not in agent_sessions:
+async def get_agent_stats(session_id: str, fields: str = "all", if_none_match: str = Header(None)):
+    """Get agent statistics for a session (fields=basic_stats,current_state,...; ETag / If-None-Match)"""
+    sections = stats_fields(fields.split(","))
+    if shard_pool:
+        stats = await shard_pool.call(session_id, "stats", sections)
+    else:
+        stats = await read_store(local_stats, session_id, sections)
+    if stats is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    agent = agent_sessions[session_id]
-    return agent.get_enhanced_stats()
+    stats_json, etag = stats
+    matched = matching_etag(if_none_match or "", etag)
+    if matched:
+        return Response(status_code=304, headers={"ETag": matched})  # The tag the client holds, encoded or not
+    return Response(content=stats_json, media_type="application/json", headers={"ETag": etag})
+
+@app.get("/chat/timing")
+async def get_stage_timing(session_id: str = None):
+    """Per-stage latency histograms (p50/p95/p99) for EnhancedAIAgent.run"""
+    timing = AGENT_STAGE_TIMER.snapshot()
+    if session_id:
+        if shard_pool:
+            recent = await shard_pool.call(session_id, "timing")
+        else:
+            recent = await read_store(local_timing, session_id)
+        if recent is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        timing["recent_turns"] = recent
+    return timing
 
 @app.post("/chat/reset/{session_id}")
 async def reset_agent_session(session_id: str):
     """Reset agent session"""
-    if session_id in agent_sessions:
-        # Create new agent instance
-        config = agent_sessions[session_id].config
-        agent_sessions[session_id] = EnhancedAIAgent(config)
+    # New agent instance keeping the session's config (client and knowledge are shared), after queued turns
+    try:
+        async with SESSION_TURNS.turn(session_id):
+            reset = await shard_pool.call(session_id, "reset") if shard_pool \
+                else await SESSION_TURNS.offload(agent_sessions.reset, session_id)
+    except SessionBusy as e:
+        raise session_busy(e)
+    if reset:
         return {"message": "Session reset successfully"}
     else:
         raise HTTPException(status_code=404, detail="Session not found")
 
 @app.get("/chat/sessions")
-async def list_sessions():
-    """List active sessions"""
-    sessions = []
-    for session_id, agent in agent_sessions.items():
-        stats = agent.get_enhanced_stats()
-        sessions.append({
-            "session_id": session_id,
-            "conversation_count": stats["basic_stats"]["conversations"],
-            "session_duration": stats["basic_stats"]["session_duration"],
-            "last_intent": stats["current_state"].get("current_intent"),
-        })
-    return {"sessions": sessions}
+async def list_sessions(limit: int = 50, cursor: str = None, intent: str = None, order: str = "recent"):
+    """List sessions by last activity, a page at a time (pass next_cursor back to continue)"""
+    if order not in ("recent", "oldest"):
+        raise HTTPException(status_code=400, detail="order must be 'recent' or 'oldest'")
+    # Summaries are kept by the session store at the end of each turn (shards write the same SQLite index)
+    try:
+        sessions, next_cursor = await read_store(agent_sessions.summaries, limit, cursor, intent, order == "recent")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"sessions": sessions, "next_cursor": next_cursor}
+
+def local_configure(session_id: str, config_data: dict) -> bool:
+    with agent_sessions.session(session_id, create=False) as agent:
+        if agent is None:
+            return False
+        agent.configure(**config_data)
+        return True
 
 @app.post("/chat/configure/{session_id}")
 async def configure_agent(session_id: str, config_data: dict):
     """Configure agent settings"""
-    if session_id not in agent_sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    agent = agent_sessions[session_id]
-    
     try:
         # Update configuration
-        agent.configure(**config_data)
+        async with SESSION_TURNS.turn(session_id):
+            if shard_pool:
+                found = await shard_pool.call(session_id, "configure", config_data)
+            else:
+                found = await SESSION_TURNS.offload(local_configure, session_id, config_data)
+        if not found:
+            raise HTTPException(status_code=404, detail="Session not found")
         return {"message": "Configuration updated successfully", "config": config_data}
+    except HTTPException:
+        raise
+    except SessionBusy as e:
+        raise session_busy(e)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Configuration error: {str(e)}")
 
 # Enhanced chat interface with more features
-@app.get("/advanced", response_class=HTMLResponse)
-async def serve_advanced_interface():
-    """Serve advanced chat interface with more features"""
-    advanced_html = """
+ADVANCED_HTML = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -251,6 +448,7 @@ async def serve_advanced_interface():
 
     <script>
         let sessionId = 'advanced_' + Date.now();
+        let statsEtag = null;
         
         async function sendMessage() {
             const input = document.getElementById('messageInput');
@@ -264,11 +462,12 @@ async def serve_advanced_interface():
                 const response = await fetch('/chat', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ message, session_id: sessionId })
+                    body: JSON.stringify({ message, session_id: sessionId, stats: ['basic_stats', 'current_state'], stats_etag: statsEtag })
                 });
                 
                 const data = await response.json();
                 addMessage(data.response, 'agent');
+                statsEtag = data.stats_etag;
                 updateStats(data.agent_stats);
             } catch (error) {
                 addMessage('Error: ' + error.message, 'agent');
@@ -341,9 +540,15 @@ async def serve_advanced_interface():
 </body>
 </html>
     """
-    return HTMLResponse(content=advanced_html)
+
+@app.get("/advanced", response_class=HTMLResponse)
+async def serve_advanced_interface(request: Request):
+    """Serve advanced chat interface with more features"""
+    return static_assets.response("advanced", request.headers)
 
 if __name__ == "__main__":
+    import uvicorn
+    
     print("🚀 Starting AI Agent Chat Server...")
     print("📱 Chat Interface: http://localhost:8000")
     print("🔧 Advanced Interface: http://localhost:8000/advanced")
@@ -0,0 +1,200 @@
+"""
+Chat Socket - One WebSocket per client for chat turns, streamed output and pushed status
+Replaces a POST per message plus /health polling; several sessions can share one socket
+"""
+
+import os
+import json
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Dict, Any, Callable, AsyncIterator, Optional, Set
+
+from metrics import REGISTRY
+from session_turns import SessionBusy
+from agent_shards import ShardUnavailable
+
+# ============================================================================
+# SETTINGS
+# ============================================================================
+
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "2000"))    # Per process; more get close code 1013
+WS_MAX_SESSIONS = int(os.getenv("WS_MAX_SESSIONS", "8"))             # Sessions multiplexed over one socket
+WS_MAX_INFLIGHT = int(os.getenv("WS_MAX_INFLIGHT", "4"))             # Unfinished turns per socket
+WS_MAX_MESSAGE_BYTES = int(os.getenv("WS_MAX_MESSAGE_BYTES", "16384"))
+WS_STATUS_INTERVAL = float(os.getenv("WS_STATUS_INTERVAL", "30"))    # Seconds between pushed status events
+
+WS_MESSAGES = REGISTRY.counter("ws_messages_total", "WebSocket frames by direction and type", ("direction", "type"))
+WS_REJECTED = REGISTRY.counter("ws_rejected_total", "WebSocket connections or requests refused by a limit", ("reason",))
+
+# ============================================================================
+# CONNECTION
+# ============================================================================
+
+class _Connection:
+    def __init__(self, connection_id: int, websocket, session_id: str):
+        self.id = connection_id
+        self.websocket = websocket
+        self.session_id = session_id          # Used when a chat frame names no session
+        self.sessions: Set[str] = {session_id}
+        self.turns: Set[asyncio.Task] = set()
+        self.send_lock = asyncio.Lock()        # Turn tasks and the status push share the socket
+        self.open = True
+
+    async def send(self, payload: Dict[str, Any]):
+        if not self.open:
+            return
+        try:
+            async with self.send_lock:
+                await self.websocket.send_text(json.dumps(payload))
+            WS_MESSAGES.labels("out", payload.get("type", "")).inc()
+        except Exception:
+            self.open = False  # Client went away mid-send; the receive loop will notice too
+
+# ============================================================================
+# HUB
+# ============================================================================
+
+class ChatSocketHub:
+    """Protocol and limits for a server's /ws endpoint
+
+    Client frames (JSON):
+      {"type": "chat", "id": 1, "message": "...", "session_id": "optional"}
+      {"type": "ping"}
+    Server frames: hello, then per turn the same events /chat/stream sends
+    (text, node_progress, tool_result) followed by complete or error, each
+    tagged with the request id and session_id; pong; status every
+    WS_STATUS_INTERVAL seconds.
+
+    turn_events(session_id, message) is the server's async generator of
+    event dicts for one turn; status() returns the pushed health payload.
+    """
+
+    def __init__(self, turn_events: Callable[[str, str], AsyncIterator[Dict[str, Any]]],
+                 status: Callable[[], Dict[str, Any]], max_connections: int = WS_MAX_CONNECTIONS,
+                 max_sessions: int = WS_MAX_SESSIONS, max_inflight: int = WS_MAX_INFLIGHT,
+                 status_interval: float = WS_STATUS_INTERVAL):
+        self.turn_events = turn_events
+        self.status = status
+        self.max_connections = max_connections
+        self.max_sessions = max_sessions
+        self.max_inflight = max_inflight
+        self.status_interval = status_interval
+        self.connections: Dict[int, _Connection] = {}
+        self.connection_ids = itertools.count(1)
+        self._status_task: Optional[asyncio.Task] = None
+        REGISTRY.callback_gauge("ws_connections", "Open chat WebSocket connections", lambda: len(self.connections))
+
+    async def serve(self, websocket, session_id: str = "default"):
+        """Run one client connection until it closes"""
+        await websocket.accept()
+        if len(self.connections) >= self.max_connections:
+            WS_REJECTED.labels("connections").inc()
+            await websocket.close(code=1013, reason="Too many connections, retry later")
+            return
+
+        conn = _Connection(next(self.connection_ids), websocket, session_id)
+        self.connections[conn.id] = conn
+        if self._status_task is None:
+            self._status_task = asyncio.create_task(self._push_status())
+        await conn.send({"type": "hello", "connection_id": conn.id, "session_id": session_id,
+                         "limits": {"sessions": self.max_sessions, "inflight": self.max_inflight,
+                                    "message_bytes": WS_MAX_MESSAGE_BYTES},
+                         "status_interval": self.status_interval, **self.status()})
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("text") is not None:
+                    await self._handle(conn, message["text"])
+                else:
+                    WS_MESSAGES.labels("in", "binary").inc()
+                    await conn.send({"type": "error", "status": 400, "detail": "Frames are JSON text, not binary"})
+        finally:
+            conn.open = False
+            del self.connections[conn.id]
+            for task in conn.turns:
+                task.cancel()  # The session gate keeps the session held until a running turn finishes
+
+    async def _handle(self, conn: _Connection, text: str):
+        if len(text.encode("utf-8")) > WS_MAX_MESSAGE_BYTES:
+            WS_REJECTED.labels("message_size").inc()
+            await conn.send({"type": "error", "status": 413, "detail": f"Frame over {WS_MAX_MESSAGE_BYTES} bytes"})
+            return
+        try:
+            frame = json.loads(text)
+            kind = frame["type"]
+        except (ValueError, KeyError, TypeError):
+            await conn.send({"type": "error", "status": 400, "detail": "Frames are JSON objects with a type"})
+            return
+        WS_MESSAGES.labels("in", str(kind)).inc()
+
+        if kind == "ping":
+            await conn.send({"type": "pong", "timestamp": datetime.now().isoformat()})
+            return
+        if kind != "chat":
+            await conn.send({"type": "error", "id": frame.get("id"), "status": 400, "detail": f"Unknown type: {kind}"})
+            return
+
+        request_id = frame.get("id")
+        session_id = str(frame.get("session_id") or conn.session_id)
+        message = frame.get("message")
+        if not isinstance(message, str) or not message.strip():
+            await conn.send({"type": "error", "id": request_id, "session_id": session_id,
+                             "status": 400, "detail": "message is required"})
+            return
+        if session_id not in conn.sessions and len(conn.sessions) >= self.max_sessions:
+            WS_REJECTED.labels("sessions").inc()
+            await conn.send({"type": "error", "id": request_id, "session_id": session_id, "status": 429,
+                             "detail": f"At most {self.max_sessions} sessions per connection"})
+            return
+        if len(conn.turns) >= self.max_inflight:
+            WS_REJECTED.labels("inflight").inc()
+            await conn.send({"type": "error", "id": request_id, "session_id": session_id, "status": 429,
+                             "detail": f"At most {self.max_inflight} unfinished turns per connection"})
+            return
+
+        conn.sessions.add(session_id)
+        task = asyncio.create_task(self._turn(conn, request_id, session_id, message))
+        conn.turns.add(task)
+        task.add_done_callback(conn.turns.discard)
+
+    async def _turn(self, conn: _Connection, request_id, session_id: str, message: str):
+        tag = {"id": request_id, "session_id": session_id}
+        try:
+            async for event in self.turn_events(session_id, message):
+                await conn.send({**event, **tag})
+            await conn.send({"type": "complete", **tag, "timestamp": datetime.now().isoformat()})
+        except SessionBusy as e:
+            await conn.send({"type": "error", **tag, "status": 429, "detail": str(e), "retry_after": e.retry_after})
+        except ShardUnavailable as e:
+            await conn.send({"type": "error", **tag, "status": 503, "detail": str(e)})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = getattr(e, "status_code", 500)  # HTTPException from shared request validation
+            if status >= 500:
+                print(f"WebSocket turn error: {e}")
+            detail = getattr(e, "detail", None) or f"Chat processing error: {str(e)}"
+            await conn.send({"type": "error", **tag, "status": status, "detail": detail})
+
+    async def _push_status(self):
+        """One timer for all connections: replaces each tab polling /health"""
+        try:
+            while self.connections:
+                await asyncio.sleep(self.status_interval)
+                payload = {"type": "status", **self.status(), "connections": len(self.connections)}
+                await asyncio.gather(*(conn.send(payload) for conn in list(self.connections.values())))
+        finally:
+            self._status_task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.connections),
+            "inflight_turns": sum(len(conn.turns) for conn in self.connections.values()),
+            "max_connections": self.max_connections,
+            "max_sessions": self.max_sessions,
+            "max_inflight": self.max_inflight,
+            "status_interval": self.status_interval,
+        }
@@ -0,0 +1,229 @@
+"""
+Compression - Precompressed static pages and size-thresholded JSON response compression
+Pages are encoded once at startup (gzip, plus brotli when installed) and revalidated by ETag; large JSON is compressed per response
+"""
+
+import os
+import gzip
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List
+
+from metrics import REGISTRY
+
+# Optional: brotli compresses HTML/JSON ~15-20% smaller than gzip
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+# ============================================================================
+# SETTINGS
+# ============================================================================
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))  # Smaller bodies gain less than the headers cost
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "5"))              # gzip level for per-request JSON (1-9)
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))              # brotli quality for per-request JSON (0-11)
+
+COMPRESSIBLE_TYPES = ("application/json",)
+
+COMPRESSED_RESPONSES = REGISTRY.counter("http_compressed_responses_total", "Responses sent compressed", ("encoding",))
+COMPRESSION_BYTES = REGISTRY.counter("http_compression_bytes_total", "Body bytes of compressed responses", ("stage",))
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Encodings we can produce that the client accepts, best first (q=0 means refused)"""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    ours = (["br"] if HAS_BROTLI else []) + ["gzip"]
+    return [name for name in ours if offered.get(name, offered.get("*", 0.0)) > 0]
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    """Static assets get maximum compression once; per-request bodies a cheap level"""
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if static else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=9 if static else COMPRESS_LEVEL, mtime=0)
+
+# ============================================================================
+# ETAGS
+# ============================================================================
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of an encoded representation: the identity tag plus a -<encoding> suffix (weakness kept)"""
+    weak, tag = ("W/", etag[2:]) if etag.startswith("W/") else ("", etag)
+    tag = tag.strip('"')
+    return f'{weak}"{tag}-{encoding}"'
+
+def _etag_core(etag: str) -> str:
+    tag = etag.strip()
+    tag = tag[2:] if tag.startswith("W/") else tag
+    tag = tag.strip('"')
+    for encoding in ("gzip", "br"):
+        if tag.endswith("-" + encoding):
+            return tag[:-len(encoding) - 1]
+    return tag
+
+def matching_etag(if_none_match: str, etag: str) -> Optional[str]:
+    """The If-None-Match tag naming any encoding of etag (weak comparison), or None
+
+    Clients send back whichever tag they were given, so a gzip-suffixed tag
+    must revalidate the identity content it was derived from.
+    """
+    core = _etag_core(etag)
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return etag
+        if tag and _etag_core(tag) == core:
+            return tag
+    return None
+
+# ============================================================================
+# STATIC ASSETS
+# ============================================================================
+
+@dataclass
+class StaticAsset:
+    """A page and its precomputed encodings; the ETag is derived from the content"""
+    name: str
+    media_type: str
+    encodings: Dict[str, bytes]  # "identity" / "gzip" / "br" -> body
+    etag: str                    # Content hash; each encoding's ETag adds a suffix
+
+    def etag_for(self, encoding: str) -> str:
+        return f'"{self.etag}"' if encoding == "identity" else encoded_etag(f'"{self.etag}"', encoding)
+
+    def matches(self, if_none_match: str) -> bool:
+        """If-None-Match hit for any representation of this content"""
+        return matching_etag(if_none_match, f'"{self.etag}"') is not None
+
+class StaticAssets:
+    """Pages loaded and compressed once (at startup) and served from memory
+
+    Files are read when added, so edits need a restart (or another add_file).
+    """
+
+    def __init__(self):
+        self.assets: Dict[str, StaticAsset] = {}
+
+    def add(self, name: str, content, media_type: str = "text/html; charset=utf-8") -> StaticAsset:
+        body = content.encode("utf-8") if isinstance(content, str) else content
+        encodings = {"identity": body, "gzip": compress(body, "gzip", static=True)}
+        if HAS_BROTLI:
+            encodings["br"] = compress(body, "br", static=True)
+        asset = StaticAsset(name, media_type, encodings, hashlib.blake2b(body, digest_size=8).hexdigest())
+        self.assets[name] = asset
+        return asset
+
+    def add_file(self, path: str, name: str = None, media_type: str = "text/html; charset=utf-8") -> Optional[StaticAsset]:
+        """Load a file from disk; None (and a warning) if it doesn't exist"""
+        try:
+            with open(path, "rb") as f:
+                return self.add(name or path, f.read(), media_type)
+        except FileNotFoundError:
+            print(f"⚠️ Static asset not found: {path}")
+            return None
+
+    def response(self, name: str, headers: Dict[str, str]):
+        """Best encoding the client accepts, or 304 if it already has this content; None if unknown"""
+        from fastapi.responses import Response
+
+        asset = self.assets.get(name)
+        if asset is None:
+            return None
+        encoding = next((candidate for candidate in accepted_encodings(headers.get("accept-encoding", ""))
+                         if candidate in asset.encodings), "identity")
+        response_headers = {"ETag": asset.etag_for(encoding), "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if asset.matches(headers.get("if-none-match", "")):
+            return Response(status_code=304, headers=response_headers)
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        return Response(content=asset.encodings[encoding], media_type=asset.media_type, headers=response_headers)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: {encoding: len(body) for encoding, body in asset.encodings.items()}
+                for name, asset in self.assets.items()}
+
+# ============================================================================
+# ASGI INTEGRATION
+# ============================================================================
+
+class CompressionMiddleware:
+    """Pure ASGI middleware: compress JSON bodies of at least minimum_size bytes
+
+    Streaming responses (SSE, chunked) and bodies that already carry a
+    Content-Encoding (precompressed assets) pass through untouched. A
+    compressed body's ETag gets the encoding suffix, so it never names the
+    identity bytes; match If-None-Match with matching_etag.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+        encodings = accepted_encodings(accept) if accept else []
+        if not encodings:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Dict[str, Any] = {}
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = {key.lower(): value for key, value in message.get("headers", [])}
+                media_type = headers.get(b"content-type", b"").split(b";")[0].decode("latin-1").strip()
+                passthrough = b"content-encoding" in headers or media_type not in COMPRESSIBLE_TYPES
+                if passthrough:
+                    await send(message)
+                else:
+                    start_message = message  # Held until we know the body
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or small: send as-is
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            encoding = encodings[0]
+            compressed = compress(body, encoding)
+            COMPRESSED_RESPONSES.labels(encoding).inc()
+            COMPRESSION_BYTES.labels("raw").inc(len(body))
+            COMPRESSION_BYTES.labels("wire").inc(len(compressed))
+            headers = [(key, encoded_etag(value.decode("latin-1"), encoding).encode("latin-1"))
+                       if key.lower() == b"etag" else (key, value)
+                       for key, value in start_message.get("headers", []) if key.lower() != b"content-length"]
+            headers += [(b"content-encoding", encoding.encode("latin-1")),
+                        (b"content-length", str(len(compressed)).encode("latin-1")),
+                        (b"vary", b"Accept-Encoding")]
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+def install_compression(app, minimum_size: int = COMPRESS_MIN_BYTES):
+    """Compress large JSON responses of a FastAPI app"""
+    app.add_middleware(CompressionMiddleware, minimum_size=minimum_size)
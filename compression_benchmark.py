@@ -0,0 +1,242 @@
+"""
+Compression Benchmark - Bytes on the wire and handler latency for pages and JSON
+Compares per-request disk reads / inline HTML with precompressed in-memory assets, and identity vs compressed JSON
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+from typing import Dict, Any, List, Callable
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+from compression import StaticAssets, compress, HAS_BROTLI, COMPRESS_MIN_BYTES
+
+ENCODINGS = ["identity", "gzip"] + (["br"] if HAS_BROTLI else [])
+
+# (method, path, body) per server; {sid} is a session warmed up before measuring
+SERVER_REQUESTS = {
+    "chat_server": [
+        ("GET", "/", None),
+        ("GET", "/advanced", None),
+        ("GET", "/chat/stats/{sid}", None),
+        ("POST", "/chat", {"message": "What's the weather in Paris?", "session_id": "{sid}", "stats": ["all"]}),
+        ("POST", "/chat", {"message": "Hello there!", "session_id": "{sid}"}),
+    ],
+    "langgraph_chat_server": [
+        ("GET", "/", None),
+        ("GET", "/agent/state/{sid}", None),
+        ("POST", "/chat", {"message": "find laptops", "session_id": "{sid}", "verbose": True}),
+        ("POST", "/chat", {"message": "Hello there!", "session_id": "{sid}"}),
+    ],
+}
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+    }
+
+def _time(fn: Callable, runs: int) -> Dict[str, float]:
+    fn()  # Warm-up
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _percentiles(samples)
+
+# ============================================================================
+# HANDLER LATENCY (in-process)
+# ============================================================================
+
+def bench_handlers(runs: int) -> Dict[str, Any]:
+    """Page handlers as they were (disk read / inline string per request) vs the asset store"""
+    from fastapi.responses import HTMLResponse
+    from chat_server import ADVANCED_HTML
+
+    assets = StaticAssets()
+    assets.add_file(os.path.join(REPO_DIR, "chat_interface.html"), "chat_interface.html")
+    assets.add("advanced", ADVANCED_HTML)
+    etag = assets.assets["chat_interface.html"].etag_for("gzip")
+
+    def read_from_disk():
+        with open(os.path.join(REPO_DIR, "chat_interface.html"), "r", encoding="utf-8") as f:
+            return HTMLResponse(content=f.read())
+
+    results = {
+        "chat_interface.html": {
+            "disk_read_per_request": _time(read_from_disk, runs),
+            "asset_identity": _time(lambda: assets.response("chat_interface.html", {}), runs),
+            "asset_gzip": _time(lambda: assets.response("chat_interface.html", {"accept-encoding": "gzip, br"}), runs),
+            "asset_304": _time(lambda: assets.response("chat_interface.html", {"if-none-match": etag}), runs),
+        },
+        "advanced": {
+            "inline_html_per_request": _time(lambda: HTMLResponse(content=ADVANCED_HTML), runs),
+            "asset_gzip": _time(lambda: assets.response("advanced", {"accept-encoding": "gzip, br"}), runs),
+        },
+        "asset_sizes": assets.get_stats(),
+    }
+    return results
+
+def bench_json_compression(runs: int) -> Dict[str, Any]:
+    """Per-response compression cost and ratio for real agent stats bodies"""
+    from enhanced_ai_agent import EnhancedAIAgent, AgentConfig, STATS_SECTIONS
+
+    agent = EnhancedAIAgent(AgentConfig(use_llm=False))
+    for message in ["Hi, I'm Sam", "What's the weather in Paris?", "What time is it?", "Tell me about Python"] * 3:
+        agent.run(message)
+    bodies = {
+        "stats_basic": agent.get_stats_json(("basic_stats",))[0].encode("utf-8"),
+        "stats_all": agent.get_stats_json(STATS_SECTIONS)[0].encode("utf-8"),
+    }
+    results = {}
+    for name, body in bodies.items():
+        entry = {"identity_bytes": len(body), "compressed": len(body) >= COMPRESS_MIN_BYTES}
+        for encoding in ENCODINGS[1:]:
+            entry[f"{encoding}_bytes"] = len(compress(body, encoding))
+            entry[f"{encoding}_cost"] = _time(lambda: compress(body, encoding), runs)
+        results[name] = entry
+    return results
+
+# ============================================================================
+# BYTES ON THE WIRE (live server)
+# ============================================================================
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _request(base: str, method: str, path: str, body, headers: Dict[str, str]):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(base + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json", **headers})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.read(), response.headers
+    except urllib.error.HTTPError as e:
+        return e.code, e.read(), e.headers
+
+def bench_wire(server: str, requests: int) -> Dict[str, Any]:
+    """Launch `uvicorn server:app` and measure body bytes and latency per encoding"""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{server}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.perf_counter() + 60
+        while True:
+            try:
+                if _request(base, "GET", "/health", None, {})[0] == 200:
+                    break
+            except OSError:
+                if time.perf_counter() > deadline or proc.poll() is not None:
+                    return {"error": f"{server} did not start"}
+                time.sleep(0.05)
+
+        session_id = f"compression-bench-{os.getpid()}"
+        _request(base, "POST", "/chat", {"message": "Hello, I'm Sam", "session_id": session_id}, {})
+        results = {}
+        for method, path_template, body_template in SERVER_REQUESTS[server]:
+            path = path_template.replace("{sid}", session_id)
+            body = json.loads(json.dumps(body_template).replace("{sid}", session_id)) if body_template else None
+            label = f"{method} {path_template}" + (" " + ",".join(k for k in body_template if k not in ("message", "session_id"))
+                                                   if body_template else "")
+            entry = {}
+            for encoding in ENCODINGS:
+                headers = {} if encoding == "identity" else {"Accept-Encoding": encoding}
+                status, payload, response_headers = _request(base, method, path, body, headers)
+                samples = []
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    _request(base, method, path, body, headers)
+                    samples.append(time.perf_counter() - start)
+                entry[encoding] = {"status": status, "bytes": len(payload),
+                                   "content_encoding": response_headers.get("Content-Encoding"), **_percentiles(samples)}
+                etag = response_headers.get("ETag")
+                if etag and method == "GET" and encoding == ENCODINGS[-1]:
+                    revalidate = {**headers, "If-None-Match": etag}
+                    status, payload, _ = _request(base, method, path, body, revalidate)
+                    samples = []
+                    for _ in range(requests):
+                        start = time.perf_counter()
+                        _request(base, method, path, body, revalidate)
+                        samples.append(time.perf_counter() - start)
+                    entry["revalidated"] = {"status": status, "bytes": len(payload), **_percentiles(samples)}
+            results[label] = entry
+        return results
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+# ============================================================================
+# REPORT
+# ============================================================================
+
+def print_summary(results: Dict[str, Any]):
+    print("🗜️ Compression Benchmark")
+    print("=" * 70)
+    print(f"  brotli: {'available' if HAS_BROTLI else 'not installed (gzip only)'}   "
+          f"JSON threshold: {COMPRESS_MIN_BYTES} bytes")
+    print()
+    print("Handler latency (in-process)")
+    for page, variants in results["handlers"].items():
+        if page == "asset_sizes":
+            continue
+        for variant, timing in variants.items():
+            print(f"  {page:<22} {variant:<26} p50 {timing['p50_ms']:7.3f} ms   p95 {timing['p95_ms']:7.3f} ms")
+    print("  Precompressed sizes: " + "; ".join(
+        f"{name} " + "/".join(f"{encoding} {size}" for encoding, size in sizes.items())
+        for name, sizes in results["handlers"]["asset_sizes"].items()))
+    print()
+    print("JSON compression (per response)")
+    for name, entry in results["json"].items():
+        parts = [f"identity {entry['identity_bytes']}"]
+        for encoding in ENCODINGS[1:]:
+            parts.append(f"{encoding} {entry[f'{encoding}_bytes']} ({entry[f'{encoding}_cost']['p50_ms']:.3f} ms)")
+        flag = "" if entry["compressed"] else "   (below threshold - sent as-is)"
+        print(f"  {name:<14} " + "   ".join(parts) + flag)
+    for server, requests in results.get("wire", {}).items():
+        print()
+        print(f"Bytes on the wire - {server}")
+        if "error" in requests:
+            print(f"  ❌ {requests['error']}")
+            continue
+        for label, entry in requests.items():
+            cells = [f"{variant} {data['bytes']:>6} B {data['p50_ms']:6.2f} ms" for variant, data in entry.items()]
+            print(f"  {label:<34} " + " | ".join(cells))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure wire bytes and handler latency with and without compression")
+    parser.add_argument("--runs", type=int, default=2000, help="iterations per in-process measurement")
+    parser.add_argument("--requests", type=int, default=50, help="HTTP requests per endpoint and encoding")
+    parser.add_argument("--server", choices=list(SERVER_REQUESTS) + ["all"], default="chat_server")
+    parser.add_argument("--skip-server", action="store_true", help="only the in-process measurements")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    results = {"handlers": bench_handlers(args.runs), "json": bench_json_compression(args.runs // 10 or 1), "wire": {}}
+    if not args.skip_server:
+        servers = list(SERVER_REQUESTS) if args.server == "all" else [args.server]
+        for server in servers:
+            results["wire"][server] = bench_wire(server, args.requests)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print_summary(results)
@@ -0,0 +1,220 @@
+"""
+Corpus Generator - Synthetic multi-turn chat traffic for benchmarks and replay
+Streams time-ordered JSONL (request_id/title/body like requests.jsonl) without holding the corpus in memory
+"""
+
+import sys
+import gzip
+import json
+import heapq
+import random
+import string
+import argparse
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterator, List, Tuple
+
+# ============================================================================
+# VOCABULARY
+# ============================================================================
+
+CITIES = ["London", "New York", "Paris", "Tokyo", "Berlin", "Sydney", "Toronto", "Madrid", "Rome", "Seoul"]
+PRODUCTS = ["laptop", "phone", "tablet", "headphones", "monitor", "keyboard", "camera", "smartwatch"]
+
+TEMPLATES: Dict[str, List[str]] = {
+    "greeting": ["Hello!", "Hi there", "Hey, good morning", "Hello, how are you?", "Hi!"],
+    "weather": ["What's the weather in {city}?", "Is it raining in {city}?", "Weather forecast for {city} please",
+                "How hot is it in {city} today?", "What's the temperature in {city}?"],
+    "time": ["What time is it?", "Can you tell me the time?", "What's the current time?"],
+    "location": ["Where is {city}?", "Tell me about {city}", "What's a good place to visit in {city}?"],
+    "search_products": ["Find me a {product}", "Search for a cheap {product}", "I need a new {product}",
+                        "Show me {product} deals", "Any good {product} under $500?"],
+    "user_profile": ["Show my profile", "What's in my account?", "How many loyalty points do I have?"],
+    "help": ["Can you help me?", "What can you do?", "I need some help", "How does this work?"],
+    "question": ["Why is the sky blue?", "How do airplanes fly?", "What is machine learning?",
+                 "Who wrote Hamlet?", "How far is the moon?"],
+    "general": ["That's interesting", "Tell me a joke", "I'm bored", "Thanks for that", "Okay, cool"],
+    "goodbye": ["Goodbye!", "Bye, thanks!", "See you later", "That's all, bye"],
+}
+
+# Appended until a message reaches its sampled length
+FILLERS = ["please", "if you can", "by the way", "thanks", "for my trip next week", "when you get a chance",
+           "I was wondering", "quickly", "for a friend", "as soon as possible"]
+
+DEFAULT_INTENT_WEIGHTS = {
+    "greeting": 1.0, "weather": 2.0, "time": 0.5, "location": 0.5, "search_products": 2.0,
+    "user_profile": 0.5, "help": 0.7, "question": 1.5, "general": 1.0, "goodbye": 0.3,
+}
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+@dataclass
+class CorpusConfig:
+    """Shape of the generated traffic"""
+    sessions: int = 1000
+    intent_weights: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_INTENT_WEIGHTS))
+    session_turns: Tuple[int, int] = (1, 8)        # Turns per session (inclusive range)
+    message_words: Tuple[int, int] = (2, 16)       # Target words per message; templates may be longer
+    cities: List[str] = field(default_factory=lambda: list(CITIES))
+    products: List[str] = field(default_factory=lambda: list(PRODUCTS))
+    typo_rate: float = 0.02                        # Per-word probability of one typo
+    open_with_greeting: float = 0.4                # Chance a session starts with a greeting
+    close_with_goodbye: float = 0.3                # Chance a session ends with a goodbye
+    session_rate: float = 5.0                      # New sessions per second (Poisson)
+    think_time: float = 8.0                        # Mean seconds between a session's turns (exponential)
+    seed: int = 42
+
+# ============================================================================
+# MESSAGE GENERATION
+# ============================================================================
+
+def add_typo(word: str, rng: random.Random) -> str:
+    """Swap, drop, duplicate or replace one character"""
+    if len(word) < 2:
+        return word
+    index = rng.randrange(len(word) - 1)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return word[:index] + word[index + 1] + word[index] + word[index + 2:]
+    if kind == 1:
+        return word[:index] + word[index + 1:]
+    if kind == 2:
+        return word[:index] + word[index] + word[index:]
+    return word[:index] + rng.choice(string.ascii_lowercase) + word[index + 1:]
+
+class MessageGenerator:
+    """Samples intents and renders messages for one config"""
+
+    def __init__(self, config: CorpusConfig, rng: random.Random):
+        self.config = config
+        self.rng = rng
+        unknown = set(config.intent_weights) - set(TEMPLATES)
+        if unknown:
+            raise ValueError(f"Unknown intents: {', '.join(sorted(unknown))} (known: {', '.join(TEMPLATES)})")
+        self.intents = [intent for intent, weight in config.intent_weights.items() if weight > 0]
+        self.weights = [config.intent_weights[intent] for intent in self.intents]
+
+    def sample_intent(self) -> str:
+        return self.rng.choices(self.intents, self.weights)[0]
+
+    def render(self, intent: str) -> str:
+        rng = self.rng
+        text = rng.choice(TEMPLATES[intent]).format(city=rng.choice(self.config.cities),
+                                                    product=rng.choice(self.config.products))
+        target = rng.randint(*self.config.message_words)
+        words = text.split()
+        while len(words) < target:
+            words.extend(rng.choice(FILLERS).split())
+        if self.config.typo_rate > 0:
+            words = [add_typo(word, rng) if rng.random() < self.config.typo_rate else word for word in words]
+        return " ".join(words)
+
+    def session_intents(self) -> List[str]:
+        rng, config = self.rng, self.config
+        turns = rng.randint(*config.session_turns)
+        intents = [self.sample_intent() for _ in range(turns)]
+        if rng.random() < config.open_with_greeting:
+            intents[0] = "greeting"
+        if turns > 1 and rng.random() < config.close_with_goodbye:
+            intents[-1] = "goodbye"
+        return intents
+
+# ============================================================================
+# STREAMING CORPUS
+# ============================================================================
+
+def generate_corpus(config: CorpusConfig) -> Iterator[Dict[str, Any]]:
+    """Yield records ordered by arrival offset
+
+    Sessions start as a Poisson process and space their turns by exponential
+    think times. A heap holds one pending turn per *active* session, so memory
+    is bounded by concurrency, not by corpus size.
+    """
+    rng = random.Random(config.seed)
+    messages = MessageGenerator(config, rng)
+    pending: List[Tuple[float, int, int, List[str]]] = []  # (offset, session, turn, intents)
+    next_start, started, sequence = 0.0, 0, 0
+
+    while started < config.sessions or pending:
+        # Admit every session that starts before the earliest pending turn
+        while started < config.sessions and (not pending or next_start <= pending[0][0]):
+            heapq.heappush(pending, (next_start, started, 0, messages.session_intents()))
+            started += 1
+            next_start += rng.expovariate(config.session_rate) if config.session_rate > 0 else 0.0
+
+        offset, session, turn, intents = heapq.heappop(pending)
+        intent = intents[turn]
+        sequence += 1
+        yield {
+            "request_id": f"conv-{sequence:08d}",
+            "title": intent,
+            "body": messages.render(intent),
+            "session_id": f"session-{session:07d}",
+            "turn": turn,
+            "offset_seconds": round(offset, 4),
+        }
+        if turn + 1 < len(intents):
+            think = rng.expovariate(1.0 / config.think_time) if config.think_time > 0 else 0.0
+            heapq.heappush(pending, (offset + think, session, turn + 1, intents))
+
+def write_corpus(path: str, config: CorpusConfig) -> int:
+    """Stream the corpus to path ('-' for stdout, .gz compressed); returns records written"""
+    if path == "-":
+        out = sys.stdout
+    elif path.endswith(".gz"):
+        out = gzip.open(path, "wt", encoding="utf-8")
+    else:
+        out = open(path, "w", encoding="utf-8")
+
+    count = 0
+    try:
+        for record in generate_corpus(config):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return count
+
+def parse_weights(text: str) -> Dict[str, float]:
+    """'weather=3,greeting=1' -> {'weather': 3.0, 'greeting': 1.0}"""
+    weights = {}
+    for item in filter(None, text.split(",")):
+        intent, _, weight = item.partition("=")
+        weights[intent.strip()] = float(weight or 1)
+    return weights
+
+def parse_range(text: str) -> Tuple[int, int]:
+    low, _, high = text.partition("-")
+    return int(low), int(high or low)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic multi-turn conversation corpus (JSONL)")
+    parser.add_argument("output", help="output path (.jsonl, .jsonl.gz, or - for stdout)")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--intents", help="intent weights, e.g. weather=3,search_products=2,greeting=1")
+    parser.add_argument("--turns", default="1-8", help="turns per session, e.g. 1-8")
+    parser.add_argument("--words", default="2-16", help="target words per message, e.g. 2-16")
+    parser.add_argument("--cities", help="comma-separated city vocabulary")
+    parser.add_argument("--products", help="comma-separated product vocabulary")
+    parser.add_argument("--typo-rate", type=float, default=0.02)
+    parser.add_argument("--session-rate", type=float, default=5.0, help="new sessions per second")
+    parser.add_argument("--think-time", type=float, default=8.0, help="mean seconds between turns")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config = CorpusConfig(
+        sessions=args.sessions, session_turns=parse_range(args.turns), message_words=parse_range(args.words),
+        typo_rate=args.typo_rate, session_rate=args.session_rate, think_time=args.think_time, seed=args.seed
+    )
+    if args.intents:
+        config.intent_weights = parse_weights(args.intents)
+    if args.cities:
+        config.cities = [city.strip() for city in args.cities.split(",")]
+    if args.products:
+        config.products = [product.strip() for product in args.products.split(",")]
+
+    written = write_corpus(args.output, config)
+    if args.output != "-":
+        print(f"📝 Wrote {written} messages from {args.sessions} sessions to {args.output}")
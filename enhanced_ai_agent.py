@@ -6,39 +6,59 @@ Building on the 10 core components with actual AI capabilities
 import json
 import time
 import os
-import requests
-from typing import Dict, List, Any, Optional
+import hashlib
+import importlib.util
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from collections import deque
 
-# Try to import OpenAI - graceful fallback if not available
-try:
-    from openai import OpenAI
-    HAS_OPENAI = True
-except ImportError:
-    HAS_OPENAI = False
+from resilience import get_backend
+from shared_resources import fetch_json, get_openai_client, SHARED_KNOWLEDGE
+from stage_timing import AGENT_STAGE_TIMER
+from metrics import record_llm_call
+from answer_cache import get_answer_cache
+from single_flight import LLM_CALLS, TOOL_CALLS, chat_key, tool_key
+from llm_scheduler import LLM_SCHEDULER, estimate_tokens
+
+# Check for OpenAI without importing it - the SDK is only loaded when a
+# client is first created (see shared_resources.get_openai_client)
+HAS_OPENAI = importlib.util.find_spec("openai") is not None
+if not HAS_OPENAI:
     print("OpenAI not installed. Run: pip install openai")
 
+# Sections of get_enhanced_stats(); stage_timing is process-wide, so it is never cached per session
+STATS_SECTIONS = ("basic_stats", "current_state", "learning_data", "capabilities", "stage_timing")
+CACHED_STATS_SECTIONS = frozenset(STATS_SECTIONS) - {"stage_timing"}
+
 @dataclass
 class AgentConfig:
     """Configuration for the enhanced agent"""
     openai_api_key: str = ""
+    openai_base_url: str = ""  # OpenAI-compatible endpoint (e.g. mock_llm_server.py); empty = api.openai.com
     weather_api_key: str = ""  # Get from openweathermap.org
     model: str = "gpt-3.5-turbo"
     temperature: float = 0.7
     max_tokens: int = 150
     use_llm: bool = True
+    tool_backend_url: str = ""  # Remote tool APIs (e.g. mock_backends.py); empty = in-process mocks
+    answer_cache: bool = True   # Reuse LLM answers to identical/near-identical questions (answer_cache.py)
+    llm_priority: str = ""      # "interactive" / "background" for the LLM scheduler; empty = caller's context
 
 class EnhancedAIAgent:
     """Enhanced AI agent with real LLM and API integration"""
     
+    # Enhanced knowledge base - immutable and shared by every session
+    knowledge = SHARED_KNOWLEDGE
+    
     def __init__(self, config: AgentConfig = None):
+        # Config may be shared across sessions; configure() copies before writing
         self.config = config or AgentConfig()
         
-        # Initialize OpenAI client
-        self.openai_client = None
-        if HAS_OPENAI and self.config.openai_api_key:
-            self.openai_client = OpenAI(api_key=self.config.openai_api_key)
+        # Process-wide OpenAI client (one connection pool for all sessions)
+        self.openai_client = (
+            get_openai_client(self.config.openai_api_key, self.config.openai_base_url) if HAS_OPENAI else None
+        )
         
         # 3. Context Memory - Enhanced with more details
         self.memory = []
@@ -54,45 +74,65 @@ class EnhancedAIAgent:
             "session_start": datetime.now().isoformat()
         }
         
-        # Enhanced knowledge base
-        self.knowledge = {
-            "greeting": ["Hello!", "Hi there!", "Good to see you!", "Welcome!"],
-            "help": "I can help with weather, time, general questions, or just chat! I use AI to understand you better.",
-            "goodbye": ["Goodbye!", "See you later!", "Take care!", "Have a great day!"],
-            "capabilities": "I can check weather, tell time, answer questions using AI, and learn from our conversations."
-        }
+        # Per-stage timings of this session's recent sampled turns
+        self.turn_timings = deque(maxlen=20)
+        
+        # Serialized stats sections, keyed by stats_version (odd while a turn/configure is changing them)
+        self.stats_version = 0
+        self._stats_changed_at = datetime.now()
+        self._stats_cache: Dict[Any, Any] = {}
     
     def run(self, user_input: str) -> str:
         """Enhanced agent loop with LLM integration"""
+        self._stats_changing()
+        try:
+            return self._run_stages(user_input)
+        finally:
+            self._stats_changed()
+    
+    def _run_stages(self, user_input: str) -> str:
+        # Stage timing - None unless this turn is sampled
+        timing = AGENT_STAGE_TIMER.start_turn()
         
         # 1. Input Processing - Enhanced cleaning
         processed_input = self._process_input(user_input)
+        if timing: timing.lap("input_processing")
         
         # 2. Intent Recognition - LLM-powered or rule-based fallback
         intent = self._recognize_intent_llm(processed_input) if self.config.use_llm else self._recognize_intent_rules(processed_input)
+        if timing: timing.lap("intent_recognition")
         
         # 3. Context Memory - Enhanced memory with sentiment
         self._update_memory(user_input, intent, processed_input)
+        if timing: timing.lap("context_memory")
         
         # 4. Decision Making - Enhanced with context awareness
         action = self._make_decision(intent, processed_input)
+        if timing: timing.lap("decision_making")
         
         # 5. Tool Execution - Enhanced with real APIs
         result = self._execute_tool(action, processed_input)
+        if timing: timing.lap("tool_execution")
         
         # 6. Response Generation - LLM-powered responses
         response = self._generate_response_llm(result, intent, processed_input) if self.config.use_llm else self._generate_response_simple(result, intent)
+        if timing: timing.lap("response_generation")
         
         # 7. State Management - Enhanced state updates
         self._update_state(intent, action, processed_input)
+        if timing: timing.lap("state_management")
         
         # 8. Error Handling - Built into each method
         
         # 9. Output Delivery - Enhanced formatting
         final_output = self._deliver_output(response)
+        if timing: timing.lap("output_delivery")
         
         # 10. Learning/Feedback - Enhanced learning with patterns
         self._learn_from_interaction(user_input, intent, response)
+        if timing:
+            timing.lap("learning")
+            self.turn_timings.append({"intent": intent, "action": action, "stages_ms": timing.finish()})
         
         return final_output
     
@@ -141,7 +181,7 @@ Choose from these categories:
 
 Respond with just the category name."""
 
-            response = self.openai_client.chat.completions.create(
+            response = self._chat_completion(
                 model=self.config.model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=10,
@@ -300,6 +340,11 @@ Respond with just the category name."""
             # Extract city from input (simple approach)
             city = self._extract_city(processed_input) or self.state.get("user_location", "London")
             
+            if self.config.tool_backend_url:
+                weather = self._call_tool_backend("weather", "/weather", {"city": city})
+                weather_info = f"The weather in {city} is {weather['condition']} with a temperature of {weather['temperature']}°C"
+                return {"type": "weather", "data": weather_info}
+            
             # Mock weather data - no API calls needed
             mock_weather = {
                 "london": {"temp": 15, "desc": "partly cloudy"},
@@ -322,6 +367,15 @@ Respond with just the category name."""
     def _search_products_api(self, query: str) -> Dict[str, Any]:
         """Mock Product Search API"""
         try:
+            if self.config.tool_backend_url:
+                found = self._call_tool_backend("products", "/products", {"q": query})
+                if not found.get("products"):
+                    return {"type": "products", "data": "Sorry, I couldn't find any products matching your search."}
+                result = f"Found {found['count']} {found['category']}s:\n"
+                for item in found["products"]:
+                    result += f"• {item['name']} - ${item['price']} (⭐{item['rating']})\n"
+                return {"type": "products", "data": result}
+            
             # Mock product database
             products = {
                 "laptop": [
@@ -369,6 +423,9 @@ Respond with just the category name."""
                 "loyalty_points": 1250,
                 "member_since": "2023"
             }
+            if self.config.tool_backend_url:
+                remote = self._call_tool_backend("profile", "/profile", {"user_id": user_name})
+                mock_profile.update({key: remote[key] for key in ("preferences", "purchase_history", "loyalty_points", "member_since")})
             
             result = f"Profile for {mock_profile['name']}:\n"
             result += f"• Loyalty Points: {mock_profile['loyalty_points']}\n"
@@ -382,6 +439,34 @@ Respond with just the category name."""
             print(f"User profile error: {e}")
             return {"type": "profile", "data": "I'm having trouble accessing your profile right now."}
     
+    def _call_tool_backend(self, backend: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a remote tool API under its deadline and circuit breaker"""
+        guard = get_backend(backend)
+        # Identical concurrent lookups from other sessions share one request
+        return TOOL_CALLS.do(
+            (self.config.tool_backend_url, tool_key(backend, path, params)),
+            guard.call, fetch_json, self.config.tool_backend_url, path, params, guard.config.timeout
+        )
+    
+    def _chat_completion(self, **kwargs):
+        """OpenAI chat completion routed through the resilience layer (identical in-flight calls coalesced)"""
+        return LLM_CALLS.do((id(self.openai_client), chat_key(**kwargs)), self._chat_completion_upstream, kwargs)
+    
+    def _chat_completion_upstream(self, kwargs: Dict[str, Any]):
+        # Waits for rate-limit capacity (llm_scheduler.py) before the deadline/breaker clock starts
+        prompt = "".join(str(message.get("content", "")) for message in kwargs.get("messages", []))
+        return LLM_SCHEDULER.call(self._timed_completion, kwargs,
+                                  estimated_tokens=estimate_tokens(prompt, kwargs.get("max_tokens", 0)),
+                                  priority=self.config.llm_priority or None)
+    
+    def _timed_completion(self, kwargs: Dict[str, Any]):
+        # Timed once admitted, so rate-limit queueing isn't counted as LLM latency
+        start = time.perf_counter()
+        # The request itself times out at the deadline, instead of holding a worker for the client's 600s default
+        response = get_backend("openai").call(self.openai_client.chat.completions.create, deadline_arg="timeout", **kwargs)
+        record_llm_call(kwargs.get("model", self.config.model), time.perf_counter() - start, getattr(response, "usage", None))
+        return response
+    
     def _extract_city(self, text: str) -> Optional[str]:
         """Simple city extraction from text"""
         # This is a simplified approach - in production, use NER
@@ -396,8 +481,15 @@ Respond with just the category name."""
         if not self.openai_client:
             return {"type": "question", "data": "I'd like to help answer your question, but I need access to AI capabilities."}
         
+        # Answers depend only on model + question, so they are shared across sessions
+        cache = get_answer_cache(self.config.model) if self.config.answer_cache else None
+        if cache:
+            cached = cache.get(question)
+            if cached is not None:
+                return {"type": "question", "data": cached}
+        
         try:
-            response = self.openai_client.chat.completions.create(
+            response = self._chat_completion(
                 model=self.config.model,
                 messages=[
                     {"role": "system", "content": "You are a helpful AI assistant. Give brief, accurate answers."},
@@ -408,6 +500,9 @@ Respond with just the category name."""
             )
             
             answer = response.choices[0].message.content.strip()
+            if cache and answer:
+                usage = getattr(response, "usage", None)
+                cache.put(question, answer, getattr(usage, "total_tokens", 0) or 0)
             return {"type": "question", "data": answer}
             
         except Exception as e:
@@ -439,7 +534,7 @@ Base response: "{base_response}"
 
 Create a natural, helpful response. Keep it conversational and brief (1-2 sentences max)."""
 
-            response = self.openai_client.chat.completions.create(
+            response = self._chat_completion(
                 model=self.config.model,
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=100,
@@ -564,33 +659,117 @@ Create a natural, helpful response. Keep it conversational and brief (1-2 senten
     # ========================================================================
     # UTILITY METHODS
     # ========================================================================
-    def get_enhanced_stats(self) -> Dict[str, Any]:
-        """Get detailed agent statistics"""
-        return {
-            "basic_stats": {
+    def _stats_changing(self):
+        """Start of a turn/config change: stats read until _stats_changed() are not cached"""
+        self.stats_version += 1
+    
+    def _stats_changed(self):
+        """Invalidate cached stats (end of a turn, config change)"""
+        self.stats_version += 1
+        self._stats_changed_at = datetime.now()
+        self._stats_cache.clear()
+    
+    def _stats_section(self, name: str) -> Any:
+        if name == "basic_stats":
+            return {
                 "conversations": self.state["conversation_count"],
                 "memory_size": len(self.memory),
-                "session_duration": str(datetime.now() - datetime.fromisoformat(self.state["session_start"])),
+                # Up to the last change, so a cached snapshot stays consistent
+                "session_duration": str(self._stats_changed_at - datetime.fromisoformat(self.state["session_start"])),
                 "llm_enabled": bool(self.openai_client)
-            },
-            "current_state": self.state,
-            "learning_data": getattr(self, 'learning_data', {}),
-            "capabilities": {
+            }
+        if name == "current_state":
+            return self.state
+        if name == "learning_data":
+            return getattr(self, 'learning_data', {})
+        if name == "capabilities":
+            return {
                 "weather_api": bool(self.config.weather_api_key),
                 "openai_api": bool(self.openai_client),
                 "memory_size": len(self.memory)
             }
-        }
+        if name == "stage_timing":
+            return {
+                **AGENT_STAGE_TIMER.snapshot(),
+                "recent_turns": list(self.turn_timings)
+            }
+        raise ValueError(f"Unknown stats section: {name} (known: {', '.join(STATS_SECTIONS)})")
+    
+    def get_enhanced_stats(self, fields: Tuple[str, ...] = STATS_SECTIONS) -> Dict[str, Any]:
+        """Get detailed agent statistics (optionally only some sections)"""
+        return {name: self._stats_section(name) for name in fields}
     
+    def get_stats_json(self, fields: Tuple[str, ...] = STATS_SECTIONS) -> Tuple[str, str]:
+        """Serialized stats for the given sections plus an ETag of exactly those bytes
+        
+        Sections are serialized once per stats_version and reused by every
+        request until the next turn; only stage_timing is rebuilt each time.
+        Readers may run while a turn mutates the agent on another thread, so
+        (seqlock-style) only a snapshot taken at an even version that is still
+        current afterwards is cached, and a snapshot torn by a concurrent
+        mutation is retried.
+        """
+        fields = tuple(fields)
+        for attempt in range(3):
+            version = self.stats_version
+            cached = self._stats_cache.get((version, fields))
+            if cached is not None:
+                return cached
+            fragments = {}
+            try:
+                for name in fields:
+                    fragment = self._stats_cache.get((version, name))
+                    if fragment is None:
+                        fragment = json.dumps(self._stats_section(name), separators=(",", ":"), default=str)
+                    fragments[name] = fragment
+            except RuntimeError:
+                # "dictionary changed size during iteration": a turn is writing this section
+                if attempt == 2:
+                    raise
+                continue
+            body = "{" + ",".join(f'"{name}":{fragment}' for name, fragment in fragments.items()) + "}"
+            result = (body, '"' + hashlib.blake2b(body.encode("utf-8"), digest_size=8).hexdigest() + '"')
+            if self.stats_version != version:
+                continue  # A turn finished meanwhile - report its result instead
+            if version % 2 == 0:
+                for name, fragment in fragments.items():
+                    if name in CACHED_STATS_SECTIONS:
+                        self._stats_cache[(version, name)] = fragment
+                if CACHED_STATS_SECTIONS.issuperset(fields):
+                    self._stats_cache[(version, fields)] = result
+            return result
+        return result
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Conversation state only - config, clients and stage timings stay with the process"""
+        data = {"memory": self.memory, "state": self.state}
+        if hasattr(self, 'learning_data'):
+            data["learning_data"] = self.learning_data
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], config: AgentConfig = None) -> "EnhancedAIAgent":
+        """Rebuild an agent from to_dict() output"""
+        agent = cls(config)
+        agent.memory = data.get("memory", [])
+        agent.state.update(data.get("state", {}))
+        if "learning_data" in data:
+            agent.learning_data = data["learning_data"]
+        return agent
+
     def configure(self, **kwargs):
         """Update agent configuration"""
-        for key, value in kwargs.items():
-            if hasattr(self.config, key):
-                setattr(self.config, key, value)
-        
-        # Reinitialize OpenAI client if API key changed
-        if 'openai_api_key' in kwargs and HAS_OPENAI:
-            self.openai_client = OpenAI(api_key=self.config.openai_api_key)
+        updates = {key: value for key, value in kwargs.items() if hasattr(self.config, key)}
+        self._stats_changing()
+        try:
+            # Copy-on-write so a config shared with other sessions is never mutated
+            self.config = replace(self.config, **updates)
+            
+            # Switch to the shared client for the new API key / endpoint
+            if ('openai_api_key' in updates or 'openai_base_url' in updates) and HAS_OPENAI:
+                self.openai_client = get_openai_client(self.config.openai_api_key, self.config.openai_base_url)
+        finally:
+            self._stats_changed()
 
 # ============================================================================
 # DEMO APPLICATION
@@ -602,6 +781,7 @@ def setup_config():
     
     # Enable LLM if API key available
     config.openai_api_key = os.getenv("OPENAI_API_KEY", "")
+    config.openai_base_url = os.getenv("OPENAI_BASE_URL", "")
     if config.openai_api_key:
         config.use_llm = True
         print("🧠 LLM enabled with OpenAI")
@@ -0,0 +1,147 @@
+"""
+Fast Path Benchmark - Parity check and speedup of the LangGraph fast path
+Runs the same multi-turn sessions through the full graph and the fast path, diffs the checkpoints, then times both
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+from typing import Dict, Any, List
+
+from full_langgraph_agent import LangGraphAgent, LangGraphConfig, run_fast_path, initial_state
+
+FAST_INPUTS = ["hi", "Hello there!", "hey, how are you?", "help", "Can you assist me?", "I need support",
+               "bye", "Goodbye!", "ok bye then", "I love this, hello!", "this is terrible, help"]
+# Intent matching is by substring, so e.g. "this" counts as a greeting ("hi") - keep these clear of that
+GRAPH_INPUTS = ["find me a laptop", "weather in Tokyo", "show my profile", "how do planes fly?", "random words",
+                "search for a phone", "my account please"]
+
+# Differ on every run (wall-clock timestamps) and are not part of the behaviour
+VOLATILE_KEYS = {"timestamp"}
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {key: _strip_volatile(item) for key, item in value.items() if key not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip_volatile(item) for item in value]
+    return value
+
+def make_agent(directory: str, name: str, fast_path: bool) -> LangGraphAgent:
+    config = LangGraphConfig(checkpoint_db=os.path.join(directory, f"{name}.db"), enable_fast_path=fast_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return LangGraphAgent(config)
+
+# ============================================================================
+# PARITY
+# ============================================================================
+
+def _checkpoint(agent: LangGraphAgent, session_id: str) -> Dict[str, Any]:
+    """What the checkpointer holds for a session (not the agent's cached latest state)"""
+    snapshot = agent.app.get_state({"configurable": {"thread_id": session_id}})
+    return {"values": _strip_volatile(snapshot.values), "next": list(snapshot.next)}
+
+def _turn(agent: LangGraphAgent, text: str, session_id: str, streamed: bool) -> Dict[str, Any]:
+    """One turn via run, or via stream_sync (recording the node updates /chat/stream relays)"""
+    if not streamed:
+        return {"response": agent.run(text, session_id)}
+    events = list(agent.stream_sync(text, session_id))
+    nodes = [name for event in events for name in event]
+    return {"response": events[-1][nodes[-1]].get("final_response") if events else None, "nodes": nodes}
+
+def parity_sessions(turns: int = 3) -> List[List[str]]:
+    """Multi-turn sessions mixing fast-path and graph inputs, so turns start from each other's checkpoints"""
+    inputs = FAST_INPUTS + GRAPH_INPUTS
+    return [[inputs[(index + offset * 5) % len(inputs)] for offset in range(turns)] for index in range(len(inputs))]
+
+def check_parity(graph_agent: LangGraphAgent, fast_agent: LangGraphAgent) -> List[Dict[str, Any]]:
+    """Run every session through both agents; return mismatches (empty = equivalent)
+
+    After each turn the checkpoints (values and next) must match, as must the
+    response and - for streamed turns - the node updates.
+    """
+    mismatches = []
+    for index, turns in enumerate(parity_sessions()):
+        session_id = f"parity-{index}"
+        for number, text in enumerate(turns):
+            streamed = number % 2 == 1
+            with contextlib.redirect_stdout(io.StringIO()):  # human_approval_node prints
+                graph_turn = _turn(graph_agent, text, session_id, streamed)
+                fast_turn = _turn(fast_agent, text, session_id, streamed)
+            graph_checkpoint = _checkpoint(graph_agent, session_id)
+            fast_checkpoint = _checkpoint(fast_agent, session_id)
+            took_fast_path = run_fast_path(initial_state(text)) is not None
+
+            if graph_turn != fast_turn or graph_checkpoint != fast_checkpoint:
+                graph_values, fast_values = graph_checkpoint["values"], fast_checkpoint["values"]
+                diff = sorted(key for key in set(graph_values) | set(fast_values)
+                              if graph_values.get(key) != fast_values.get(key))
+                if graph_checkpoint["next"] != fast_checkpoint["next"]:
+                    diff.append("<next>")
+                mismatches.append({"session": session_id, "turn": number, "input": text, "streamed": streamed,
+                                   "fast_path": took_fast_path, "differing_keys": diff,
+                                   "graph": graph_turn, "fast": fast_turn})
+            if (text in FAST_INPUTS) != took_fast_path:
+                mismatches.append({"input": text, "fast_path": took_fast_path,
+                                   "error": "expected fast path" if text in FAST_INPUTS else "unexpected fast path"})
+    return mismatches
+
+# ============================================================================
+# SPEED
+# ============================================================================
+
+def time_turns(agent: LangGraphAgent, turns: int) -> Dict[str, float]:
+    inputs = [FAST_INPUTS[index % len(FAST_INPUTS)] for index in range(turns)]
+    writes = []
+    put = agent.memory.put
+    agent.memory.put = lambda *args, **kwargs: writes.append(1) or put(*args, **kwargs)
+    try:
+        start = time.perf_counter()
+        for index, text in enumerate(inputs):
+            agent.run(text, f"bench-{index % 50}")
+        elapsed = time.perf_counter() - start
+    finally:
+        agent.memory.put = put
+    return {
+        "turns": turns,
+        "us_per_turn": round(elapsed / turns * 1e6, 1),
+        "checkpoint_writes_per_turn": round(len(writes) / turns, 2),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify and benchmark the LangGraph fast path")
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        graph_agent = make_agent(directory, "graph", fast_path=False)
+        fast_agent = make_agent(directory, "fast", fast_path=True)
+
+        print("⚡ Fast Path Benchmark")
+        print("=" * 50)
+        mismatches = check_parity(graph_agent, fast_agent)
+        if mismatches:
+            print(f"❌ Parity: {len(mismatches)} mismatch(es)")
+            for mismatch in mismatches:
+                print(f"   • {json.dumps(mismatch, ensure_ascii=False)}")
+        else:
+            print(f"✅ Parity: {len(parity_sessions())} multi-turn sessions ({len(FAST_INPUTS)} fast-path and "
+                  f"{len(GRAPH_INPUTS)} graph inputs) leave identical checkpoints")
+
+        graph = time_turns(graph_agent, args.turns)
+        fast = time_turns(fast_agent, args.turns)
+
+    speedup = round(graph["us_per_turn"] / fast["us_per_turn"], 1) if fast["us_per_turn"] else None
+    print(f"   graph:     {graph['us_per_turn']:>10,.1f} µs/turn   {graph['checkpoint_writes_per_turn']} checkpoint writes")
+    print(f"   fast path: {fast['us_per_turn']:>10,.1f} µs/turn   {fast['checkpoint_writes_per_turn']} checkpoint writes")
+    print(f"   speedup:   {speedup}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"parity_mismatches": mismatches, "graph": graph, "fast_path": fast, "speedup": speedup}, f, indent=2)
+    sys.exit(1 if mismatches else 0)
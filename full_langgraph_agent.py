@@ -6,29 +6,27 @@ Converts our enhanced agent to proper LangGraph implementation
 import json
 import time
 import os
-from typing import TypedDict, List, Optional, Dict, Any
+import asyncio
+import threading
+from typing import TypedDict, List, Optional, Dict, Any, Iterable
 try:
     from typing import Literal, Annotated
 except ImportError:
     from typing_extensions import Literal, Annotated
 from datetime import datetime
 from dataclasses import dataclass
+from collections import OrderedDict
 
-# LangGraph imports
+from resilience import get_backend, BackendUnavailable
+from graph_instrumentation import GraphInstrumentation, describe_compiled_graph
+from metrics import CHECKPOINT_WRITE_LATENCY, record_cache
+from shared_resources import fetch_json
+from single_flight import TOOL_CALLS, tool_key
+from session_turns import SESSION_TURNS
+
+# LangGraph imports (the checkpointer is imported when an agent is created)
 from langgraph.graph import StateGraph, END, START
-from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode
-
-# LangChain imports for LLM
-try:
-    from langchain_openai import ChatOpenAI
-    from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-    from langchain_core.prompts import ChatPromptTemplate
-    HAS_LANGCHAIN = True
-except ImportError:
-    HAS_LANGCHAIN = False
-    print("LangChain not installed. Run: pip install langchain-openai")
 
 # ============================================================================
 # STATE DEFINITION - The data that flows through the graph
@@ -70,6 +68,14 @@ class AgentState(TypedDict):
     streaming_content: str
     is_streaming: bool
 
+STATE_FIELDS = tuple(AgentState.__annotations__)
+
+def project_state(state: Dict[str, Any], fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Only the requested AgentState keys (all of them when fields is None)"""
+    if fields is None:
+        return state
+    return {key: state[key] for key in fields if key in state}
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
@@ -86,16 +92,33 @@ class LangGraphConfig:
     max_retries: int = 3
     enable_streaming: bool = True
     enable_interrupts: bool = True
+    enable_fast_path: bool = True  # Run deterministic, tool-free turns without the graph runtime
     
     # Checkpointing
     checkpoint_db: str = "agent_checkpoints.db"
+    state_cache_size: int = 1024  # Latest final state per thread kept in memory for state reads
 
 # ============================================================================
 # MOCK APIS (Tools)
 # ============================================================================
 
+# Remote tool APIs (e.g. mock_backends.py); empty = in-process mocks
+TOOL_BACKEND_URL = os.getenv("TOOL_BACKEND_URL", "")
+
+def _call_tool_backend(backend: str, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Call a remote tool API under its deadline and circuit breaker"""
+    guard = get_backend(backend)
+    # Sync and async (ainvoke runs nodes in worker threads) turns share identical in-flight lookups
+    return TOOL_CALLS.do(
+        (TOOL_BACKEND_URL, tool_key(backend, path, params)),
+        guard.call, fetch_json, TOOL_BACKEND_URL, path, params, guard.config.timeout
+    )
+
 def search_products_tool(query: str) -> Dict[str, Any]:
     """Mock Product Search API Tool"""
+    if TOOL_BACKEND_URL:
+        return _call_tool_backend("products", "/products", {"q": query})
+    
     products = {
         "laptop": [
             {"name": "MacBook Pro M3", "price": 1999, "rating": 4.8, "stock": 15},
@@ -123,6 +146,9 @@ def search_products_tool(query: str) -> Dict[str, Any]:
 
 def get_weather_tool(city: str = "London") -> Dict[str, Any]:
     """Mock Weather API Tool"""
+    if TOOL_BACKEND_URL:
+        return _call_tool_backend("weather", "/weather", {"city": city})
+    
     weather_data = {
         "london": {"temp": 15, "condition": "partly cloudy", "humidity": 65},
         "new york": {"temp": 22, "condition": "sunny", "humidity": 45},
@@ -141,6 +167,9 @@ def get_weather_tool(city: str = "London") -> Dict[str, Any]:
 
 def get_user_profile_tool(user_id: str = "default") -> Dict[str, Any]:
     """Mock User Profile API Tool"""
+    if TOOL_BACKEND_URL:
+        return _call_tool_backend("profile", "/profile", {"user_id": user_id})
+    
     return {
         "success": True,
         "user_id": user_id,
@@ -297,6 +326,17 @@ def tool_execution_node(state: AgentState) -> AgentState:
                 "timestamp": datetime.now().isoformat()
             })
     
+    except BackendUnavailable as e:
+        # Timed out or circuit open - retrying from classification won't help,
+        # so record the error without setting last_error and answer directly
+        state["errors"].append(f"Tool unavailable: {str(e)}")
+        tool_results.append({
+            "tool": "unavailable",
+            "input": action,
+            "output": {"success": False, "unavailable": True, "error": str(e)},
+            "timestamp": datetime.now().isoformat()
+        })
+    
     except Exception as e:
         state["errors"].append(f"Tool execution error: {str(e)}")
         state["last_error"] = str(e)
@@ -326,7 +366,10 @@ def response_generation_node(state: AgentState) -> AgentState:
             latest_result = tool_results[-1]
             tool_output = latest_result["output"]
             
-            if action == "search_products" and tool_output.get("success"):
+            if tool_output.get("unavailable"):
+                response = "That service is taking too long to respond right now. Please try again in a moment."
+                
+            elif action == "search_products" and tool_output.get("success"):
                 products = tool_output["products"]
                 if products:
                     response = f"Found {len(products)} products:\n"
@@ -448,35 +491,69 @@ def route_after_error_handling(state: AgentState) -> str:
     else:
         return "response_generation"  # Give up, generate error response
 
+# ============================================================================
+# FAST PATH - deterministic, tool-free turns without the graph runtime
+# ============================================================================
+
+# Actions whose whole route is input → intent → decision → tool_execution (no tool)
+# → response_generation with a constant answer and no approval, error or retry branch
+FAST_PATH_ACTIONS = frozenset({"greet_user", "provide_help", "say_goodbye"})
+
+def run_fast_path(state: AgentState, updates: List[Dict[str, Any]] = None) -> Optional[AgentState]:
+    """Run a greeting/help/goodbye turn inline; None if the turn needs the graph
+    
+    Calls the same node and router functions in the order the graph would, so
+    the final state is identical; it only skips the runtime and the per-step
+    checkpoint writes. The caller must pass a fresh state - it is mutated.
+    With updates, each node's {node: state} event (as the graph streams them)
+    is appended there.
+    """
+    for name, node in (("input_processing", input_processing_node),
+                       ("intent_classification", intent_classification_node),
+                       ("decision_making", decision_making_node),
+                       ("tool_execution", tool_execution_node),
+                       ("response_generation", response_generation_node)):
+        state = node(state)
+        if updates is not None:
+            updates.append({name: dict(state)})  # Later nodes reassign keys of the shared dict
+        if name == "decision_making" and (state["action"] not in FAST_PATH_ACTIONS
+                                          or route_after_intent_classification(state) != "tool_execution"):
+            return None
+        if name == "tool_execution" and route_after_tool_execution(state) != "response_generation":
+            return None
+    return state
+
 # ============================================================================
 # LANGGRAPH AGENT BUILDER
 # ============================================================================
 
-def create_langgraph_agent(config: LangGraphConfig = None) -> StateGraph:
+def create_langgraph_agent(config: LangGraphConfig = None, instrumentation: GraphInstrumentation = None) -> StateGraph:
     """Create the complete LangGraph agent"""
     
     if config is None:
         config = LangGraphConfig()
     
-    # Create the graph
+    # Create the graph - registering through the instrumentation (if any)
+    # wraps every node and router with latency/edge tracking
     workflow = StateGraph(AgentState)
+    graph = instrumentation.instrument(workflow) if instrumentation else workflow
     
     # Add all nodes
-    workflow.add_node("input_processing", input_processing_node)
-    workflow.add_node("intent_classification", intent_classification_node)
-    workflow.add_node("decision_making", decision_making_node)
-    workflow.add_node("tool_execution", tool_execution_node)
-    workflow.add_node("response_generation", response_generation_node)
-    workflow.add_node("human_approval", human_approval_node)
-    workflow.add_node("error_handling", error_handling_node)
+    graph.add_node("input_processing", input_processing_node)
+    graph.add_node("intent_classification", intent_classification_node)
+    graph.add_node("decision_making", decision_making_node)
+    graph.add_node("tool_execution", tool_execution_node)
+    graph.add_node("response_generation", response_generation_node)
+    graph.add_node("human_approval", human_approval_node)
+    graph.add_node("error_handling", error_handling_node)
     
     # Define the flow with edges
-    workflow.add_edge(START, "input_processing")
-    workflow.add_edge("input_processing", "intent_classification")
-    workflow.add_edge("intent_classification", "decision_making")
+    graph.add_edge(START, "input_processing")
+    graph.add_edge("input_processing", "intent_classification")
+    graph.add_edge("intent_classification", "decision_making")
     
     # Conditional routing from decision making
-    workflow.add_conditional_edges(
+    graph.add_conditional_edges(
         "decision_making",
         route_after_intent_classification,
         {
@@ -487,7 +564,7 @@ def create_langgraph_agent(config: LangGraphConfig = None) -> StateGraph:
     )
     
     # Conditional routing from human approval
-    workflow.add_conditional_edges(
+    graph.add_conditional_edges(
         "human_approval",
         route_after_approval,
         {
@@ -497,7 +574,7 @@ def create_langgraph_agent(config: LangGraphConfig = None) -> StateGraph:
     )
     
     # Conditional routing from tool execution
-    workflow.add_conditional_edges(
+    graph.add_conditional_edges(
         "tool_execution",
         route_after_tool_execution,
         {
@@ -507,7 +584,7 @@ def create_langgraph_agent(config: LangGraphConfig = None) -> StateGraph:
     )
     
     # Conditional routing from error handling
-    workflow.add_conditional_edges(
+    graph.add_conditional_edges(
         "error_handling", 
         route_after_error_handling,
         {
@@ -517,7 +594,7 @@ def create_langgraph_agent(config: LangGraphConfig = None) -> StateGraph:
     )
     
     # End after response generation
-    workflow.add_edge("response_generation", END)
+    graph.add_edge("response_generation", END)
     
     return workflow
 
@@ -525,133 +602,208 @@ def create_langgraph_agent(config: LangGraphConfig = None) -> StateGraph:
 # AGENT RUNNER WITH CHECKPOINTING
 # ============================================================================
 
+def initial_state(user_input: str) -> AgentState:
+    """Fresh per-turn input state"""
+    return {
+        "messages": [],
+        "user_input": user_input,
+        "processed_input": "",
+        "final_response": "",
+        "intent": None,
+        "confidence": 0.0,
+        "action": None,
+        "tool_calls": [],
+        "tool_results": [],
+        "conversation_history": [],
+        "user_profile": {},
+        "session_data": {},
+        "current_node": "",
+        "requires_approval": False,
+        "approval_granted": False,
+        "retry_count": 0,
+        "errors": [],
+        "last_error": None,
+        "streaming_content": "",
+        "is_streaming": False
+    }
+
 class LangGraphAgent:
     """Complete LangGraph Agent with all features"""
     
     def __init__(self, config: LangGraphConfig = None):
         self.config = config or LangGraphConfig()
         
-        # Create workflow
-        self.workflow = create_langgraph_agent(self.config)
+        # Create workflow (instrumented per node and edge)
+        self.instrumentation = GraphInstrumentation()
+        self.workflow = create_langgraph_agent(self.config, self.instrumentation)
         
         # Setup checkpointing for persistence
+        from langgraph.checkpoint.sqlite import SqliteSaver
         self.memory = SqliteSaver.from_conn_string(self.config.checkpoint_db)
+        self._time_checkpoint_writes(self.memory)
         
         # Compile with checkpointing
         self.app = self.workflow.compile(checkpointer=self.memory)
+        self.fast_path_turns = 0
+        
+        # thread_id -> final state of its last turn (saves a checkpoint read + deserialize per lookup)
+        self._latest_states: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._latest_lock = threading.Lock()
         
         print("🕸️ LangGraph Agent initialized with full architecture!")
         print(f"📊 Checkpointing: {self.config.checkpoint_db}")
         print(f"🔄 Max retries: {self.config.max_retries}")
         print(f"⚡ Streaming: {self.config.enable_streaming}")
     
-    def run(self, user_input: str, session_id: str = "default") -> str:
-        """Run the agent synchronously"""
-        initial_state = {
-            "messages": [],
-            "user_input": user_input,
-            "processed_input": "",
-            "final_response": "",
-            "intent": None,
-            "confidence": 0.0,
-            "action": None,
-            "tool_calls": [],
-            "tool_results": [],
-            "conversation_history": [],
-            "user_profile": {},
-            "session_data": {},
-            "current_node": "",
-            "requires_approval": False,
-            "approval_granted": False,
-            "retry_count": 0,
-            "errors": [],
-            "last_error": None,
-            "streaming_content": "",
-            "is_streaming": False
-        }
+    @staticmethod
+    def _time_checkpoint_writes(saver):
+        """Record checkpoint put/aput latency in the metrics registry"""
+        put = saver.put
         
+        def timed_put(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return put(*args, **kwargs)
+            finally:
+                CHECKPOINT_WRITE_LATENCY.observe(time.perf_counter() - start)
+        
+        saver.put = timed_put
+        
+        aput = getattr(saver, "aput", None)
+        if aput is not None:
+            async def timed_aput(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await aput(*args, **kwargs)
+                finally:
+                    CHECKPOINT_WRITE_LATENCY.observe(time.perf_counter() - start)
+            
+            saver.aput = timed_aput
+    
+    def _try_fast_path(self, user_input: str, config: dict, updates: List[Dict[str, Any]] = None) -> Optional[AgentState]:
+        """Answer a deterministic turn inline and checkpoint its final state in one write"""
+        if not self.config.enable_fast_path:
+            return None
+        state = run_fast_path(initial_state(user_input), updates)
+        if state is None:
+            return None
+        # Same checkpoint the graph would leave after response_generation → END
+        self.app.update_state(config, state, as_node="response_generation")
+        self.fast_path_turns += 1
+        return state
+    
+    def _remember_state(self, session_id: str, state: Dict[str, Any]):
+        with self._latest_lock:
+            self._latest_states[session_id] = state
+            self._latest_states.move_to_end(session_id)
+            while len(self._latest_states) > self.config.state_cache_size:
+                self._latest_states.popitem(last=False)
+    
+    def _forget_state(self, session_id: str):
+        with self._latest_lock:
+            self._latest_states.pop(session_id, None)
+    
+    def run_turn(self, user_input: str, session_id: str = "default") -> Dict[str, Any]:
+        """Run one turn and return its final state (the invoke result - no checkpoint re-read)"""
         config = {"configurable": {"thread_id": session_id}}
         
         try:
-            result = self.app.invoke(initial_state, config=config)
-            return result["final_response"]
+            state = self._try_fast_path(user_input, config)
+            if state is None:
+                state = self.app.invoke(initial_state(user_input), config=config)
         except Exception as e:
-            return f"Agent error: {str(e)}"
+            self._forget_state(session_id)
+            return {"final_response": f"Agent error: {str(e)}", "last_error": str(e)}
+        self._remember_state(session_id, state)
+        return state
+    
+    def run(self, user_input: str, session_id: str = "default") -> str:
+        """Run the agent synchronously"""
+        return self.run_turn(user_input, session_id)["final_response"]
     
     async def run_async(self, user_input: str, session_id: str = "default") -> str:
-        """Run the agent asynchronously"""
-        initial_state = {
-            "messages": [],
-            "user_input": user_input,
-            "processed_input": "",
-            "final_response": "",
-            "intent": None,
-            "confidence": 0.0,
-            "action": None,
-            "tool_calls": [],
-            "tool_results": [],
-            "conversation_history": [],
-            "user_profile": {},
-            "session_data": {},
-            "current_node": "",
-            "requires_approval": False,
-            "approval_granted": False,
-            "retry_count": 0,
-            "errors": [],
-            "last_error": None,
-            "streaming_content": "",
-            "is_streaming": False
-        }
-        
-        config = {"configurable": {"thread_id": session_id}}
+        """Run the agent asynchronously
         
-        try:
-            result = await self.app.ainvoke(initial_state, config=config)
-            return result["final_response"]
-        except Exception as e:
-            return f"Agent error: {str(e)}"
+        SqliteSaver only implements the sync checkpoint API (ainvoke fails on
+        aget_tuple), so the turn runs in a worker thread instead.
+        """
+        state = await asyncio.to_thread(self.run_turn, user_input, session_id)
+        return state["final_response"]
     
     async def stream(self, user_input: str, session_id: str = "default"):
-        """Stream responses in real-time"""
-        initial_state = {
-            "messages": [],
-            "user_input": user_input,
-            "processed_input": "",
-            "final_response": "",
-            "intent": None,
-            "confidence": 0.0,
-            "action": None,
-            "tool_calls": [],
-            "tool_results": [],
-            "conversation_history": [],
-            "user_profile": {},
-            "session_data": {},
-            "current_node": "",
-            "requires_approval": False,
-            "approval_granted": False,
-            "retry_count": 0,
-            "errors": [],
-            "last_error": None,
-            "streaming_content": "",
-            "is_streaming": False
-        }
+        """Stream responses in real-time (stream_sync in a worker thread, for the same reason as run_async)"""
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
         
-        config = {"configurable": {"thread_id": session_id}}
+        def pump():
+            try:
+                for event in self.stream_sync(user_input, session_id):
+                    loop.call_soon_threadsafe(events.put_nowait, ("event", event))
+            except Exception as e:
+                loop.call_soon_threadsafe(events.put_nowait, ("error", e))
+            finally:
+                loop.call_soon_threadsafe(events.put_nowait, ("done", None))
         
-        async for event in self.app.astream(initial_state, config=config):
-            yield event
-    
+        # On the session turn pool, shielded: if the consumer goes away mid-turn (client disconnect),
+        # the finally below still waits for the graph and its checkpoint write, so a caller holding
+        # the session's turn gate doesn't release it while this turn is running
+        worker = asyncio.ensure_future(SESSION_TURNS.offload(pump))
+        try:
+            while True:
+                kind, payload = await events.get()
+                if kind == "event":
+                    yield payload
+                elif kind == "error":
+                    raise payload
+                else:
+                    break
+        finally:
+            await worker
+
+    def stream_sync(self, user_input: str, session_id: str = "default"):
+        """Stream node updates from a worker thread (same events as stream)"""
+        config = {"configurable": {"thread_id": session_id}}
+        # Node updates don't add up to the final state; the next get_state reads the checkpoint
+        self._forget_state(session_id)
+
+        # A fast-path turn replays the node updates the graph would have streamed
+        updates = []
+        if self._try_fast_path(user_input, config, updates) is not None:
+            yield from updates
+            return
+
+        yield from self.app.stream(initial_state(user_input), config=config)
+
     def get_state(self, session_id: str = "default") -> dict:
-        """Get current state for a session"""
+        """Get current state for a session (latest turn's state if cached, else the checkpoint)"""
+        with self._latest_lock:
+            state = self._latest_states.get(session_id)
+            if state is not None:
+                self._latest_states.move_to_end(session_id)
+        record_cache("langgraph_state", state is not None)
+        if state is not None:
+            return state
         config = {"configurable": {"thread_id": session_id}}
         try:
-            return self.app.get_state(config).values
+            state = self.app.get_state(config).values
         except:
             return {}
+        if state:
+            self._remember_state(session_id, state)
+        return state
+    
+    def get_graph_info(self) -> dict:
+        """Topology of the compiled graph plus per-node/edge metrics"""
+        topology = describe_compiled_graph(self.app)
+        metrics = self.instrumentation.snapshot()
+        retry_loops = sum(edge["count"] for edge in metrics["edges"]
+                          if edge["source"] == "error_handling" and edge["target"] == "intent_classification")
+        return {**topology, "metrics": metrics, "retry_loops": retry_loops, "fast_path_turns": self.fast_path_turns}
     
     def reset_session(self, session_id: str = "default"):
         """Reset a session"""
         # This would clear the checkpointed state for the session
+        self._forget_state(session_id)
         print(f"🔄 Session {session_id} reset (implementation depends on checkpointer)")
 
 # ============================================================================
@@ -0,0 +1,141 @@
+"""
+Graph Instrumentation - Per-node and per-edge metrics for LangGraph workflows
+Wraps every node and conditional router as it is registered on a StateGraph
+"""
+
+import time
+import threading
+from functools import wraps
+from collections import defaultdict
+from typing import Dict, Any, Callable, List, Optional
+
+from histograms import LatencyHistogram
+
+START_NAME = "__start__"
+END_NAME = "__end__"
+
+class GraphInstrumentation:
+    """Latency histograms, invocation counts and edge traversal counts for one graph"""
+
+    def __init__(self):
+        self.node_latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.router_latency: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.node_errors: Dict[str, int] = defaultdict(int)
+        self.edge_counts: Dict[tuple, int] = defaultdict(int)
+        self.fixed_edges: Dict[str, List[str]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _count_edge(self, source: str, target: str):
+        with self._lock:
+            self.edge_counts[(source, target)] += 1
+
+    # ========================================================================
+    # WRAPPERS
+    # ========================================================================
+    def wrap_node(self, name: str, fn: Callable) -> Callable:
+        """Time a node and count the fixed edges it leaves through"""
+        histogram = self.node_latency[name]
+
+        @wraps(fn)
+        def instrumented_node(state):
+            # START edges are counted when their target runs
+            if name in self.fixed_edges[START_NAME]:
+                self._count_edge(START_NAME, name)
+            start = time.perf_counter()
+            try:
+                result = fn(state)
+            except Exception:
+                with self._lock:
+                    self.node_errors[name] += 1
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+            for target in self.fixed_edges.get(name, ()):
+                self._count_edge(name, target)
+            return result
+
+        return instrumented_node
+
+    def wrap_router(self, source: str, router: Callable, path_map: Optional[Dict[str, str]] = None) -> Callable:
+        """Time a conditional router and count the edge it selects"""
+        histogram = self.router_latency[f"{source}:{router.__name__}"]
+
+        @wraps(router)
+        def instrumented_router(state):
+            start = time.perf_counter()
+            route = router(state)
+            histogram.observe(time.perf_counter() - start)
+            target = path_map.get(route, route) if path_map else route
+            self._count_edge(source, target)
+            return route
+
+        return instrumented_router
+
+    def instrument(self, workflow) -> "InstrumentedGraphBuilder":
+        """Return a builder that registers instrumented nodes/edges on workflow"""
+        return InstrumentedGraphBuilder(workflow, self)
+
+    # ========================================================================
+    # REPORTING
+    # ========================================================================
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            edges = dict(self.edge_counts)
+            errors = dict(self.node_errors)
+        return {
+            "nodes": {
+                name: {**histogram.snapshot(), "errors": errors.get(name, 0)}
+                for name, histogram in list(self.node_latency.items())
+            },
+            "routers": {name: histogram.snapshot() for name, histogram in list(self.router_latency.items())},
+            "edges": [
+                {"source": source, "target": target, "count": count}
+                for (source, target), count in sorted(edges.items())
+            ]
+        }
+
+    def reset(self):
+        for histogram in list(self.node_latency.values()) + list(self.router_latency.values()):
+            histogram.reset()
+        with self._lock:
+            self.edge_counts.clear()
+            self.node_errors.clear()
+
+class InstrumentedGraphBuilder:
+    """Drop-in for the StateGraph registration calls that wraps what it registers"""
+
+    def __init__(self, workflow, instrumentation: GraphInstrumentation):
+        self.workflow = workflow
+        self.instrumentation = instrumentation
+
+    def add_node(self, name: str, fn: Callable):
+        self.workflow.add_node(name, self.instrumentation.wrap_node(name, fn))
+
+    def add_edge(self, source: str, target: str):
+        self.instrumentation.fixed_edges[str(source)].append(str(target))
+        self.workflow.add_edge(source, target)
+
+    def add_conditional_edges(self, source: str, router: Callable, path_map: Dict[str, str] = None):
+        wrapped = self.instrumentation.wrap_router(source, router, path_map)
+        if path_map is None:
+            self.workflow.add_conditional_edges(source, wrapped)
+        else:
+            self.workflow.add_conditional_edges(source, wrapped, path_map)
+
+# ============================================================================
+# TOPOLOGY
+# ============================================================================
+
+def describe_compiled_graph(app) -> Dict[str, Any]:
+    """Nodes and edges as reported by a compiled graph's get_graph()"""
+    graph = app.get_graph()
+    nodes = [str(node_id) for node_id in graph.nodes]
+    edges = [
+        {
+            "source": str(edge.source),
+            "target": str(edge.target),
+            "conditional": bool(getattr(edge, "conditional", False) or getattr(edge, "data", None))
+        }
+        for edge in graph.edges
+    ]
+    return {"nodes": nodes, "edges": edges}
@@ -0,0 +1,82 @@
+"""
+Latency Histograms - Fixed-bucket histograms for cheap always-on timing
+Bucket counts are cumulative-friendly so they export directly as Prometheus histograms
+"""
+
+import threading
+from bisect import bisect_left
+from typing import Dict, Any, List, Optional
+
+# Upper bounds in seconds: 10µs .. ~110s, growing 1.5x per bucket
+DEFAULT_BUCKETS = tuple(round(0.00001 * (1.5 ** i), 8) for i in range(41))
+
+class LatencyHistogram:
+    """Thread-safe latency histogram with percentile estimates"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Estimate the p-th quantile (0..1) by interpolating inside its bucket"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.count
+            observed_max = self.max
+        if not total:
+            return None
+
+        rank = p * total
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else observed_max
+                fraction = (rank - seen) / bucket_count
+                return min(lower + (upper - lower) * fraction, observed_max)
+            seen += bucket_count
+        return observed_max
+
+    def cumulative_buckets(self) -> List[tuple]:
+        """[(upper_bound, cumulative_count), ...] ending with ("+Inf", count)"""
+        with self._lock:
+            counts = list(self.counts)
+        result, running = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            result.append((bound, running))
+        result.append(("+Inf", running + counts[-1]))
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Summary in milliseconds, suitable for JSON endpoints"""
+        def ms(value):
+            return round(value * 1000, 4) if value is not None else None
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.percentile(0.50)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max) if self.count else None
+        }
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+            self.max = 0.0
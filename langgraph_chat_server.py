@@ -3,19 +3,26 @@ LangGraph Chat Server - FastAPI backend for LangGraph Agent
 Connects the web UI to the Full LangGraph Agent
 """
 
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request, WebSocket
 from fastapi.responses import HTMLResponse, StreamingResponse
 from pydantic import BaseModel
-import uvicorn
 import json
 import asyncio
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import os
 from datetime import datetime
 
 # Import our LangGraph agent
-from full_langgraph_agent import LangGraphAgent, LangGraphConfig
+from full_langgraph_agent import LangGraphAgent, LangGraphConfig, STATE_FIELDS, project_state
+from agent_shards import ShardPool, ShardUnavailable, AGENT_SHARDS
+from session_turns import SESSION_TURNS, SessionBusy, get_session_turn_stats
+from resilience import get_resilience_stats
+from single_flight import get_single_flight_stats
+from llm_scheduler import get_scheduler_stats
+from metrics import REGISTRY, install_metrics, render_histogram_family
+from profiling import install_profiling
+from compression import StaticAssets, install_compression
+from chat_socket import ChatSocketHub
 
 app = FastAPI(title="LangGraph AI Agent Chat Server", version="2.0.0")
 
@@ -23,27 +30,64 @@ app = FastAPI(title="LangGraph AI Agent Chat Server", version="2.0.0")
 class ChatRequest(BaseModel):
     message: str
     session_id: str = "default"
+    verbose: bool = False      # Echo the whole final AgentState
+    fields: List[str] = None   # ...or just these AgentState keys (e.g. ["intent", "tool_results"])
 
 class ChatResponse(BaseModel):
     response: str
     session_id: str
     timestamp: str
-    agent_state: Dict[str, Any] = None
+    agent_state: Optional[Dict[str, Any]] = None
     node_path: list = []
 
-# Global agent instance
+# Global agent instance (or, with AGENT_SHARDS=N, a pool of agent processes)
 langgraph_agent: LangGraphAgent = None
+shard_pool: ShardPool = None
 
-def initialize_agent():
-    """Initialize the LangGraph agent"""
-    global langgraph_agent
-    
+# Sessions seen by this process (threads live in the checkpointer)
+active_sessions: set = set()
+
+def _graph_metric_lines() -> list:
+    """Per-node latency and edge traversal counts from the graph instrumentation"""
+    if not langgraph_agent:
+        return []
+    instrumentation = langgraph_agent.instrumentation
+    lines = render_histogram_family(
+        "graph_node_duration_seconds", "LangGraph node latency",
+        {(name,): histogram for name, histogram in list(instrumentation.node_latency.items())}, ("node",)
+    )
+    lines += ["# HELP graph_edge_traversals_total LangGraph edge traversals",
+              "# TYPE graph_edge_traversals_total counter"]
+    for (source, target), count in list(instrumentation.edge_counts.items()):
+        lines.append(f'graph_edge_traversals_total{{source="{source}",target="{target}"}} {count}')
+    return lines
+
+install_metrics(app, lambda: len(active_sessions))
+install_profiling(app)  # Off unless PROFILING_ENABLED=1
+install_compression(app)  # JSON bodies >= COMPRESS_MIN_BYTES, when the client accepts gzip/br
+REGISTRY.add_collector(_graph_metric_lines)
+
+# Pages served from memory, precompressed once at startup
+static_assets = StaticAssets()
+
+def build_agent_config() -> LangGraphConfig:
+    """Server agent configuration (shard processes get a pickled copy)"""
     config = LangGraphConfig()
     config.openai_api_key = os.getenv("OPENAI_API_KEY", "")
     config.enable_streaming = True
     config.enable_interrupts = True
+    return config
+
+def initialize_agent():
+    """Initialize the LangGraph agent"""
+    global langgraph_agent, shard_pool
     
-    langgraph_agent = LangGraphAgent(config)
+    if AGENT_SHARDS > 0:
+        shard_pool = ShardPool("langgraph", AGENT_SHARDS, build_agent_config())
+        shard_pool.start()
+        return
+    
+    langgraph_agent = LangGraphAgent(build_agent_config())
     print("🕸️ LangGraph Agent initialized for web server!")
 
 @app.on_event("startup")
@@ -51,14 +95,54 @@ async def startup_event():
     """Initialize agent on server startup"""
     initialize_agent()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if shard_pool:
+        shard_pool.close()
+
+def require_agent():
+    if not langgraph_agent and not shard_pool:
+        raise HTTPException(status_code=500, detail="Agent not initialized")
+
+def session_busy(e: SessionBusy) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": f"{e.retry_after:.0f}"})
+
+def state_fields(verbose: bool, fields: Optional[List[str]]) -> Tuple[str, ...]:
+    """AgentState keys a client asked for; () = just the response"""
+    if verbose or (fields and "all" in fields):
+        return STATE_FIELDS
+    unknown = [name for name in fields or () if name not in STATE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown state fields: {', '.join(unknown)} "
+                                                    f"(known: {', '.join(STATE_FIELDS)}, all)")
+    return tuple(fields or ())
+
+def local_turn(message: str, session_id: str, fields: Tuple[str, ...]) -> Dict[str, Any]:
+    # The turn's final state is the invoke result - no second checkpoint read to echo it
+    state = langgraph_agent.run_turn(message, session_id)
+    return {"response": state["final_response"], "node": state.get("current_node"),
+            "state": project_state(state, fields) if fields else None}
+
+async def run_turn(request: ChatRequest) -> Dict[str, Any]:
+    """One turn after the session's earlier ones, in this process or on the session's shard"""
+    fields = state_fields(request.verbose, request.fields)
+    active_sessions.add(request.session_id)
+    async with SESSION_TURNS.turn(request.session_id):
+        if shard_pool:
+            return await shard_pool.call(request.session_id, "turn", request.message, fields)
+        return await SESSION_TURNS.offload(local_turn, request.message, request.session_id, fields)
+
+@app.on_event("startup")
+async def load_static_assets():
+    static_assets.add_file("chat_interface.html")
+
 @app.get("/", response_class=HTMLResponse)
-async def serve_chat_interface():
-    """Serve the chat interface HTML"""
-    try:
-        with open("chat_interface.html", "r", encoding="utf-8") as f:
-            return HTMLResponse(content=f.read())
-    except FileNotFoundError:
+async def serve_chat_interface(request: Request):
+    """Serve the chat interface HTML (from memory, with ETag revalidation)"""
+    response = static_assets.response("chat_interface.html", request.headers)
+    if response is None:
         raise HTTPException(status_code=404, detail="Chat interface not found")
+    return response
 
 @app.get("/health")
 async def health_check():
@@ -70,102 +154,115 @@ async def health_check():
         "features": ["graph_workflow", "checkpointing", "HITL", "streaming"]
     }
 
+@app.get("/resilience")
+async def resilience_stats():
+    """Circuit breaker state, timeouts, hedging, call coalescing and LLM rate-limit queues"""
+    return {"backends": get_resilience_stats(), "single_flight": get_single_flight_stats(),
+            "llm_scheduler": get_scheduler_stats(), "session_turns": get_session_turn_stats(),
+            "timestamp": datetime.now().isoformat()}
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
-    """Main chat endpoint using LangGraph agent"""
+    """Main chat endpoint using LangGraph agent (agent_state only with verbose or fields)"""
     try:
-        if not langgraph_agent:
-            raise HTTPException(status_code=500, detail="Agent not initialized")
-        
-        # Run LangGraph agent
-        response = langgraph_agent.run(request.message, request.session_id)
-        
-        # Get agent state for debugging
-        agent_state = langgraph_agent.get_state(request.session_id)
+        require_agent()
         
-        # Extract node path from state if available
-        node_path = []
-        if agent_state and "current_node" in agent_state:
-            node_path = [agent_state["current_node"]]
+        # Run LangGraph agent (on the session's shard process when sharded), after the session's earlier turns
+        result = await run_turn(request)
         
         return ChatResponse(
-            response=response,
+            response=result["response"],
             session_id=request.session_id,
             timestamp=datetime.now().isoformat(),
-            agent_state=agent_state,
-            node_path=node_path
+            agent_state=result["state"],
+            node_path=[result["node"]] if result["node"] else []
         )
     
+    except HTTPException:
+        raise
+    except SessionBusy as e:
+        raise session_busy(e)
+    except ShardUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Chat error: {e}")
         raise HTTPException(status_code=500, detail=f"Chat processing error: {str(e)}")
 
-@app.post("/chat/async")
+@app.post("/chat/async", response_model=ChatResponse)
 async def chat_async_endpoint(request: ChatRequest):
     """Async chat endpoint"""
     try:
-        if not langgraph_agent:
-            raise HTTPException(status_code=500, detail="Agent not initialized")
+        require_agent()
         
-        # Run LangGraph agent asynchronously
-        response = await langgraph_agent.run_async(request.message, request.session_id)
-        
-        agent_state = langgraph_agent.get_state(request.session_id)
+        # Same turn as /chat: the graph runs on the turn thread pool, off the event loop
+        result = await run_turn(request)
         
         return ChatResponse(
-            response=response,
+            response=result["response"],
             session_id=request.session_id,
             timestamp=datetime.now().isoformat(),
-            agent_state=agent_state
+            agent_state=result["state"]
         )
     
+    except HTTPException:
+        raise
+    except SessionBusy as e:
+        raise session_busy(e)
+    except ShardUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Async chat error: {e}")
         raise HTTPException(status_code=500, detail=f"Async chat error: {str(e)}")
 
+async def turn_events(session_id: str, message: str):
+    """One turn as node progress, response text and tool result events (for /chat/stream and /ws)"""
+    # Node updates are relayed from the shard when sharded
+    active_sessions.add(session_id)
+    async with SESSION_TURNS.turn(session_id):
+        events = shard_pool.stream(session_id, "stream", message) if shard_pool \
+            else langgraph_agent.stream(message, session_id)
+        async for event in events:
+            # Process different types of events from LangGraph
+            for node_name, node_output in event.items():
+                if node_output and isinstance(node_output, dict):
+                
+                    # Stream node progress
+                    yield {
+                        "type": "node_progress",
+                        "node": node_name,
+                        "content": f"Processing: {node_name}...",
+                        "timestamp": datetime.now().isoformat()
+                    }
+                
+                    # Stream partial response if available
+                    if "final_response" in node_output and node_output["final_response"]:
+                        yield {
+                            "type": "text",
+                            "content": node_output["final_response"],
+                            "node": node_name,
+                            "timestamp": datetime.now().isoformat()
+                        }
+                    
+                    # Stream tool results
+                    if "tool_results" in node_output and node_output["tool_results"]:
+                        yield {
+                            "type": "tool_result",
+                            "content": f"Tool executed: {len(node_output['tool_results'])} results",
+                            "tools": node_output["tool_results"],
+                            "timestamp": datetime.now().isoformat()
+                        }
+
 @app.post("/chat/stream")
 async def chat_stream_endpoint(request: ChatRequest):
     """Streaming chat endpoint with LangGraph"""
     async def generate_stream():
         try:
-            if not langgraph_agent:
+            if not langgraph_agent and not shard_pool:
                 yield f"data: {json.dumps({'type': 'error', 'content': 'Agent not initialized'})}\n\n"
                 return
             
-            # Stream from LangGraph agent
-            async for event in langgraph_agent.stream(request.message, request.session_id):
-                # Process different types of events from LangGraph
-                for node_name, node_output in event.items():
-                    if node_output and isinstance(node_output, dict):
-                        
-                        # Stream node progress
-                        progress_chunk = {
-                            "type": "node_progress",
-                            "node": node_name,
-                            "content": f"Processing: {node_name}...",
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        yield f"data: {json.dumps(progress_chunk)}\n\n"
-                        
-                        # Stream partial response if available
-                        if "final_response" in node_output and node_output["final_response"]:
-                            response_chunk = {
-                                "type": "text",
-                                "content": node_output["final_response"],
-                                "node": node_name,
-                                "timestamp": datetime.now().isoformat()
-                            }
-                            yield f"data: {json.dumps(response_chunk)}\n\n"
-                            
-                        # Stream tool results
-                        if "tool_results" in node_output and node_output["tool_results"]:
-                            tool_chunk = {
-                                "type": "tool_result",
-                                "content": f"Tool executed: {len(node_output['tool_results'])} results",
-                                "tools": node_output["tool_results"],
-                                "timestamp": datetime.now().isoformat()
-                            }
-                            yield f"data: {json.dumps(tool_chunk)}\n\n"
+            async for chunk in turn_events(request.session_id, request.message):
+                yield f"data: {json.dumps(chunk)}\n\n"
             
             # Send completion signal
             completion = {
@@ -193,14 +290,41 @@ async def chat_stream_endpoint(request: ChatRequest):
         }
     )
 
+async def socket_turn_events(session_id: str, message: str):
+    require_agent()
+    async for event in turn_events(session_id, message):
+        yield event
+
+def socket_status() -> Dict[str, Any]:
+    """Health pushed to /ws clients instead of them polling /health"""
+    return {"status": "healthy" if langgraph_agent or shard_pool else "starting", "agent_type": "LangGraph",
+            "busy_sessions": get_session_turn_stats()["busy_sessions"], "timestamp": datetime.now().isoformat()}
+
+# Chat over one WebSocket per client (WS_MAX_CONNECTIONS, WS_MAX_SESSIONS per socket, ...)
+chat_sockets = ChatSocketHub(socket_turn_events, socket_status)
+
+@app.websocket("/ws")
+async def chat_socket(websocket: WebSocket, session_id: str = "default"):
+    """Chat turns, node progress and periodic status over one connection (see chat_socket.py for frames)"""
+    await chat_sockets.serve(websocket, session_id)
+
+@app.get("/ws/stats")
+async def chat_socket_stats():
+    """Open WebSocket connections, in-flight turns and limits"""
+    return {**chat_sockets.get_stats(), "timestamp": datetime.now().isoformat()}
+
 @app.get("/agent/state/{session_id}")
-async def get_agent_state(session_id: str):
-    """Get current LangGraph agent state"""
-    if not langgraph_agent:
-        raise HTTPException(status_code=500, detail="Agent not initialized")
+async def get_agent_state(session_id: str, fields: str = None):
+    """Get current LangGraph agent state (fields=intent,final_response,... for a subset)"""
+    require_agent()
+    selected = state_fields(False, fields.split(",")) if fields else None
     
     try:
-        state = langgraph_agent.get_state(session_id)
+        # Served from the agent's latest-state cache; the checkpoint is read only on a miss
+        if shard_pool:
+            state = await shard_pool.call(session_id, "state", selected)
+        else:
+            state = project_state(langgraph_agent.get_state(session_id), selected)
         return {
             "session_id": session_id,
             "state": state,
@@ -212,43 +336,43 @@ async def get_agent_state(session_id: str):
 @app.post("/agent/reset/{session_id}")
 async def reset_agent_session(session_id: str):
     """Reset LangGraph agent session"""
-    if not langgraph_agent:
-        raise HTTPException(status_code=500, detail="Agent not initialized")
+    require_agent()
     
     try:
-        langgraph_agent.reset_session(session_id)
+        async with SESSION_TURNS.turn(session_id):
+            if shard_pool:
+                await shard_pool.call(session_id, "reset")
+            else:
+                langgraph_agent.reset_session(session_id)
         return {
             "message": f"Session {session_id} reset successfully",
             "timestamp": datetime.now().isoformat()
         }
+    except SessionBusy as e:
+        raise session_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Reset error: {str(e)}")
 
 @app.get("/agent/graph")
 async def get_agent_graph():
     """Get LangGraph agent workflow structure"""
-    if not langgraph_agent:
-        raise HTTPException(status_code=500, detail="Agent not initialized")
+    require_agent()
+    
+    # Topology comes from the compiled graph; metrics from its instrumentation
+    try:
+        if shard_pool:
+            # Same topology everywhere; metrics are per shard process
+            shard_infos = await shard_pool.broadcast("graph")
+            graph_info = {**shard_infos[0], "metrics": [info["metrics"] for info in shard_infos],
+                          "retry_loops": sum(info["retry_loops"] for info in shard_infos),
+                          "fast_path_turns": sum(info["fast_path_turns"] for info in shard_infos)}
+        else:
+            graph_info = langgraph_agent.get_graph_info()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Graph introspection error: {str(e)}")
     
-    # Return graph structure info
     return {
-        "nodes": [
-            "input_processing",
-            "intent_classification", 
-            "decision_making",
-            "tool_execution",
-            "response_generation",
-            "human_approval",
-            "error_handling"
-        ],
-        "edges": {
-            "START": "input_processing",
-            "input_processing": "intent_classification",
-            "intent_classification": "decision_making",
-            "decision_making": ["tool_execution", "human_approval", "error_handling"],
-            "tool_execution": ["response_generation", "error_handling"],
-            "response_generation": "END"
-        },
+        **graph_info,
         "features": [
             "conditional_routing",
             "human_in_the_loop",
@@ -356,7 +480,8 @@ async def serve_langgraph_interface():
                 const response = await fetch('/chat', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ message, session_id: sessionId })
+                    // agent_state is opt-in; the State panel shows all of it
+                    body: JSON.stringify({ message, session_id: sessionId, verbose: true })
                 });
                 
                 const data = await response.json();
@@ -489,6 +614,8 @@ async def serve_langgraph_interface():
     return HTMLResponse(content=langgraph_html)
 
 if __name__ == "__main__":
+    import uvicorn
+    
     print("🕸️ Starting LangGraph AI Agent Chat Server...")
     print("📱 Basic Interface: http://localhost:8000")
     print("🕸️ LangGraph Interface: http://localhost:8000/langgraph")
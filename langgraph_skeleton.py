@@ -3,15 +3,14 @@ LangGraph Skeleton Code - All 10 Building Blocks
 A complete template covering all essential components
 """
 
+import os
 from typing import TypedDict, List, Optional, Literal, Dict, Any, Annotated
 from langgraph.graph import StateGraph, END, START
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.graph.message import add_messages
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-import operator
+
+from single_flight import LLM_CALLS
+from llm_scheduler import LLM_SCHEDULER, estimate_tokens
 
 # ============================================================================
 # 1. STATE SCHEMA - Define what data flows through the agent
@@ -42,12 +41,22 @@ class AgentState(TypedDict):
 # LLM INTEGRATION - Setup language models
 # ============================================================================
 
-# Initialize LLM
-llm = ChatOpenAI(
-    model="gpt-3.5-turbo",
-    temperature=0.7,
-    max_tokens=1000
-)
+# LLM is created on first use - building it at import time loads langchain_openai
+# and requires an API key before any node has run
+_llm = None
+
+def get_llm():
+    """Return the shared LLM, creating it on first call"""
+    global _llm
+    if _llm is None:
+        from langchain_openai import ChatOpenAI
+        _llm = ChatOpenAI(
+            model="gpt-3.5-turbo",
+            temperature=0.7,
+            max_tokens=1000,
+            base_url=os.getenv("OPENAI_BASE_URL") or None  # e.g. mock_llm_server.py for benchmarks
+        )
+    return _llm
 
 # System prompts for different tasks
 INTENT_CLASSIFICATION_PROMPT = ChatPromptTemplate.from_messages([
@@ -70,6 +79,9 @@ RESPONSE_GENERATION_PROMPT = ChatPromptTemplate.from_messages([
     ("human", "{user_input}")
 ])
 
+# Rough token size of the system prompts above, for LLM rate-limit estimates
+PROMPT_TOKENS = 100
+
 # ============================================================================
 # 4. TOOLS - External functions the agent can call
 # ============================================================================
@@ -89,9 +101,8 @@ def validate_data(data: Dict) -> Dict:
     # Simulate data validation
     return {"valid": True, "errors": []}
 
-# Define tools list
+# Define tools list (wrapped in a ToolNode when the graph is built)
 tools = [search_database, send_notification, validate_data]
-tool_node = ToolNode(tools)
 
 # ============================================================================
 # 2. NODES - Individual processing functions
@@ -103,8 +114,12 @@ def classify_intent(state: AgentState) -> AgentState:
     
     try:
         # Use LLM for intent classification
+        # Identical inputs classified concurrently by other threads share one LLM call
+        llm = get_llm()
         chain = INTENT_CLASSIFICATION_PROMPT | llm
-        response = chain.invoke({"user_input": user_input})
+        response = LLM_CALLS.do(("classify_intent", " ".join(user_input.split())), LLM_SCHEDULER.call, chain.invoke,
+                                {"user_input": user_input},
+                                estimated_tokens=estimate_tokens(user_input, llm.max_tokens) + PROMPT_TOKENS)
         
         # Parse LLM response (simplified - should use proper JSON parsing)
         content = response.content
@@ -186,13 +201,16 @@ def generate_response(state: AgentState) -> AgentState:
     
     try:
         # Use LLM for response generation
+        llm = get_llm()
         chain = RESPONSE_GENERATION_PROMPT | llm
-        response = chain.invoke({
+        inputs = {
             "user_input": user_input,
             "intent": intent,
             "collected_data": str(collected_data),
             "context": f"Current step: {state['current_step']}"
-        })
+        }
+        response = LLM_CALLS.do(("generate_response", tuple(sorted(inputs.items()))), LLM_SCHEDULER.call, chain.invoke,
+                                inputs, estimated_tokens=estimate_tokens("".join(inputs.values()), llm.max_tokens) + PROMPT_TOKENS)
         
         formatted_response = response.content
         
@@ -278,6 +296,7 @@ def should_interrupt_after_error(state: AgentState) -> bool:
 
 def create_agent():
     """Create and compile the agent graph"""
+    from langgraph.prebuilt import ToolNode
     
     # Create the graph
     workflow = StateGraph(AgentState)
@@ -288,7 +307,7 @@ def create_agent():
     workflow.add_node("process_request", process_request)
     workflow.add_node("generate_response", generate_response)
     workflow.add_node("handle_error", handle_error)
-    workflow.add_node("tools", tool_node)
+    workflow.add_node("tools", ToolNode(tools))
     
     # Add edges
     workflow.add_edge(START, "classify_intent")
@@ -313,6 +332,8 @@ def create_agent():
 
 def setup_memory():
     """Setup persistent memory for the agent"""
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    
     # SQLite checkpointer for development
     memory = SqliteSaver.from_conn_string(":memory:")
     return memory
@@ -495,6 +516,7 @@ def setup_llm(config: AgentConfig = AgentConfig()):
         from langchain_community.llms import Ollama
         return Ollama(model=config.LOCAL_MODEL_PATH)
     else:
+        from langchain_openai import ChatOpenAI
         return ChatOpenAI(
             model=config.MODEL_NAME,
             temperature=config.TEMPERATURE,
@@ -1,8 +1,18 @@
 """
 Comparison: Linear Agent vs LangGraph Agent
-Shows the architectural differences
+Shows the architectural differences and benchmarks what the graph runtime costs per turn
 """
 
+import gc
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tracemalloc
+from typing import Dict, Any, List, Callable
+
 # ============================================================================
 # CURRENT APPROACH: Linear Agent
 # ============================================================================
@@ -11,17 +21,17 @@ class LinearAgent:
     """Our current enhanced agent - linear flow"""
     
     def run(self, user_input: str) -> str:
-        # Linear sequence - one after another
-        processed_input = self._process_input(user_input)        # Step 1
-        intent = self._recognize_intent(processed_input)         # Step 2
-        self._update_memory(user_input, intent, processed_input) # Step 3
-        action = self._make_decision(intent, processed_input)    # Step 4
-        result = self._execute_tool(action, processed_input)     # Step 5
-        response = self._generate_response(result, intent)       # Step 6
-        self._update_state(intent, action, processed_input)     # Step 7
-        final_output = self._deliver_output(response)           # Step 8
-        self._learn_from_interaction(user_input, intent, response) # Step 9
-        return final_output
+        # Linear sequence - one after another, calling the same node functions
+        # the graph uses so any difference is the graph runtime itself
+        state = new_state(user_input)
+        process_input_node(state)                                  # Step 1
+        classify_intent_node(state)                                # Step 2
+        if route_after_classification(state) == "approval_needed": # Step 3
+            approval_node(state)
+        else:
+            execute_tool_node(state)                               # Step 4
+        generate_response_node(state)                              # Step 5
+        return state["response"]
 
 # ============================================================================
 # LANGGRAPH APPROACH: Graph-based Agent
@@ -41,6 +51,19 @@ class AgentState(TypedDict):
     requires_approval: bool
     error: str
 
+def new_state(user_input: str) -> AgentState:
+    """Fresh input state for one turn"""
+    return {
+        "user_input": user_input,
+        "processed_input": "",
+        "intent": "",
+        "confidence": 0.0,
+        "tool_result": {},
+        "response": "",
+        "requires_approval": False,
+        "error": ""
+    }
+
 def process_input_node(state: AgentState) -> AgentState:
     """Node: Process user input"""
     state["processed_input"] = state["user_input"].strip().lower()
@@ -121,7 +144,7 @@ def route_after_approval(state: AgentState) -> str:
     else:
         return "generate_response"
 
-def create_langgraph_agent():
+def create_langgraph_agent(checkpointer=None):
     """Create LangGraph-based agent"""
     
     # Create the graph
@@ -160,7 +183,7 @@ def create_langgraph_agent():
         }
     )
     
-    return workflow.compile()
+    return workflow.compile(checkpointer=checkpointer)
 
 # ============================================================================
 # COMPARISON DEMO
@@ -195,19 +218,181 @@ def compare_approaches():
     print("🕸️ LangGraph Flow:")
     langgraph_agent = create_langgraph_agent()
     
-    initial_state = {
-        "user_input": test_input,
-        "processed_input": "",
-        "intent": "",
-        "confidence": 0.0,
-        "tool_result": {},
-        "response": "",
-        "requires_approval": False,
-        "error": ""
+    result = langgraph_agent.invoke(new_state(test_input))
+    print(f"Result: {result['response']}")
+    
+    print("🔄 Linear Flow:")
+    print(f"Result: {LinearAgent().run(test_input)}")
+
+# ============================================================================
+# BENCHMARK - per-turn cost of the graph runtime
+# ============================================================================
+
+INPUT_TEMPLATES = [
+    "Find me a {adj} laptop",
+    "Any {adj} laptop deals under ${price}?",
+    "What's the weather in {city}?",
+    "Is the weather {adj} in {city} today?",
+    "Tell me something {adj}",
+    "Can you help with my {thing}?",
+]
+FILLERS = {
+    "adj": ["cheap", "fast", "light", "good", "gaming", "quiet", "nice"],
+    "price": ["500", "800", "1200", "2000"],
+    "city": ["London", "Paris", "Tokyo", "New York", "Berlin"],
+    "thing": ["order", "account", "homework", "trip"],
+}
+
+def generate_inputs(count: int, seed: int = 7) -> List[str]:
+    """Deterministic mix of product, weather and general inputs"""
+    rng = random.Random(seed)
+    inputs = []
+    for _ in range(count):
+        template = rng.choice(INPUT_TEMPLATES)
+        inputs.append(template.format(**{key: rng.choice(values) for key, values in FILLERS.items()}))
+    return inputs
+
+def _graph_runner(checkpointer=None, threads: int = 100) -> Callable[[int, str], Any]:
+    app = create_langgraph_agent(checkpointer)
+    if checkpointer is None:
+        return lambda index, text: app.invoke(new_state(text))
+    configs = [{"configurable": {"thread_id": f"bench-{thread}"}} for thread in range(threads)]
+    return lambda index, text: app.invoke(new_state(text), config=configs[index % threads])
+
+VARIANTS: Dict[str, Callable[[], Callable[[int, str], Any]]] = {
+    "linear": lambda: (lambda agent: (lambda index, text: agent.run(text)))(LinearAgent()),
+    "graph": lambda: _graph_runner(),
+    "graph+memory_saver": lambda: _graph_runner(_memory_saver()),
+    "graph+sqlite_saver": lambda: _graph_runner(_sqlite_saver()),
+}
+
+def _memory_saver():
+    from langgraph.checkpoint.memory import MemorySaver
+    return MemorySaver()
+
+def _sqlite_saver():
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    return SqliteSaver(sqlite3.connect(":memory:", check_same_thread=False))
+
+def measure_variant(factory: Callable, inputs: List[str], warmup: int = 50, memory_turns: int = 500) -> Dict[str, Any]:
+    """CPU/wall time, allocation pressure and peak memory per turn for one variant
+    
+    Python has no cheap per-allocation counter, so allocation cost is reported as
+    gen-0 GC collections (container-allocation churn) and net retained blocks.
+    Peak memory comes from a second, tracemalloc-instrumented pass over the first
+    memory_turns inputs so tracing doesn't inflate the timings.
+    """
+    turns = len(inputs)
+    
+    # Pass 1: timing + allocation pressure
+    run = factory()
+    for index, text in enumerate(inputs[:warmup]):
+        run(index, text)
+    gc.collect()
+    gen0_before = gc.get_stats()[0]["collections"]
+    blocks_before = sys.getallocatedblocks()
+    cpu_start, wall_start = time.process_time_ns(), time.perf_counter_ns()
+    for index, text in enumerate(inputs):
+        run(index, text)
+    cpu_ns = time.process_time_ns() - cpu_start
+    wall_ns = time.perf_counter_ns() - wall_start
+    gen0 = gc.get_stats()[0]["collections"] - gen0_before
+    retained_blocks = sys.getallocatedblocks() - blocks_before
+    del run
+    gc.collect()
+    
+    # Pass 2: peak traced memory over a fresh instance
+    run = factory()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for index, text in enumerate(inputs[:memory_turns]):
+        run(index, text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        "turns": turns,
+        "cpu_us_per_turn": round(cpu_ns / turns / 1000, 3),
+        "wall_us_per_turn": round(wall_ns / turns / 1000, 3),
+        "gc_gen0_per_1k_turns": round(gen0 * 1000 / turns, 2),
+        "retained_blocks_per_turn": round(retained_blocks / turns, 2),
+        "peak_kib": round((peak - baseline) / 1024, 1),
+        "memory_turns": min(turns, memory_turns),
     }
+
+def run_benchmark(turns: int = 2000, variants: List[str] = None, seed: int = 7,
+                  memory_turns: int = 500) -> Dict[str, Any]:
+    inputs = generate_inputs(turns, seed)
+    results = {"python": sys.version.split()[0], "turns": turns, "variants": {}}
+    for name in variants or list(VARIANTS):
+        results["variants"][name] = measure_variant(VARIANTS[name], inputs, memory_turns=memory_turns)
     
-    result = langgraph_agent.invoke(initial_state)
-    print(f"Result: {result['response']}")
+    linear = results["variants"].get("linear")
+    if linear:
+        for name, data in results["variants"].items():
+            if name != "linear":
+                data["overhead_cpu_us_per_turn"] = round(data["cpu_us_per_turn"] - linear["cpu_us_per_turn"], 3)
+                data["overhead_ratio"] = round(data["cpu_us_per_turn"] / linear["cpu_us_per_turn"], 1)
+    return results
+
+# Metric -> absolute growth ignored as noise even when the relative threshold is exceeded
+REGRESSION_METRICS = {"cpu_us_per_turn": 1.0, "retained_blocks_per_turn": 1.0, "peak_kib": 16.0}
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Metrics that grew more than threshold (fraction) over the baseline"""
+    regressions = []
+    for name, data in results["variants"].items():
+        previous = baseline.get("variants", {}).get(name)
+        if not previous:
+            continue
+        for metric, noise_floor in REGRESSION_METRICS.items():
+            old, new = previous.get(metric), data.get(metric)
+            if old is None or new is None or old <= 0:
+                continue
+            if new > old * (1 + threshold) and new - old > noise_floor:
+                regressions.append(f"{name}.{metric}: {old} → {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+def print_benchmark(results: Dict[str, Any]):
+    print(f"⏱️ Linear vs LangGraph - {results['turns']} turns per variant")
+    print("=" * 86)
+    print(f"  {'variant':<22}{'cpu µs/turn':>13}{'wall µs/turn':>14}{'overhead':>11}{'gen0/1k':>9}"
+          f"{'blocks/turn':>13}{'peak KiB':>10}")
+    for name, data in results["variants"].items():
+        overhead = f"{data['overhead_ratio']}x" if "overhead_ratio" in data else "-"
+        print(f"  {name:<22}{data['cpu_us_per_turn']:>13.1f}{data['wall_us_per_turn']:>14.1f}{overhead:>11}"
+              f"{data['gc_gen0_per_1k_turns']:>9.1f}{data['retained_blocks_per_turn']:>13.2f}{data['peak_kib']:>10.1f}")
 
 if __name__ == "__main__":
-    compare_approaches()
+    parser = argparse.ArgumentParser(description="Benchmark LinearAgent against the compiled LangGraph agent")
+    parser.add_argument("--demo", action="store_true", help="print the design comparison and one run instead")
+    parser.add_argument("--turns", type=int, default=2000)
+    parser.add_argument("--memory-turns", type=int, default=500, help="turns traced for peak memory")
+    parser.add_argument("--variants", help=f"comma-separated subset of {', '.join(VARIANTS)}")
+    parser.add_argument("--output", help="write results JSON here (use as a future --compare baseline)")
+    parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed growth before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+    
+    if args.demo:
+        compare_approaches()
+        sys.exit(0)
+    
+    results = run_benchmark(args.turns, args.variants.split(",") if args.variants else None,
+                            memory_turns=args.memory_turns)
+    print_benchmark(results)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        print()
+        if regressions:
+            print("❌ Regressions:")
+            for regression in regressions:
+                print(f"   • {regression}")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
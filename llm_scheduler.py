@@ -0,0 +1,257 @@
+"""
+LLM Scheduler - Process-wide rate limiting and prioritisation of outbound LLM calls
+Token buckets on requests/min and tokens/min; interactive calls are admitted before background ones, within a queue deadline
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Dict, Any, Callable, Optional
+
+from metrics import REGISTRY
+from resilience import BackendUnavailable
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1}  # Lower is admitted first
+
+# Priority for calls that don't pass one explicitly (e.g. LangGraph nodes)
+current_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+LLM_QUEUE_WAIT = REGISTRY.histogram("llm_queue_wait_seconds", "Time LLM calls waited for rate-limit capacity", ("priority",))
+LLM_QUEUE_TIMEOUTS = REGISTRY.counter("llm_queue_timeouts_total", "LLM calls dropped after waiting past their deadline", ("priority",))
+LLM_RATE_LIMITED = REGISTRY.counter("llm_rate_limited_total", "429 responses that reached the scheduler")
+LLM_ADMITTED = REGISTRY.counter("llm_calls_admitted_total", "LLM calls admitted by the scheduler", ("priority",))
+
+class QueueTimeout(BackendUnavailable):
+    """No rate-limit capacity became available before the call's queue deadline"""
+    pass
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+@dataclass
+class SchedulerConfig:
+    """Provider limits; 0 disables a limit"""
+    requests_per_minute: float = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+    tokens_per_minute: float = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+    burst_seconds: float = 2.0                 # Bucket size in seconds of quota - smooths instead of bursting
+    interactive_max_wait: float = float(os.getenv("LLM_INTERACTIVE_MAX_WAIT", "10"))
+    background_max_wait: float = float(os.getenv("LLM_BACKGROUND_MAX_WAIT", "120"))
+    default_retry_after: float = 1.0           # Pause after a 429 without a Retry-After header
+
+# ============================================================================
+# TOKEN BUCKET
+# ============================================================================
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60; the level may go negative (debt)"""
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken (requests larger than the bucket only need a full bucket)"""
+        self._refill(now)
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def give_back(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+    def pause(self, seconds: float, now: float):
+        """Empty the bucket so nothing is admitted for `seconds`"""
+        self._refill(now)
+        self.level = min(self.level, -seconds * self.rate)
+
+# ============================================================================
+# SCHEDULER
+# ============================================================================
+
+def estimate_tokens(text: str, max_tokens: int = 0) -> int:
+    """Rough prompt + completion budget (~4 characters per token)"""
+    return len(text) // 4 + 1 + (max_tokens or 0)
+
+def _total_tokens(response) -> Optional[int]:
+    """Actual usage from an OpenAI completion or a LangChain message"""
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        return getattr(usage, "total_tokens", None)
+    metadata = getattr(response, "response_metadata", None) or {}
+    return (metadata.get("token_usage") or {}).get("total_tokens")
+
+class LLMScheduler:
+    """Admits LLM calls strictly by (priority, arrival) once both buckets have room
+
+    Only the head of the queue consumes capacity, so a background call can't
+    take quota an interactive call is waiting for. Callers block (threads) up
+    to their priority's max wait, then get QueueTimeout - which the agents'
+    existing error handling turns into the rule-based fallback.
+    """
+
+    def __init__(self, config: SchedulerConfig = None):
+        self._cond = threading.Condition()
+        self._queue: list = []                 # [rank, seq, tokens, active]
+        self._seq = itertools.count()
+        self.waiting = {priority: 0 for priority in PRIORITIES}
+        self.configure(config or SchedulerConfig())
+
+    def configure(self, config: SchedulerConfig):
+        """Apply new limits (buckets start full); queued calls re-check against them"""
+        with self._cond:
+            self.config = config
+            self.requests = TokenBucket(config.requests_per_minute, config.burst_seconds) \
+                if config.requests_per_minute > 0 else None
+            self.tokens = TokenBucket(config.tokens_per_minute, config.burst_seconds) \
+                if config.tokens_per_minute > 0 else None
+            self._cond.notify_all()
+
+    @property
+    def limited(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = self.requests.wait_time(1, now) if self.requests else 0.0
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, now))
+        return wait
+
+    def acquire(self, tokens: int, priority: str = None, max_wait: float = None) -> float:
+        """Block until the call may be sent; returns seconds spent queued"""
+        priority = priority or current_priority.get()
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown LLM priority: {priority}")
+        if not self.limited:
+            LLM_ADMITTED.labels(priority).inc()
+            return 0.0
+
+        if max_wait is None:
+            max_wait = self.config.interactive_max_wait if priority == INTERACTIVE else self.config.background_max_wait
+        start = time.monotonic()
+        deadline = start + max_wait
+        entry = [PRIORITIES[priority], next(self._seq), tokens, True]
+
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            self.waiting[priority] += 1
+            try:
+                while True:
+                    while self._queue and not self._queue[0][3]:
+                        heapq.heappop(self._queue)
+                    now = time.monotonic()
+                    wait = None                # Not at the head: sleep until the queue moves
+                    if self._queue[0] is entry:
+                        wait = self._wait_time(tokens, now)
+                        if wait <= 0:
+                            heapq.heappop(self._queue)
+                            if self.requests:
+                                self.requests.take(1)
+                            if self.tokens:
+                                self.tokens.take(tokens)
+                            break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        entry[3] = False
+                        LLM_QUEUE_TIMEOUTS.labels(priority).inc()
+                        raise QueueTimeout(f"LLM rate limit: no capacity within {max_wait:.1f}s ({priority})")
+                    self._cond.wait(remaining if wait is None else min(wait, remaining))
+            except BaseException:
+                entry[3] = False
+                raise
+            finally:
+                self.waiting[priority] -= 1
+                self._cond.notify_all()        # Next head re-checks capacity
+
+        LLM_ADMITTED.labels(priority).inc()
+        waited = time.monotonic() - start
+        LLM_QUEUE_WAIT.labels(priority).observe(waited)
+        return waited
+
+    def settle(self, estimated: int, actual: Optional[int]):
+        """Correct the token bucket once real usage is known"""
+        if self.tokens is None or actual is None:
+            return
+        with self._cond:
+            if actual > estimated:
+                self.tokens.take(actual - estimated)
+            else:
+                self.tokens.give_back(estimated - actual)
+                self._cond.notify_all()
+
+    def report_error(self, error: BaseException):
+        """A 429 means our limits are above the provider's: pause admissions for Retry-After"""
+        if getattr(error, "status_code", None) != 429:
+            return
+        LLM_RATE_LIMITED.inc()
+        retry_after = self.config.default_retry_after
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        try:
+            retry_after = float(headers.get("retry-after", retry_after))
+        except (TypeError, ValueError):
+            pass
+        if self.requests:
+            with self._cond:
+                self.requests.pause(retry_after, time.monotonic())
+
+    def call(self, fn: Callable, *args, estimated_tokens: int, priority: str = None, **kwargs):
+        """acquire, run fn(*args, **kwargs), then settle usage / report a 429"""
+        self.acquire(estimated_tokens, priority)
+        try:
+            response = fn(*args, **kwargs)
+        except Exception as e:
+            self.report_error(e)
+            raise
+        self.settle(estimated_tokens, _total_tokens(response))
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests_per_minute": self.config.requests_per_minute,
+            "tokens_per_minute": self.config.tokens_per_minute,
+            "waiting": dict(self.waiting),
+            "admitted": {priority: int(LLM_ADMITTED.labels(priority).get()) for priority in PRIORITIES},
+            "request_bucket": round(self.requests.level, 2) if self.requests else None,
+            "token_bucket": round(self.tokens.level, 1) if self.tokens else None,
+        }
+
+@contextmanager
+def llm_priority(priority: str):
+    """Run LLM calls made inside the block at this priority (e.g. batch jobs use BACKGROUND)"""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+# ============================================================================
+# PROCESS-WIDE SCHEDULER
+# ============================================================================
+
+LLM_SCHEDULER = LLMScheduler()
+
+REGISTRY.callback_gauge("llm_queue_depth", "LLM calls waiting for rate-limit capacity",
+                        lambda: {(priority,): count for priority, count in LLM_SCHEDULER.waiting.items()}, ("priority",))
+
+def configure_scheduler(**kwargs) -> LLMScheduler:
+    """Update the process-wide limits (SchedulerConfig fields)"""
+    LLM_SCHEDULER.configure(replace(LLM_SCHEDULER.config, **kwargs))
+    return LLM_SCHEDULER
+
+def get_scheduler_stats() -> Dict[str, Any]:
+    return LLM_SCHEDULER.get_stats()
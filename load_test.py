@@ -0,0 +1,522 @@
+"""
+Load Test - Async load generator for /chat, /chat/async, /chat/stream and /ws
+Closed- or open-loop traffic against either chat server; reports RPS, latency percentiles, TTFB and errors
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, List, Optional, Tuple
+
+# Optional: WebSocket client for the /ws endpoint
+try:
+    import websockets
+    HAS_WEBSOCKETS = True
+except ImportError:
+    HAS_WEBSOCKETS = False
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WS_ENDPOINT = "/ws"
+
+# Endpoints each server actually exposes (/ws needs the websockets package)
+SERVER_ENDPOINTS = {
+    "chat_server": ["/chat", "/chat/stream"] + ([WS_ENDPOINT] if HAS_WEBSOCKETS else []),
+    "langgraph_chat_server": ["/chat", "/chat/async", "/chat/stream"] + ([WS_ENDPOINT] if HAS_WEBSOCKETS else []),
+}
+
+# Default message mix: (message, weight)
+DEFAULT_MIX = [
+    ("Hello there!", 3),
+    ("What's the weather like in London?", 3),
+    ("Search for laptops", 2),
+    ("What time is it?", 1),
+    ("Can you help me?", 1),
+    ("Why is the sky blue?", 2),
+    ("Goodbye", 1),
+]
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+@dataclass
+class LoadTestConfig:
+    """One load-test run"""
+    base_url: str = "http://127.0.0.1:8000"
+    endpoints: List[str] = field(default_factory=lambda: ["/chat"])
+    concurrency: int = 10           # Closed loop: workers; open loop: max in-flight requests
+    sessions: int = 50              # Distinct session_ids spread over the traffic
+    requests: int = 500             # Total requests (ignored when duration is set)
+    duration: float = 0.0           # Seconds to run instead of a fixed request count
+    mode: str = "closed"            # "closed" (next request after the last completes) or "open" (Poisson arrivals)
+    rate: float = 50.0              # Open loop: target arrivals per second
+    timeout: float = 60.0
+    seed: int = 42
+    mix: List[Tuple[str, float]] = field(default_factory=lambda: list(DEFAULT_MIX))
+
+# ============================================================================
+# MINIMAL ASYNC HTTP/1.1 CLIENT (keep-alive, chunked, exact TTFB)
+# ============================================================================
+
+class HTTPConnectionPool:
+    """Idle keep-alive connections to one host"""
+
+    def __init__(self, base_url: str):
+        parsed = urllib.parse.urlparse(base_url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip("/")
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def acquire(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer
+        return await asyncio.open_connection(self.host, self.port)
+
+    def release(self, conn, reusable: bool):
+        if reusable:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+
+    async def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str], on_first_byte) -> bytes:
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                await reader.readline()  # Trailer terminator
+                return b"".join(chunks)
+            data = await reader.readexactly(size)
+            await reader.readexactly(2)
+            if data.strip():
+                on_first_byte()
+            chunks.append(data)
+    if "content-length" in headers:
+        data = await reader.readexactly(int(headers["content-length"]))
+        on_first_byte()
+        return data
+    data = await reader.read()  # Close-delimited
+    on_first_byte()
+    return data
+
+async def http_request(pool: HTTPConnectionPool, method: str, path: str,
+                       body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Send one request; returns status, body, and TTFB/total seconds"""
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    request = (
+        f"{method} {pool.prefix}{path} HTTP/1.1\r\n"
+        f"Host: {pool.host}:{pool.port}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n"
+    ).encode("latin-1") + payload
+
+    start = time.perf_counter()
+    first_byte = []
+    reader, writer = conn = await pool.acquire()
+    reusable = False
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed before response")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        data = await _read_body(reader, headers, lambda: first_byte or first_byte.append(time.perf_counter()))
+        reusable = headers.get("connection", "").lower() != "close" and (
+            "content-length" in headers or "transfer-encoding" in headers
+        )
+    finally:
+        pool.release(conn, reusable)
+
+    end = time.perf_counter()
+    return {
+        "status": status,
+        "body": data,
+        "ttfb": (first_byte[0] if first_byte else end) - start,
+        "latency": end - start,
+    }
+
+# ============================================================================
+# WEBSOCKET CLIENT (/ws: one connection carries many turns)
+# ============================================================================
+
+class WebSocketPool:
+    """Idle /ws connections per session, like one browser tab per conversation
+
+    A connection carries one turn at a time here; the server's per-socket
+    session limit (WS_MAX_SESSIONS) is why sockets aren't shared across sessions.
+    """
+
+    def __init__(self, base_url: str):
+        parsed = urllib.parse.urlparse(base_url)
+        scheme = "wss" if parsed.scheme == "https" else "ws"
+        self.url = f"{scheme}://{parsed.netloc}{parsed.path.rstrip('/')}{WS_ENDPOINT}"
+        self._idle: Dict[str, List[Any]] = {}
+        self._request_ids = 0
+        self.opened = 0
+
+    async def acquire(self, session_id: str):
+        idle = self._idle.get(session_id)
+        if idle:
+            return idle.pop()
+        self.opened += 1
+        return await websockets.connect(f"{self.url}?session_id={urllib.parse.quote(session_id)}", max_size=None)
+
+    def release(self, session_id: str, conn, reusable: bool):
+        if reusable:
+            self._idle.setdefault(session_id, []).append(conn)
+        else:
+            asyncio.ensure_future(conn.close())
+
+    def next_id(self) -> int:
+        self._request_ids += 1
+        return self._request_ids
+
+    async def close(self):
+        await asyncio.gather(*(conn.close() for idle in self._idle.values() for conn in idle), return_exceptions=True)
+        self._idle.clear()
+
+async def ws_turn(pool: WebSocketPool, message: str, session_id: str) -> Dict[str, Any]:
+    """One turn over /ws; TTFB is the first frame of this turn, latency runs to complete/error"""
+    start = time.perf_counter()
+    first_frame = None
+    request_id = pool.next_id()
+    conn = await pool.acquire(session_id)
+    reusable = False
+    try:
+        await conn.send(json.dumps({"type": "chat", "id": request_id, "session_id": session_id, "message": message}))
+        while True:
+            frame = json.loads(await conn.recv())
+            if frame.get("id") != request_id:
+                continue  # hello / status pushes
+            if first_frame is None:
+                first_frame = time.perf_counter()
+            if frame["type"] in ("complete", "error"):
+                break
+        reusable = True
+    finally:
+        pool.release(session_id, conn, reusable)
+
+    end = time.perf_counter()
+    return {
+        "status": frame.get("status", 200),
+        "body": frame,
+        "ttfb": first_frame - start,
+        "latency": end - start,
+    }
+
+# ============================================================================
+# RESULTS
+# ============================================================================
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile (p in 0-100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def _latency_summary(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {}
+    return {
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(max(values) * 1000, 3),
+    }
+
+class ResultCollector:
+    """Per-endpoint samples for one run"""
+
+    def __init__(self):
+        self.samples: Dict[str, Dict[str, list]] = {}
+
+    def _endpoint(self, endpoint: str) -> Dict[str, list]:
+        return self.samples.setdefault(endpoint, {"latency": [], "ttfb": [], "queue": [], "errors": []})
+
+    def record(self, endpoint: str, latency: float, ttfb: float, queued: float, error: Optional[str]):
+        bucket = self._endpoint(endpoint)
+        if error:
+            bucket["errors"].append(error)
+        else:
+            bucket["latency"].append(latency)
+            bucket["ttfb"].append(ttfb)
+        bucket["queue"].append(queued)
+
+    def report(self, config: LoadTestConfig, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        total = errors = 0
+        for endpoint, bucket in self.samples.items():
+            count = len(bucket["latency"]) + len(bucket["errors"])
+            total += count
+            errors += len(bucket["errors"])
+            error_kinds: Dict[str, int] = {}
+            for error in bucket["errors"]:
+                error_kinds[error] = error_kinds.get(error, 0) + 1
+            endpoints[endpoint] = {
+                "requests": count,
+                "rps": round(count / elapsed, 2) if elapsed else 0.0,
+                "error_rate": round(len(bucket["errors"]) / count, 4) if count else 0.0,
+                "errors": error_kinds,
+                "latency": _latency_summary(bucket["latency"]),
+                "ttfb": _latency_summary(bucket["ttfb"]),
+            }
+            if config.mode == "open":
+                # Time between scheduled arrival and send (client-side backlog)
+                endpoints[endpoint]["client_queue"] = _latency_summary(bucket["queue"])
+        return {
+            "config": {key: value for key, value in asdict(config).items() if key != "mix"},
+            "elapsed_seconds": round(elapsed, 3),
+            "total_requests": total,
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "endpoints": endpoints,
+        }
+
+# ============================================================================
+# TRAFFIC
+# ============================================================================
+
+async def send_turn(pool: HTTPConnectionPool, endpoint: str, message: str, session_id: str,
+                    timeout: float, sockets: Optional[WebSocketPool] = None) -> Tuple[float, float, Optional[str]]:
+    """One chat turn; returns (latency, ttfb, error)"""
+    start = time.perf_counter()
+    if endpoint == WS_ENDPOINT:
+        call = ws_turn(sockets, message, session_id)
+    else:
+        call = http_request(pool, "POST", endpoint, {"message": message, "session_id": session_id})
+    try:
+        result = await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        return time.perf_counter() - start, 0.0, "timeout"
+    except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+        return time.perf_counter() - start, 0.0, type(e).__name__
+    except Exception as e:
+        if HAS_WEBSOCKETS and isinstance(e, websockets.exceptions.WebSocketException):
+            return time.perf_counter() - start, 0.0, type(e).__name__
+        raise
+
+    if result["status"] >= 400:
+        return result["latency"], result["ttfb"], f"http_{result['status']}"
+    if endpoint.endswith("/stream") and b'"type": "error"' in result["body"]:
+        return result["latency"], result["ttfb"], "stream_error"
+    return result["latency"], result["ttfb"], None
+
+class TrafficPlan:
+    """Deterministic stream of (endpoint, message, session_id) picks"""
+
+    def __init__(self, config: LoadTestConfig):
+        self.rng = random.Random(config.seed)
+        self.endpoints = config.endpoints
+        self.messages = [message for message, _ in config.mix]
+        self.weights = [weight for _, weight in config.mix]
+        self.session_ids = [f"load-{index}" for index in range(config.sessions)]
+
+    def next(self) -> Tuple[str, str, str]:
+        return (
+            self.rng.choice(self.endpoints),
+            self.rng.choices(self.messages, self.weights)[0],
+            self.rng.choice(self.session_ids),
+        )
+
+async def run_load_test(config: LoadTestConfig) -> Dict[str, Any]:
+    """Drive the server and return the JSON report"""
+    pool = HTTPConnectionPool(config.base_url)
+    sockets = WebSocketPool(config.base_url) if WS_ENDPOINT in config.endpoints else None
+    plan = TrafficPlan(config)
+    collector = ResultCollector()
+    start = time.perf_counter()
+    deadline = start + config.duration if config.duration else None
+    issued = 0
+
+    def more() -> bool:
+        if deadline is not None:
+            return time.perf_counter() < deadline
+        return issued < config.requests
+
+    if config.mode == "closed":
+        async def worker():
+            nonlocal issued
+            while more():
+                issued += 1
+                endpoint, message, session_id = plan.next()
+                latency, ttfb, error = await send_turn(pool, endpoint, message, session_id, config.timeout, sockets)
+                collector.record(endpoint, latency, ttfb, 0.0, error)
+
+        await asyncio.gather(*(worker() for _ in range(config.concurrency)))
+    else:
+        # Open loop: arrivals follow a Poisson process regardless of completions.
+        # Latency is measured from the scheduled arrival so backlog isn't hidden.
+        limiter = asyncio.Semaphore(config.concurrency)
+        rng = random.Random(config.seed + 1)
+        tasks = []
+
+        async def arrival(scheduled: float, endpoint: str, message: str, session_id: str):
+            async with limiter:
+                queued = time.perf_counter() - scheduled
+                latency, ttfb, error = await send_turn(pool, endpoint, message, session_id, config.timeout, sockets)
+                collector.record(endpoint, latency + queued, ttfb + queued, queued, error)
+
+        next_arrival = time.perf_counter()
+        while more():
+            issued += 1
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(arrival(next_arrival, *plan.next())))
+            next_arrival += rng.expovariate(config.rate)
+        await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - start
+    await pool.close()
+    report = collector.report(config, elapsed)
+    if sockets:
+        await sockets.close()
+        report["ws_connections_opened"] = sockets.opened
+    return report
+
+def print_summary(report: Dict[str, Any]):
+    config = report["config"]
+    print("📈 Load Test")
+    print("=" * 72)
+    print(f"  {config['base_url']}  mode={config['mode']}  concurrency={config['concurrency']}  "
+          f"sessions={config['sessions']}")
+    print(f"  {report['total_requests']} requests in {report['elapsed_seconds']:.2f}s  "
+          f"→ {report['rps']:.1f} req/s, error rate {report['error_rate'] * 100:.2f}%")
+    print()
+    print(f"  {'endpoint':<14}{'reqs':>7}{'rps':>9}{'err%':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'ttfb p50':>11}")
+    for endpoint, data in report["endpoints"].items():
+        latency, ttfb = data["latency"], data["ttfb"]
+        print(f"  {endpoint:<14}{data['requests']:>7}{data['rps']:>9.1f}{data['error_rate'] * 100:>6.1f}%"
+              f"{latency.get('p50_ms', 0):>8.1f}ms{latency.get('p95_ms', 0):>8.1f}ms"
+              f"{latency.get('p99_ms', 0):>8.1f}ms{ttfb.get('p50_ms', 0):>9.1f}ms")
+        if data["errors"]:
+            print(f"  {'':<14}errors: {data['errors']}")
+    if "ws_connections_opened" in report:
+        print(f"  /ws turns used {report['ws_connections_opened']} connection(s) "
+              f"(status is pushed on them instead of polled)")
+
+# ============================================================================
+# LOCAL STACK (server + mock LLM)
+# ============================================================================
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_local_stack(server: str, ttft_ms: float, tokens_per_second: float, timeout: float = 30.0):
+    """Start the mock LLM in-process and `uvicorn server:app` pointed at it; returns (base_url, cleanup)"""
+    from mock_llm_server import MockLLMServer, MockLLMConfig
+
+    llm = MockLLMServer(config=MockLLMConfig(ttft_ms=ttft_ms, tokens_per_second=tokens_per_second, seed=0)).start()
+    port = _free_port()
+    env = {**os.environ, "OPENAI_API_KEY": "mock", "OPENAI_BASE_URL": llm.base_url}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{server}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    def cleanup():
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        llm.stop()
+
+    base_url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if proc.poll() is not None:
+            llm.stop()
+            raise RuntimeError(f"{server} exited during startup")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=1.0) as response:
+                if response.status == 200:
+                    return base_url, cleanup
+        except OSError:
+            time.sleep(0.05)
+    cleanup()
+    raise RuntimeError(f"{server} did not become healthy within {timeout}s")
+
+def load_mix(path: str) -> List[Tuple[str, float]]:
+    """Message mix from JSON ([[message, weight], ...]) or JSONL ({"message": ..., "weight": ...})"""
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+            return [(row["message"], float(row.get("weight", 1))) for row in rows]
+        return [(message, float(weight)) for message, weight in json.load(f)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the chat servers")
+    parser.add_argument("--server", choices=sorted(SERVER_ENDPOINTS), default="chat_server",
+                        help="server module (decides default endpoints and what --local starts)")
+    parser.add_argument("--url", help="target an already running server instead of --local")
+    parser.add_argument("--local", action="store_true", help="start the server against a local mock LLM")
+    parser.add_argument("--endpoints", help="comma-separated, e.g. /chat,/ws to compare HTTP and WebSocket turns")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=0.0, help="seconds (overrides --requests)")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--rate", type=float, default=50.0, help="open-loop arrivals per second")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mix", help="message mix file (.json or .jsonl)")
+    parser.add_argument("--mock-ttft-ms", type=float, default=200.0)
+    parser.add_argument("--mock-tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        endpoints=args.endpoints.split(",") if args.endpoints else SERVER_ENDPOINTS[args.server],
+        concurrency=args.concurrency, sessions=args.sessions, requests=args.requests,
+        duration=args.duration, mode=args.mode, rate=args.rate, timeout=args.timeout, seed=args.seed
+    )
+    if args.mix:
+        config.mix = load_mix(args.mix)
+
+    cleanup = None
+    if args.url:
+        config.base_url = args.url
+    elif args.local:
+        config.base_url, cleanup = start_local_stack(args.server, args.mock_ttft_ms, args.mock_tokens_per_second)
+    try:
+        report = asyncio.run(run_load_test(config))
+    finally:
+        if cleanup:
+            cleanup()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    print_summary(report)
@@ -0,0 +1,344 @@
+"""
+Metrics - Prometheus text-format metrics for both chat servers
+Per-thread counter cells keep the hot path lock-free; everything is summed at scrape time
+"""
+
+import time
+import asyncio
+import threading
+from typing import Dict, Any, Callable, List, Tuple
+
+from histograms import LatencyHistogram
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ============================================================================
+# PRIMITIVES
+# ============================================================================
+
+class _Cell:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+class CounterChild:
+    """Monotonic counter; each thread writes only its own cell"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._cells: List[_Cell] = []
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        cell = getattr(self._local, "cell", None)
+        if cell is None:
+            cell = _Cell()
+            with self._lock:  # Once per thread
+                self._cells.append(cell)
+            self._local.cell = cell
+        cell.value += amount
+
+    def get(self) -> float:
+        return sum(cell.value for cell in list(self._cells))
+
+class GaugeChild(CounterChild):
+    """Up/down gauge built from per-thread deltas, plus an absolute set()"""
+
+    def __init__(self):
+        super().__init__()
+        self._base = 0.0
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        # Fold existing deltas into the base; used from a single writer (e.g. the loop-lag task)
+        self._base = value - (self.get() - self._base)
+
+    def get(self) -> float:
+        return self._base + super().get()
+
+# ============================================================================
+# METRIC FAMILIES
+# ============================================================================
+
+class MetricFamily:
+    """A named metric with optional labels; children are created on first use"""
+
+    child_class = CounterChild
+    metric_type = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self.child_class()
+        return child
+
+    # Unlabelled shortcuts
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _label_str(self, values: tuple) -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.metric_type}"]
+        for values, child in sorted(self._children.items(), key=lambda item: item[0]):
+            lines.append(f"{self.name}{self._label_str(values)} {_fmt(child.get())}")
+        return lines
+
+class Counter(MetricFamily):
+    child_class = CounterChild
+    metric_type = "counter"
+
+class Gauge(MetricFamily):
+    child_class = GaugeChild
+    metric_type = "gauge"
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+class Histogram(MetricFamily):
+    child_class = LatencyHistogram
+    metric_type = "histogram"
+
+    def observe(self, seconds: float):
+        self.labels().observe(seconds)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self._children.items(), key=lambda item: item[0]):
+            lines.extend(render_histogram(self.name, child, self.labelnames, values))
+        return lines
+
+class CallbackGauge:
+    """Gauge whose samples are computed at scrape time: fn() -> {label_values: value}"""
+
+    def __init__(self, name: str, help_text: str, fn: Callable, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = self.fn()
+        except Exception as e:
+            return lines + [f"# collection error: {e}"]
+        if not isinstance(samples, dict):
+            samples = {(): samples}
+        for values, value in sorted(samples.items(), key=lambda item: str(item[0])):
+            values = values if isinstance(values, tuple) else (values,)
+            labels = ",".join(f'{name}="{_escape(v)}"' for name, v in zip(self.labelnames, values))
+            lines.append(f"{self.name}{{{labels}}} {_fmt(value)}" if labels else f"{self.name} {_fmt(value)}")
+        return lines
+
+def render_histogram(name: str, histogram: LatencyHistogram, labelnames: tuple = (), values: tuple = ()) -> List[str]:
+    """Exposition lines (_bucket/_sum/_count) for a LatencyHistogram"""
+    base = [f'{label}="{_escape(value)}"' for label, value in zip(labelnames, values)]
+    lines = []
+    for bound, cumulative in histogram.cumulative_buckets():
+        le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound!r}"'
+        lines.append(f"{name}_bucket{{{','.join(base + [le])}}} {cumulative}")
+    suffix = "{" + ",".join(base) + "}" if base else ""
+    lines.append(f"{name}_sum{suffix} {_fmt(histogram.sum)}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+def render_histogram_family(name: str, help_text: str, histograms: Dict[tuple, LatencyHistogram], labelnames: tuple) -> List[str]:
+    """Exposition lines for histograms owned by another component (graph, stage timer...)"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for values, histogram in sorted(histograms.items(), key=lambda item: item[0]):
+        lines.extend(render_histogram(name, histogram, labelnames, values))
+    return lines
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames=()) -> Counter:
+        return self._metrics.get(name) or self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames=()) -> Gauge:
+        return self._metrics.get(name) or self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames=()) -> Histogram:
+        return self._metrics.get(name) or self.register(Histogram(name, help_text, labelnames))
+
+    def callback_gauge(self, name: str, help_text: str, fn: Callable, labelnames=()) -> CallbackGauge:
+        return self.register(CallbackGauge(name, help_text, fn, labelnames))
+
+    def add_collector(self, fn: Callable[[], List[str]]):
+        """Register a function returning extra exposition lines at scrape time (once per function)"""
+        if fn not in self._collectors:
+            self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                lines.append(f"# collector error: {e}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# ============================================================================
+# SHARED METRICS
+# ============================================================================
+
+HTTP_REQUESTS = REGISTRY.counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = REGISTRY.histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "HTTP requests currently being served")
+LLM_LATENCY = REGISTRY.histogram("llm_request_duration_seconds", "LLM call latency", ("model",))
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "LLM tokens used", ("model", "kind"))
+CHECKPOINT_WRITE_LATENCY = REGISTRY.histogram("checkpoint_write_duration_seconds", "Checkpoint put latency")
+CACHE_REQUESTS = REGISTRY.counter("cache_requests_total", "Cache lookups by result", ("cache", "result"))
+EVENT_LOOP_LAG = REGISTRY.histogram("event_loop_lag_seconds", "Event loop scheduling delay")
+
+def _cache_hit_ratios() -> Dict[tuple, float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), child in list(CACHE_REQUESTS._children.items()):
+        hits_total = totals.setdefault(cache, [0.0, 0.0])
+        count = child.get()
+        hits_total[1] += count
+        if result == "hit":
+            hits_total[0] += count
+    return {(cache,): hits / total for cache, (hits, total) in totals.items() if total}
+
+REGISTRY.callback_gauge("cache_hit_ratio", "Cache hit ratio since start", _cache_hit_ratios, ("cache",))
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_llm_call(model: str, seconds: float, usage=None):
+    """Record one LLM completion (usage is the OpenAI usage object, if any)"""
+    LLM_LATENCY.labels(model).observe(seconds)
+    if usage is not None:
+        LLM_TOKENS.labels(model, "prompt").inc(getattr(usage, "prompt_tokens", 0) or 0)
+        LLM_TOKENS.labels(model, "completion").inc(getattr(usage, "completion_tokens", 0) or 0)
+
+# ============================================================================
+# ASGI INTEGRATION
+# ============================================================================
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route counts/latency and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[Any, str] = {}
+
+    def _route_for(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            # Routes are templates ("/chat/stats/{session_id}"), keeping label cardinality bounded
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    path = route.path
+                    break
+            else:
+                path = "unmatched"
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            route = self._route_for(scope)
+            HTTP_REQUESTS.labels(scope["method"], route, str(status["code"])).inc()
+            HTTP_LATENCY.labels(scope["method"], route).observe(elapsed)
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """Sleep for interval and record how late the loop woke us up"""
+    lag_gauge = REGISTRY.gauge("event_loop_lag_last_seconds", "Most recent event loop lag sample")
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        EVENT_LOOP_LAG.observe(lag)
+        lag_gauge.set(lag)
+
+def _resilience_lines() -> List[str]:
+    from resilience import get_resilience_stats
+
+    state_values = {"closed": 0, "half_open": 1, "open": 2}
+    stats = get_resilience_stats()
+    lines = ["# HELP backend_circuit_state Circuit breaker state (0 closed, 1 half-open, 2 open)",
+             "# TYPE backend_circuit_state gauge"]
+    lines += [f'backend_circuit_state{{backend="{name}"}} {state_values[s["state"]]}' for name, s in stats.items()]
+    lines += ["# HELP backend_calls_total Guarded backend calls by outcome", "# TYPE backend_calls_total counter"]
+    for name, s in stats.items():
+        for outcome in ("successes", "failures", "timeouts", "short_circuits", "hedges", "hedge_wins", "rejections"):
+            lines.append(f'backend_calls_total{{backend="{name}",outcome="{outcome}"}} {s[outcome]}')
+    return lines
+
+REGISTRY.add_collector(_resilience_lines)
+
+def install_metrics(app, sessions_fn: Callable[[], int]):
+    """Add the middleware, /metrics route, live-session gauge and loop-lag monitor to a FastAPI app"""
+    from fastapi.responses import Response
+
+    app.add_middleware(MetricsMiddleware)
+    REGISTRY.callback_gauge("live_sessions", "Sessions held by this process", sessions_fn)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    @app.on_event("startup")
+    async def start_loop_lag_monitor():
+        app.state.loop_lag_task = asyncio.create_task(monitor_event_loop_lag())
@@ -0,0 +1,186 @@
+"""
+Mock Tool Backends - Local HTTP stand-ins for the weather/product/profile APIs
+Latency, jitter and error rate are injectable so the resilience layer can be exercised
+"""
+
+import json
+import time
+import random
+import socket
+import threading
+import urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any
+
+# ============================================================================
+# MOCK DATA - mirrors the in-process mock APIs
+# ============================================================================
+
+WEATHER = {
+    "london": {"temp": 15, "condition": "partly cloudy", "humidity": 65},
+    "new york": {"temp": 22, "condition": "sunny", "humidity": 45},
+    "paris": {"temp": 18, "condition": "light rain", "humidity": 78},
+    "tokyo": {"temp": 25, "condition": "clear", "humidity": 55}
+}
+
+PRODUCTS = {
+    "laptop": [
+        {"name": "MacBook Pro M3", "price": 1999, "rating": 4.8, "stock": 15},
+        {"name": "Dell XPS 13", "price": 1299, "rating": 4.5, "stock": 8},
+        {"name": "ThinkPad X1 Carbon", "price": 1599, "rating": 4.6, "stock": 12}
+    ],
+    "phone": [
+        {"name": "iPhone 15 Pro", "price": 999, "rating": 4.7, "stock": 25},
+        {"name": "Samsung Galaxy S24", "price": 899, "rating": 4.6, "stock": 18},
+        {"name": "Google Pixel 8", "price": 699, "rating": 4.4, "stock": 20}
+    ],
+    "headphones": [
+        {"name": "AirPods Pro", "price": 249, "rating": 4.5, "stock": 30},
+        {"name": "Sony WH-1000XM5", "price": 399, "rating": 4.8, "stock": 10},
+        {"name": "Bose QuietComfort", "price": 329, "rating": 4.6, "stock": 14}
+    ]
+}
+
+PROFILE = {
+    "name": "John Doe",
+    "preferences": ["electronics", "books"],
+    "loyalty_points": 1250,
+    "purchase_history": ["MacBook Pro", "iPhone 14"],
+    "member_since": "2023"
+}
+
+# ============================================================================
+# FAULT INJECTION
+# ============================================================================
+
+class FaultProfile:
+    """Latency/error settings, adjustable at runtime via POST /_faults"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    def apply(self) -> bool:
+        """Sleep for the configured latency; return False if this call should fail"""
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        return random.random() >= self.error_rate
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"latency_ms": self.latency_ms, "jitter_ms": self.jitter_ms, "error_rate": self.error_rate}
+
+# ============================================================================
+# HTTP SERVER
+# ============================================================================
+
+def _route(path: str, params: Dict[str, str]) -> Dict[str, Any]:
+    if path == "/weather":
+        city = params.get("city", "London")
+        data = WEATHER.get(city.lower(), WEATHER["london"])
+        return {"success": True, "city": city, "temperature": data["temp"],
+                "condition": data["condition"], "humidity": data["humidity"]}
+    if path == "/products":
+        query = params.get("q", "").lower()
+        for category, items in PRODUCTS.items():
+            if category in query:
+                return {"success": True, "category": category, "products": items, "count": len(items)}
+        return {"success": False, "message": "No products found", "products": []}
+    if path == "/profile":
+        return {"success": True, "user_id": params.get("user_id", "default"), **PROFILE}
+    return None
+
+class MockBackendHandler(BaseHTTPRequestHandler):
+    """Serves the mock tool APIs with the server's fault profile applied"""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like a real API gateway
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this Nagle + delayed ACK add ~40ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send_json(self, status: int, body: Dict[str, Any]):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(parsed.query))
+        if parsed.path == "/_faults":
+            self._send_json(200, self.server.faults.to_dict())
+            return
+
+        result = _route(parsed.path, params)
+        if result is None:
+            self._send_json(404, {"error": "not found"})
+            return
+        if not self.server.faults.apply():
+            self._send_json(503, {"error": "injected failure"})
+            return
+        self._send_json(200, result)
+
+    def do_POST(self):
+        if self.path != "/_faults":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        updates = json.loads(self.rfile.read(length) or b"{}")
+        for key, value in updates.items():
+            if hasattr(self.server.faults, key):
+                setattr(self.server.faults, key, float(value))
+        self._send_json(200, self.server.faults.to_dict())
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output quiet
+
+class MockBackendServer(ThreadingHTTPServer):
+    """Threaded mock backend; use start()/stop() to run it in the background"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, faults: FaultProfile = None):
+        super().__init__((host, port), MockBackendHandler)
+        self.faults = faults or FaultProfile()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockBackendServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients that hit their deadline hang up mid-response; that's expected here
+        pass
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the mock tool backends")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockBackendServer(port=args.port, faults=FaultProfile(args.latency_ms, args.jitter_ms, args.error_rate))
+    print(f"🧪 Mock tool backends on {server.base_url}  (set TOOL_BACKEND_URL to use them)")
+    print(f"   Faults: {server.faults.to_dict()}  - adjust with POST /_faults")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Mock backends stopped")
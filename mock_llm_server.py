@@ -0,0 +1,274 @@
+"""
+Mock LLM Server - Local OpenAI-compatible chat completions API
+Deterministic, offline stand-in for benchmarking: tunable TTFT, tokens/sec, errors and canned answers
+"""
+
+import re
+import json
+import time
+import random
+import socket
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field, asdict
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+@dataclass
+class MockLLMConfig:
+    """Behaviour of the mock server (all adjustable at runtime via POST /_control)"""
+    ttft_ms: float = 200.0            # Time to first token
+    tokens_per_second: float = 50.0   # Generation speed after the first token
+    jitter_ms: float = 0.0            # Random extra latency added to TTFT
+    error_rate: float = 0.0           # Fraction of requests answered with error_status
+    error_status: int = 500
+    rate_limit_rate: float = 0.0      # Fraction of requests answered with 429
+    seed: Optional[int] = None        # Fix for reproducible error injection/jitter
+    canned: List[Dict[str, str]] = field(default_factory=list)  # [{"pattern": regex, "response": text}]
+
+# Intent keywords used to answer the agents' classification prompts
+INTENT_KEYWORDS = [
+    ("greeting", ["hello", "hi", "hey", "good morning"]),
+    ("weather", ["weather", "rain", "sunny", "temperature", "forecast"]),
+    ("time", ["time", "clock", "hour"]),
+    ("location", ["where", "location", "address", "place"]),
+    ("help", ["help", "assist", "support", "what can you do"]),
+    ("goodbye", ["bye", "goodbye", "exit", "quit"]),
+]
+
+DEFAULT_CANNED = [
+    {"pattern": r"(?i)why is the sky blue", "response": "Sunlight scatters off air molecules, and blue light scatters the most, so the sky looks blue."},
+    {"pattern": r"(?i)capital of france", "response": "The capital of France is Paris."},
+]
+
+# ============================================================================
+# RESPONSE SELECTION
+# ============================================================================
+
+def _classify(message: str) -> str:
+    words = set(re.findall(r"[a-z']+", message.lower()))
+    lowered = message.lower()
+    for intent, keywords in INTENT_KEYWORDS:
+        if any((keyword in words) if " " not in keyword else (keyword in lowered) for keyword in keywords):
+            return intent
+    return "question" if "?" in message else "general"
+
+def choose_response(messages: List[Dict[str, str]], config: MockLLMConfig) -> str:
+    """Pick a deterministic answer for a conversation"""
+    prompt = messages[-1].get("content", "") if messages else ""
+
+    # Intent classification prompts from EnhancedAIAgent / the skeleton
+    match = re.search(r'Classify the user\'s intent from this message: "(.*?)"\s*\n', prompt, re.S)
+    if match:
+        return _classify(match.group(1))
+    if messages and "intent classifier" in messages[0].get("content", ""):
+        lowered = prompt.lower()
+        if "help" in lowered:
+            intent = "help"
+        elif any(word in lowered for word in ("find", "search", "look for")):
+            intent = "search"
+        else:
+            intent = "general"
+        return json.dumps({"intent": intent, "confidence": 0.9})
+
+    for rule in config.canned + DEFAULT_CANNED:
+        if re.search(rule["pattern"], prompt):
+            return rule["response"]
+
+    # Response-generation prompts carry a base response - return it lightly rephrased
+    base = re.search(r'Base response: "(.*?)"', prompt, re.S)
+    if base and base.group(1):
+        return base.group(1)
+    return f"Here's a brief answer to: {prompt[:80].strip()}"
+
+def _tokenize(text: str) -> List[str]:
+    # Words with their leading whitespace, roughly one token each
+    return re.findall(r"\s*\S+", text) or [""]
+
+# ============================================================================
+# HTTP SERVER
+# ============================================================================
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this Nagle + delayed ACK add ~40ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _write_chunk(self, data: str):
+        encoded = data.encode("utf-8")
+        self.wfile.write(f"{len(encoded):x}\r\n".encode("ascii") + encoded + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock-gpt", "object": "model", "owned_by": "mock"}]})
+        elif self.path == "/_control":
+            self._send_json(200, asdict(self.server.config))
+        elif self.path == "/health":
+            self._send_json(200, {"status": "healthy", "requests": self.server.request_count})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path == "/_control":
+            for key, value in body.items():
+                if hasattr(self.server.config, key):
+                    setattr(self.server.config, key, value)
+            self._send_json(200, asdict(self.server.config))
+            return
+
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        config = self.server.config
+        rng = self.server.next_random()
+        with self.server.lock:
+            self.server.request_count += 1
+
+        if rng.random() < config.rate_limit_rate:
+            self._send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                            {"Retry-After": "1"})
+            return
+        if rng.random() < config.error_rate:
+            self._send_json(config.error_status, {"error": {"message": "Injected failure (mock)", "type": "server_error"}})
+            return
+
+        model = body.get("model", "mock-gpt")
+        messages = body.get("messages", [])
+        text = choose_response(messages, config)
+        tokens = _tokenize(text)
+        max_tokens = body.get("max_tokens")
+        if max_tokens:
+            tokens = tokens[:max_tokens]
+        completion_id = f"chatcmpl-mock{self.server.request_count}"
+        created = int(time.time())
+        prompt_tokens = sum(len(_tokenize(m.get("content", ""))) for m in messages)
+        token_delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+        time.sleep((config.ttft_ms + rng.uniform(0, config.jitter_ms)) / 1000.0)
+
+        if not body.get("stream"):
+            time.sleep(token_delay * max(len(tokens) - 1, 0))
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                          "total_tokens": prompt_tokens + len(tokens)}
+            })
+            return
+
+        # Server-sent events, chunked so keep-alive clients work
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }) + "\n\n"
+
+        try:
+            self._write_chunk(chunk({"role": "assistant", "content": ""}))
+            for index, token in enumerate(tokens):
+                if index:
+                    time.sleep(token_delay)
+                self._write_chunk(chunk({"content": token}))
+            self._write_chunk(chunk({}, "stop"))
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client went away mid-stream
+
+    def log_message(self, format, *args):
+        pass
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Threaded mock OpenAI server; start()/stop() run it in the background"""
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: MockLLMConfig = None):
+        super().__init__((host, port), MockLLMHandler)
+        self.config = config or MockLLMConfig()
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self._rng = random.Random(self.config.seed)
+        self._thread = None
+
+    def next_random(self) -> random.Random:
+        """Per-request RNG derived from the seeded server RNG (reproducible when seed is set)"""
+        with self.lock:
+            return random.Random(self._rng.random())
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        pass
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a mock OpenAI-compatible chat completions server")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--canned", help="JSON file with [{\"pattern\": ..., \"response\": ...}]")
+    args = parser.parse_args()
+
+    canned = []
+    if args.canned:
+        with open(args.canned, "r", encoding="utf-8") as f:
+            canned = json.load(f)
+
+    server = MockLLMServer(port=args.port, config=MockLLMConfig(
+        ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_second, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate, seed=args.seed, canned=canned
+    ))
+    print(f"🧪 Mock LLM server on {server.base_url}")
+    print(f"   export OPENAI_BASE_URL={server.base_url} OPENAI_API_KEY=mock")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Mock LLM server stopped")
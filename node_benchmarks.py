@@ -0,0 +1,230 @@
+"""
+Node Benchmarks - Micro-benchmarks for every node and router in full_langgraph_agent.py
+Each function runs in isolation on an empty and a 1k-turn state; results are kept as a JSON baseline
+"""
+
+import gc
+import io
+import sys
+import json
+import time
+import argparse
+import contextlib
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Tuple
+
+import full_langgraph_agent as agent
+
+DEFAULT_BASELINE = "node_benchmark_baseline.json"
+HISTORY_SIZES = {"empty": 0, "1k": 1000}
+
+# ============================================================================
+# STATE FIXTURES
+# ============================================================================
+
+def make_state(user_input: str, history_turns: int = 0) -> Dict[str, Any]:
+    """A full AgentState with history_turns of prior conversation"""
+    timestamp = datetime(2024, 1, 1).isoformat()
+    history = [
+        {"user_input": f"message {turn}", "agent_response": f"response {turn}", "intent": "general", "timestamp": timestamp}
+        for turn in range(history_turns)
+    ]
+    messages = []
+    for turn in history:
+        messages.append({"role": "user", "content": turn["user_input"]})
+        messages.append({"role": "assistant", "content": turn["agent_response"]})
+    return {
+        "messages": messages,
+        "user_input": user_input,
+        "processed_input": "",
+        "final_response": "",
+        "intent": None,
+        "confidence": 0.0,
+        "action": None,
+        "tool_calls": [],
+        "tool_results": [],
+        "conversation_history": history,
+        "user_profile": {},
+        "session_data": {"sentiment": ["neutral"] * history_turns},
+        "current_node": "",
+        "requires_approval": False,
+        "approval_granted": False,
+        "retry_count": 0,
+        "errors": [],
+        "last_error": None,
+        "streaming_content": "",
+        "is_streaming": False
+    }
+
+def fresh_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """A copy with new containers wherever a node can write (the state, its lists and dicts, their lists)
+
+    Nodes append to history/errors/sentiment and set keys, but never edit an
+    existing history entry, so entries are shared. A full deepcopy gives the
+    same isolation but leaves thousands of cold objects behind that then
+    dominate sub-microsecond timings.
+    """
+    copied = {}
+    for key, value in state.items():
+        if isinstance(value, list):
+            value = list(value)
+        elif isinstance(value, dict):
+            value = {inner: list(item) if isinstance(item, list) else dict(item) if isinstance(item, dict) else item
+                     for inner, item in value.items()}
+        copied[key] = value
+    return copied
+
+def upstream(*nodes: Callable) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Prepare a state by running the nodes that precede the one under test"""
+    def prepare(state):
+        for node in nodes:
+            state = node(state)
+        return state
+    return prepare
+
+_through_decision = upstream(agent.input_processing_node, agent.intent_classification_node, agent.decision_making_node)
+_through_tools = upstream(_through_decision, agent.tool_execution_node)
+
+def _with_error(state):
+    state = _through_decision(state)
+    state["errors"].append("Tool execution error: boom")
+    state["last_error"] = "boom"
+    return state
+
+# (name, function, user_input, prepare) - prepare fills the fields the function reads
+BENCHMARKS: List[Tuple[str, Callable, str, Callable]] = [
+    ("input_processing_node", agent.input_processing_node, "  Find me a great laptop  ", upstream()),
+    ("intent_classification_node", agent.intent_classification_node, "What's the weather in Paris?",
+     upstream(agent.input_processing_node)),
+    ("decision_making_node", agent.decision_making_node, "Find me a laptop",
+     upstream(agent.input_processing_node, agent.intent_classification_node)),
+    ("tool_execution_node[search]", agent.tool_execution_node, "Find me a laptop", _through_decision),
+    ("tool_execution_node[weather]", agent.tool_execution_node, "What's the weather in Tokyo?", _through_decision),
+    ("tool_execution_node[none]", agent.tool_execution_node, "Hello there", _through_decision),
+    ("response_generation_node[search]", agent.response_generation_node, "Find me a laptop", _through_tools),
+    ("response_generation_node[greeting]", agent.response_generation_node, "Hello there", _through_tools),
+    ("human_approval_node", agent.human_approval_node, "show my profile", _through_decision),
+    ("error_handling_node", agent.error_handling_node, "Find me a laptop", _with_error),
+    ("route_after_intent_classification", agent.route_after_intent_classification, "Find me a laptop", _through_decision),
+    ("route_after_approval", agent.route_after_approval, "show my profile",
+     upstream(_through_decision, agent.human_approval_node)),
+    ("route_after_tool_execution", agent.route_after_tool_execution, "Find me a laptop", _through_tools),
+    ("route_after_error_handling", agent.route_after_error_handling, "Find me a laptop",
+     upstream(_with_error, agent.error_handling_node)),
+]
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def measure(func: Callable, user_input: str, prepare: Callable, history_turns: int,
+            repeat: int = 50, batch: int = 100) -> Dict[str, Any]:
+    """Best-of-repeat ns per call; every call gets its own fresh copy of the prepared state
+
+    Nodes mutate their state (history, retry counts, error lists), so reusing
+    one state would benchmark a different branch or a growing fixture. The
+    copies are made before a repeat's clock starts, and the cost of the bare
+    loop over them is subtracted.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):  # human_approval_node prints
+        base = prepare(make_state(user_input, history_turns))
+        func(fresh_state(base))  # Warm-up
+        best_calls = best_loop = None
+        for _ in range(repeat):
+            states = [fresh_state(base) for _ in range(batch)]
+            gc.disable()  # As timeit does: no collection of the copies inside the timed loop
+            try:
+                start = time.perf_counter_ns()
+                for state in states:
+                    func(state)
+                calls = time.perf_counter_ns() - start
+                start = time.perf_counter_ns()
+                for state in states:
+                    pass
+                loop = time.perf_counter_ns() - start
+            finally:
+                gc.enable()
+            best_calls = calls if best_calls is None else min(best_calls, calls)
+            best_loop = loop if best_loop is None else min(best_loop, loop)
+    return {"ns_per_call": round(max(best_calls - best_loop, 0) / batch, 1), "calls_per_repeat": batch}
+
+def run_suite(name_filter: str = "", repeat: int = 50, batch: int = 100) -> Dict[str, Any]:
+    # Always benchmark the in-process tools, never a remote backend
+    agent.TOOL_BACKEND_URL = ""
+    results = {}
+    for name, func, user_input, prepare in BENCHMARKS:
+        if name_filter and name_filter not in name:
+            continue
+        for size_name, turns in HISTORY_SIZES.items():
+            results[f"{name}/{size_name}"] = measure(func, user_input, prepare, turns, repeat, batch)
+    return {"python": sys.version.split()[0], "results": results}
+
+# ============================================================================
+# BASELINE COMPARISON
+# ============================================================================
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            noise_ns: float = 100.0) -> List[Dict[str, Any]]:
+    """Benchmarks slower than the baseline by more than threshold (and noise_ns)"""
+    regressions = []
+    for key, data in current["results"].items():
+        previous = baseline.get("results", {}).get(key)
+        if not previous:
+            continue
+        old, new = previous["ns_per_call"], data["ns_per_call"]
+        if old > 0 and new > old * (1 + threshold) and new - old > noise_ns:
+            regressions.append({"benchmark": key, "baseline_ns": old, "current_ns": new,
+                                "change": round(new / old - 1, 3)})
+    return regressions
+
+def print_results(current: Dict[str, Any], baseline: Dict[str, Any] = None):
+    print("🔬 Node Micro-benchmarks (ns per call, best of repeats)")
+    print("=" * 78)
+    names = sorted({key.rsplit("/", 1)[0] for key in current["results"]}, key=lambda n: [b[0] for b in BENCHMARKS].index(n))
+    header = f"  {'benchmark':<38}" + "".join(f"{size:>12}" for size in HISTORY_SIZES)
+    print(header + ("     vs baseline" if baseline else ""))
+    for name in names:
+        row = f"  {name:<38}"
+        deltas = []
+        for size in HISTORY_SIZES:
+            data = current["results"].get(f"{name}/{size}")
+            row += f"{data['ns_per_call']:>12,.0f}" if data else f"{'-':>12}"
+            previous = (baseline or {}).get("results", {}).get(f"{name}/{size}")
+            if data and previous and previous["ns_per_call"]:
+                deltas.append(f"{(data['ns_per_call'] / previous['ns_per_call'] - 1) * 100:+.0f}%")
+        print(row + (f"     {' / '.join(deltas)}" if deltas else ""))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark full_langgraph_agent nodes and routers")
+    parser.add_argument("--filter", default="", help="only benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=100, help="calls timed per repeat, each on a fresh state copy")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, help="write results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="compare against a baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="slowdown that counts as a regression")
+    parser.add_argument("--noise-ns", type=float, default=100.0, help="absolute slowdown always ignored")
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    current = run_suite(args.filter, args.repeat, args.batch)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(current, baseline)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"\n💾 Results written to {path}")
+
+    if baseline:
+        regressions = compare(current, baseline, args.threshold, args.noise_ns)
+        print()
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) above {args.threshold * 100:.0f}%:")
+            for regression in regressions:
+                print(f"   • {regression['benchmark']}: {regression['baseline_ns']:,.0f} → "
+                      f"{regression['current_ns']:,.0f} ns (+{regression['change'] * 100:.0f}%)")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
@@ -0,0 +1,239 @@
+"""
+Profiling - Opt-in per-request cProfile capture and a time-boxed sampling profiler
+Both emit collapsed-stack files ("a;b;c 123") that render directly as flamegraphs
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import cProfile
+import pstats
+import threading
+import contextvars
+from collections import defaultdict
+from typing import Dict, Callable, Any, List, Optional
+
+# ============================================================================
+# CONFIGURATION - everything is off unless PROFILING_ENABLED=1
+# ============================================================================
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")                      # Required in X-Profile-Token when set
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Fraction of requests profiled automatically
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+MAX_SAMPLING_SECONDS = 60.0
+
+# cProfile is process-global in practice - one capture at a time (and one sampler)
+_capture_lock = threading.Lock()
+_sampling_lock = threading.Lock()
+
+# Set while a request is captured: profilers of work it hands to threads (see profiled_call)
+_thread_profiles: contextvars.ContextVar[Optional[List[cProfile.Profile]]] = \
+    contextvars.ContextVar("thread_profiles", default=None)
+
+def authorized(headers: Dict[str, str]) -> bool:
+    """Profiling must be enabled and, if a token is configured, the caller must present it"""
+    if not PROFILING_ENABLED:
+        return False
+    return not PROFILE_TOKEN or headers.get("x-profile-token") == PROFILE_TOKEN
+
+# ============================================================================
+# COLLAPSED STACKS
+# ============================================================================
+
+def _frame_label(filename: str, line: int, name: str) -> str:
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+def pstats_to_collapsed(stats: pstats.Stats, max_depth: int = 64, min_share: float = 0.001) -> Dict[str, int]:
+    """Expand cProfile's caller graph into collapsed stacks (microseconds of self time)
+
+    cProfile records caller→callee edges, not full stacks, so each function's
+    self time is split across its callers in proportion to call counts. Paths
+    carrying less than min_share of a function's time are truncated there.
+    """
+    raw = stats.stats  # func -> (cc, nc, tottime, cumtime, callers)
+    collapsed: Dict[str, int] = defaultdict(int)
+
+    def paths(func, weight, depth, seen) -> list:
+        callers = raw.get(func, (0, 0, 0, 0, {}))[4]
+        if not callers or depth >= max_depth or weight < min_share:
+            return [([func], weight)]
+        total_calls = sum(edge[0] for edge in callers.values()) or 1
+        result = []
+        for caller, edge in callers.items():
+            if caller in seen:
+                continue
+            share = weight * edge[0] / total_calls
+            for stack, path_weight in paths(caller, share, depth + 1, seen | {caller}):
+                result.append((stack + [func], path_weight))
+        return result or [([func], weight)]
+
+    for func, (_, _, tottime, _, _) in raw.items():
+        if tottime <= 0:
+            continue
+        for stack, weight in paths(func, 1.0, 0, {func}):
+            micros = int(tottime * weight * 1e6)
+            if micros:
+                collapsed[";".join(_frame_label(*frame) for frame in stack)] += micros
+    return collapsed
+
+def write_collapsed(collapsed: Dict[str, int], name: str) -> str:
+    """Write a collapsed-stack file to PROFILE_DIR, pruning the oldest beyond PROFILE_MAX_FILES"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, name)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, value in sorted(collapsed.items()):
+            f.write(f"{stack} {value}\n")
+
+    files = sorted(
+        (os.path.join(PROFILE_DIR, entry) for entry in os.listdir(PROFILE_DIR) if entry.endswith(".collapsed")),
+        key=os.path.getmtime
+    )
+    for old in files[:-PROFILE_MAX_FILES]:
+        os.remove(old)
+    return path
+
+def profiled_call(fn: Callable, *args, **kwargs) -> Any:
+    """Run fn in a worker thread under its own cProfile if the request that sent it is captured
+
+    cProfile only sees the thread it was enabled on, so agent turns offloaded
+    from the event loop would otherwise be missing from per-request profiles.
+    Callers must copy the request's context into the thread (contextvars).
+    """
+    captured = _thread_profiles.get()
+    if captured is None:
+        return fn(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+: a single process-wide profiler, which already covers this thread
+        return fn(*args, **kwargs)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        captured.append(profiler)
+
+# ============================================================================
+# SAMPLING PROFILER (whole process)
+# ============================================================================
+
+def sample_process(seconds: float, hz: int = 100) -> Dict[str, int]:
+    """Sample every thread's stack at hz for seconds; returns collapsed stacks (sample counts)"""
+    seconds = min(seconds, MAX_SAMPLING_SECONDS)
+    interval = 1.0 / hz
+    me = threading.get_ident()
+    names = {}
+    collapsed: Dict[str, int] = defaultdict(int)
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        if len(names) != threading.active_count():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_frame_label(code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            collapsed[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return collapsed
+
+# ============================================================================
+# ASGI INTEGRATION
+# ============================================================================
+
+class ProfilingMiddleware:
+    """Profile a request with cProfile when asked (X-Profile: 1 or ?profile=1) or sampled"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _wants_profile(self, scope, headers: Dict[str, str]) -> bool:
+        if not PROFILING_ENABLED:
+            return False
+        requested = headers.get("x-profile") == "1" or b"profile=1" in scope.get("query_string", b"")
+        if requested:
+            return authorized(headers)
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        if not self._wants_profile(scope, headers) or not _capture_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        route = scope["path"].strip("/").replace("/", "_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{route}-{uuid.uuid4().hex[:8]}.collapsed"
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-file", name.encode("latin-1"))]
+            await send(message)
+
+        # Note: other coroutines interleaving on the loop are captured too
+        profiler = cProfile.Profile()
+        thread_profiles: List[cProfile.Profile] = []
+        token = _thread_profiles.set(thread_profiles)
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_with_header)
+            finally:
+                profiler.disable()
+                _thread_profiles.reset(token)
+            stats = pstats.Stats(profiler)
+            for thread_profile in thread_profiles:
+                stats.add(thread_profile)
+            await asyncio.to_thread(write_collapsed, pstats_to_collapsed(stats), name)
+        finally:
+            _capture_lock.release()
+
+def install_profiling(app):
+    """Add the per-request profiler and the /debug/profile endpoints to a FastAPI app"""
+    from fastapi import HTTPException, Request
+    from fastapi.responses import PlainTextResponse, FileResponse
+
+    app.add_middleware(ProfilingMiddleware)
+
+    def require_authorized(request: Request):
+        if not authorized({key.lower(): value for key, value in request.headers.items()}):
+            raise HTTPException(status_code=404, detail="Not Found")
+
+    @app.get("/debug/profile", include_in_schema=False)
+    async def sample_profile(request: Request, seconds: float = 10.0, hz: int = 100):
+        """Time-boxed whole-process sampling profile as collapsed stacks"""
+        require_authorized(request)
+        if not _sampling_lock.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="Another sampling profile is running")
+        try:
+            collapsed = await asyncio.to_thread(sample_process, seconds, max(1, min(hz, 1000)))
+        finally:
+            _sampling_lock.release()
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-process-{uuid.uuid4().hex[:8]}.collapsed"
+        path = await asyncio.to_thread(write_collapsed, collapsed, name)
+        with open(path, "r", encoding="utf-8") as f:
+            return PlainTextResponse(f.read(), headers={"X-Profile-File": name})
+
+    @app.get("/debug/profiles/{name}", include_in_schema=False)
+    async def get_profile(request: Request, name: str):
+        """Download a captured collapsed-stack file"""
+        require_authorized(request)
+        path = os.path.join(PROFILE_DIR, os.path.basename(name))
+        if not path.endswith(".collapsed") or not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return FileResponse(path, media_type="text/plain")
@@ -0,0 +1,332 @@
+"""
+Resilience Layer - Deadlines, circuit breakers and hedged calls
+Wraps tool and LLM backends so one slow dependency can't hold a whole turn
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional, Callable
+from dataclasses import dataclass
+
+# ============================================================================
+# ERRORS
+# ============================================================================
+
+class BackendUnavailable(Exception):
+    """Raised when a backend call is refused or abandoned by the resilience layer"""
+    pass
+
+class DeadlineExceeded(BackendUnavailable):
+    """The call did not complete within its deadline"""
+    pass
+
+class CircuitOpenError(BackendUnavailable):
+    """The backend's circuit is open - failing fast without calling it"""
+    pass
+
+class BulkheadFull(BackendUnavailable):
+    """Every worker of the backend's bulkhead is busy (calls that overran their deadline included)"""
+    pass
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+@dataclass
+class ResilienceConfig:
+    """Per-backend resilience settings"""
+    timeout: float = 5.0              # Per-call deadline in seconds
+    max_concurrency: int = 16         # Bulkhead: this backend's own workers (fixed at creation); more calls are refused
+
+    # Circuit breaker
+    failure_rate_threshold: float = 0.5   # Open when error rate in window exceeds this
+    min_calls: int = 10                   # Minimum calls in window before tripping
+    window_seconds: float = 30.0          # Rolling error-rate window
+    open_seconds: float = 15.0            # Cool-down before a half-open probe
+
+    # Hedged requests (only enable for idempotent backends)
+    hedge: bool = False
+    hedge_percentile: float = 0.95
+    hedge_min_samples: int = 20           # Need this many latencies before hedging
+    hedge_min_delay: float = 0.01         # Never hedge sooner than this
+
+# ============================================================================
+# CIRCUIT BREAKER
+# ============================================================================
+
+class CircuitBreaker:
+    """Rolling-window error-rate circuit breaker (closed → open → half_open)"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, config: ResilienceConfig):
+        self.config = config
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.trips = 0
+        self._outcomes = deque()  # (timestamp, ok)
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return True if a call may proceed"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.config.open_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # Half-open: let exactly one probe through
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record(self, ok: bool):
+        """Record a call outcome and update the breaker state"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if ok:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip(now)
+                return
+
+            self._outcomes.append((now, ok))
+            cutoff = now - self.config.window_seconds
+            while self._outcomes and self._outcomes[0][0] < cutoff:
+                self._outcomes.popleft()
+
+            if self.state == self.CLOSED and len(self._outcomes) >= self.config.min_calls:
+                failures = sum(1 for _, success in self._outcomes if not success)
+                if failures / len(self._outcomes) > self.config.failure_rate_threshold:
+                    self._trip(now)
+
+    def _trip(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.trips += 1
+        self._outcomes.clear()
+
+    def release_probe(self):
+        """A call allowed through never reached the backend; let the next one probe instead"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+# ============================================================================
+# LATENCY TRACKING
+# ============================================================================
+
+class LatencyTracker:
+    """Fixed-size ring of recent successful call latencies"""
+
+    def __init__(self, size: int = 512):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(p * len(samples)))
+        return samples[index]
+
+    def __len__(self):
+        return len(self._samples)
+
+# ============================================================================
+# RESILIENT BACKEND
+# ============================================================================
+
+class ResilientBackend:
+    """A named backend guarded by a deadline, a circuit breaker and optional hedging
+
+    Each backend runs calls on its own bounded pool (a bulkhead), so a slow
+    LLM can't take the threads tool calls need. Deadlines are enforced by
+    abandoning the future: an overrun call keeps its worker until it returns,
+    which is why callees should also get the deadline as their own timeout.
+    """
+
+    def __init__(self, name: str, config: ResilienceConfig = None):
+        self.name = name
+        self.config = config or ResilienceConfig()
+        self.breaker = CircuitBreaker(self.config)
+        self.latency = LatencyTracker()
+        self.counters = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "short_circuits": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "rejections": 0
+        }
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.config.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.config.max_concurrency,
+                                            thread_name_prefix=f"resilience-{name}")
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.config.hedge or len(self.latency) < self.config.hedge_min_samples:
+            return None
+        p = self.latency.percentile(self.config.hedge_percentile)
+        return max(p, self.config.hedge_min_delay) if p is not None else None
+
+    def _submit(self, fn: Callable, args: tuple, kwargs: dict, deadline_arg: Optional[str],
+                remaining: float) -> Optional[Future]:
+        """Start fn on a free worker of this backend; None if the bulkhead is full
+
+        A slot is held until the call returns, so no call ever waits in the
+        pool's queue - the deadline only ever measures the backend itself.
+        """
+        if not self._slots.acquire(blocking=False):
+            return None
+        if deadline_arg:
+            kwargs = {**kwargs, deadline_arg: remaining}
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def call(self, fn: Callable, *args, timeout: float = None, deadline_arg: str = None, **kwargs):
+        """Run fn(*args, **kwargs) under this backend's deadline, bulkhead and breaker
+
+        deadline_arg names a keyword argument of fn that receives the time left
+        (e.g. "timeout" for an OpenAI request), so the callee gives up when we do.
+        """
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("short_circuits")
+            raise CircuitOpenError(f"{self.name}: circuit open")
+
+        deadline = timeout if timeout is not None else self.config.timeout
+        start = time.monotonic()
+        primary = self._submit(fn, args, kwargs, deadline_arg, deadline)
+        if primary is None:
+            self._count("rejections")
+            self.breaker.release_probe()
+            raise BulkheadFull(f"{self.name}: all {self.config.max_concurrency} workers busy")
+        pending = {primary}
+        winner = None
+        error: Optional[BaseException] = None
+
+        try:
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None and hedge_delay < deadline:
+                done, _ = wait(pending, timeout=hedge_delay)
+                if not done:
+                    hedge = self._submit(fn, args, kwargs, deadline_arg, deadline - (time.monotonic() - start))
+                    if hedge is not None:
+                        self._count("hedges")
+                        pending.add(hedge)
+
+            # First successful result wins; a failed attempt only loses if the other fails too
+            while pending and winner is None:
+                remaining = deadline - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        winner = future
+                        break
+                    error = future.exception()
+        finally:
+            for future in pending:
+                future.cancel()  # Not started: dropped; running: ignored, and its slot freed when it returns
+
+        if winner is None and error is not None and not pending:
+            self._count("failures")
+            self.breaker.record(False)
+            raise error
+        if winner is None:
+            self._count("timeouts")
+            self._count("failures")
+            self.breaker.record(False)
+            raise DeadlineExceeded(f"{self.name}: no response within {deadline:.2f}s")
+
+        if winner is not primary:
+            self._count("hedge_wins")
+        self.latency.add(time.monotonic() - start)
+        self._count("successes")
+        self.breaker.record(True)
+        return winner.result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "state": self.breaker.state,
+            "error_rate": round(self.breaker.error_rate(), 4),
+            "trips": self.breaker.trips,
+            "timeout": self.config.timeout,
+            "hedging": self.config.hedge,
+            "latency_p50": self.latency.percentile(0.5),
+            "latency_p95": self.latency.percentile(0.95),
+            **counters
+        }
+
+# ============================================================================
+# BACKEND REGISTRY
+# ============================================================================
+
+_backends: Dict[str, ResilientBackend] = {}
+_registry_lock = threading.Lock()
+
+# Defaults per backend - tools are idempotent reads and may be hedged
+DEFAULT_CONFIGS = {
+    "openai": ResilienceConfig(timeout=20.0, max_concurrency=32),
+    "weather": ResilienceConfig(timeout=3.0, hedge=True),
+    "products": ResilienceConfig(timeout=3.0, hedge=True),
+    "profile": ResilienceConfig(timeout=3.0, hedge=True)
+}
+
+def get_backend(name: str) -> ResilientBackend:
+    """Get (or lazily create) the process-wide backend guard for name"""
+    backend = _backends.get(name)
+    if backend is None:
+        with _registry_lock:
+            backend = _backends.get(name)
+            if backend is None:
+                config = DEFAULT_CONFIGS.get(name, ResilienceConfig())
+                backend = ResilientBackend(name, ResilienceConfig(**config.__dict__))
+                _backends[name] = backend
+    return backend
+
+def configure_backend(name: str, **kwargs) -> ResilientBackend:
+    """Update a backend's resilience settings"""
+    backend = get_backend(name)
+    for key, value in kwargs.items():
+        if hasattr(backend.config, key):
+            setattr(backend.config, key, value)
+    return backend
+
+def get_resilience_stats() -> Dict[str, Any]:
+    """Snapshot of every backend's breaker state and counters"""
+    return {name: backend.get_stats() for name, backend in list(_backends.items())}
@@ -0,0 +1,534 @@
+"""
+Session Store - Conversation state shared by every chat_server worker process
+Compact EnhancedAIAgent snapshots in a pluggable backend (in-process or SQLite), written under a per-session lock
+"""
+
+import os
+import json
+import time
+import uuid
+import zlib
+import bisect
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from dataclasses import asdict, replace
+from typing import Dict, Any, Optional, List, Iterator, Tuple, Callable
+
+from enhanced_ai_agent import EnhancedAIAgent, AgentConfig
+from metrics import REGISTRY, record_cache
+
+# ============================================================================
+# SETTINGS
+# ============================================================================
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")          # memory (one worker) | sqlite (any number)
+SESSION_DB = os.getenv("SESSION_DB", "chat_sessions.db")           # /dev/shm/... keeps it in shared memory
+SESSION_LOCK_TIMEOUT = float(os.getenv("SESSION_LOCK_TIMEOUT", "30"))
+SESSION_LOCK_LEASE = float(os.getenv("SESSION_LOCK_LEASE", "120"))  # A holder older than this is presumed dead
+
+COMPRESS_ABOVE = 2048  # Snapshot bytes before zlib pays for itself
+SESSION_PAGE_MAX = 500  # Largest /chat/sessions page
+
+# Never written to the shared store; sessions fall back to the process's keys
+SECRET_FIELDS = ("openai_api_key", "weather_api_key")
+
+SESSION_LOCK_WAIT = REGISTRY.histogram("session_lock_wait_seconds", "Time spent acquiring a session's write lock")
+SESSION_SNAPSHOT_BYTES = REGISTRY.histogram("session_snapshot_bytes", "Encoded session snapshot size (bytes, not seconds)")
+
+class SessionLockTimeout(Exception):
+    """Another worker held the session's write lock for longer than SESSION_LOCK_TIMEOUT"""
+    pass
+
+# ============================================================================
+# SERIALIZATION
+# ============================================================================
+
+def encode_agent(agent: EnhancedAIAgent, defaults: AgentConfig) -> bytes:
+    """Compact JSON of the agent's state plus config fields that differ from defaults"""
+    data = agent.to_dict()
+    defaults_dict = asdict(defaults)
+    overrides = {key: value for key, value in asdict(agent.config).items()
+                 if key not in SECRET_FIELDS and value != defaults_dict.get(key)}
+    if overrides:
+        data["config"] = overrides
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return b"z" + zlib.compress(raw, 6) if len(raw) > COMPRESS_ABOVE else b"j" + raw
+
+def decode_agent(blob: bytes, defaults: AgentConfig) -> EnhancedAIAgent:
+    raw = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    data = json.loads(raw)
+    overrides = {key: value for key, value in data.pop("config", {}).items() if hasattr(defaults, key)}
+    return EnhancedAIAgent.from_dict(data, replace(defaults, **overrides) if overrides else defaults)
+
+def summarize_agent(agent: EnhancedAIAgent) -> Dict[str, Any]:
+    """Index fields of a session, read straight from agent state (no stats copy)"""
+    return {
+        "conversation_count": agent.state.get("conversation_count", 0),
+        "last_intent": agent.state.get("current_intent"),
+        "session_start": agent.state.get("session_start"),
+    }
+
+def summary_entry(session_id: str, summary: Dict[str, Any], last_activity: float) -> Dict[str, Any]:
+    """One /chat/sessions entry"""
+    start = summary.get("session_start")
+    return {
+        "session_id": session_id,
+        "conversation_count": summary.get("conversation_count", 0),
+        "last_intent": summary.get("last_intent"),
+        "session_duration": str(datetime.now() - datetime.fromisoformat(start)) if start else None,
+        "last_activity": datetime.fromtimestamp(last_activity).isoformat(),
+    }
+
+def encode_cursor(last_activity: float, session_id: str) -> str:
+    return f"{last_activity!r}:{session_id}"
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    """Position after which the next page starts; ValueError if malformed"""
+    last_activity, _, session_id = cursor.partition(":")
+    return float(last_activity), session_id
+
+# ============================================================================
+# SESSION INDEX
+# ============================================================================
+
+class SessionIndex:
+    """In-process summaries ordered by last activity, overall and per intent
+
+    Updated once per turn; a page is a bisect to the cursor plus a slice, so
+    listing never touches agents or sessions outside the page.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self.ordered: Dict[Optional[str], List[Tuple[float, str]]] = {None: []}  # None = all intents
+        self._lock = threading.Lock()
+
+    def _unlink(self, session_id: str):
+        previous = self.entries.pop(session_id, None)
+        if previous is None:
+            return
+        key = (previous[0], session_id)
+        for intent in (None, previous[1].get("last_intent")):
+            ordered = self.ordered.get(intent)
+            if ordered is None:
+                continue
+            position = bisect.bisect_left(ordered, key)
+            if position < len(ordered) and ordered[position] == key:
+                del ordered[position]
+            if intent is not None and not ordered:
+                del self.ordered[intent]
+
+    def update(self, session_id: str, summary: Dict[str, Any], last_activity: float = None):
+        last_activity = time.time() if last_activity is None else last_activity
+        with self._lock:
+            self._unlink(session_id)
+            self.entries[session_id] = (last_activity, summary)
+            key = (last_activity, session_id)
+            bisect.insort(self.ordered[None], key)
+            if summary.get("last_intent") is not None:
+                bisect.insort(self.ordered.setdefault(summary["last_intent"], []), key)
+
+    def remove(self, session_id: str):
+        with self._lock:
+            self._unlink(session_id)
+
+    def ids(self) -> List[str]:
+        """Session ids, most recently active first"""
+        with self._lock:
+            return [session_id for _, session_id in reversed(self.ordered[None])]
+
+    def page(self, limit: int, cursor: str = None, intent: str = None,
+             newest_first: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        with self._lock:
+            ordered = self.ordered.get(intent or None, [])
+            if newest_first:
+                end = bisect.bisect_left(ordered, decode_cursor(cursor)) if cursor else len(ordered)
+                start = max(0, end - limit)
+                keys = ordered[start:end][::-1]
+                more = start > 0
+            else:
+                start = bisect.bisect_right(ordered, decode_cursor(cursor)) if cursor else 0
+                keys = ordered[start:start + limit]
+                more = start + limit < len(ordered)
+            page = [(session_id, self.entries[session_id]) for _, session_id in keys]
+        entries = [summary_entry(session_id, summary, last_activity) for session_id, (last_activity, summary) in page]
+        return entries, encode_cursor(*keys[-1]) if more and keys else None
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+class SessionBackend(ABC):
+    """Versioned snapshot storage plus a cross-process per-session lock"""
+
+    stores_snapshots = True  # False: save() gets blob=None and the store's cached agent is the only copy
+
+    @abstractmethod
+    def version(self, session_id: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Tuple[int, bytes]]:
+        ...
+
+    @abstractmethod
+    def save(self, session_id: str, expected_version: int, blob: Optional[bytes], summary: Dict[str, Any] = None) -> bool:
+        """Write version expected_version + 1 (and its index fields); False if someone else wrote in between"""
+        ...
+
+    @abstractmethod
+    def summaries(self, limit: int, cursor: str = None, intent: str = None,
+                  newest_first: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of summary entries by last activity, plus the cursor of the next page"""
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def ids(self) -> List[str]:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def try_lock(self, session_id: str, owner: str, lease: float) -> bool:
+        ...
+
+    @abstractmethod
+    def unlock(self, session_id: str, owner: str):
+        ...
+
+class MemorySessionBackend(SessionBackend):
+    """Versions and the summary index in this process's memory (one worker only)
+
+    The store's cached agents are the only copy, so no snapshot is encoded or
+    kept (stores_snapshots = False); the store's per-session thread lock
+    already serializes turns, so the cross-process lock is a no-op.
+    """
+
+    stores_snapshots = False
+
+    def __init__(self):
+        self.versions: Dict[str, int] = {}
+        self.index = SessionIndex()
+        self._lock = threading.Lock()
+
+    def version(self, session_id: str) -> Optional[int]:
+        return self.versions.get(session_id)
+
+    def load(self, session_id: str) -> Optional[Tuple[int, bytes]]:
+        return None  # Nothing to reload: the store keeps the agent itself
+
+    def save(self, session_id: str, expected_version: int, blob: bytes, summary: Dict[str, Any] = None) -> bool:
+        with self._lock:
+            if self.versions.get(session_id, 0) != expected_version:
+                return False
+            self.versions[session_id] = expected_version + 1
+            self.index.update(session_id, summary or {})
+        return True
+
+    def summaries(self, limit: int, cursor: str = None, intent: str = None,
+                  newest_first: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        return self.index.page(limit, cursor, intent, newest_first)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self.versions.pop(session_id, None)
+            self.index.remove(session_id)
+
+    def ids(self) -> List[str]:
+        return self.index.ids()
+
+    def count(self) -> int:
+        return len(self.versions)
+
+    def try_lock(self, session_id: str, owner: str, lease: float) -> bool:
+        return True
+
+    def unlock(self, session_id: str, owner: str):
+        pass
+
+class SQLiteSessionBackend(SessionBackend):
+    """One SQLite file (WAL) shared by all workers on a host
+
+    The write lock is a lease row: taking it is a single upsert that only
+    succeeds when no live lease exists, so a crashed worker's lock expires
+    instead of wedging the session.
+    """
+
+    def __init__(self, path: str = SESSION_DB):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY, version INTEGER NOT NULL, data BLOB NOT NULL, updated REAL NOT NULL,
+                conversation_count INTEGER NOT NULL DEFAULT 0, last_intent TEXT, session_start TEXT);
+            CREATE TABLE IF NOT EXISTS session_locks (
+                session_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+        """)
+        # Stores created before the summary index get its columns added in place
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        for column, ddl in (("conversation_count", "INTEGER NOT NULL DEFAULT 0"), ("last_intent", "TEXT"),
+                            ("session_start", "TEXT")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {ddl}")
+        conn.executescript("""
+            CREATE INDEX IF NOT EXISTS sessions_by_activity ON sessions (updated, session_id);
+            CREATE INDEX IF NOT EXISTS sessions_by_intent ON sessions (last_intent, updated, session_id);
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SESSION_LOCK_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def version(self, session_id: str) -> Optional[int]:
+        row = self._conn().execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def load(self, session_id: str) -> Optional[Tuple[int, bytes]]:
+        row = self._conn().execute("SELECT version, data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def save(self, session_id: str, expected_version: int, blob: bytes, summary: Dict[str, Any] = None) -> bool:
+        conn = self._conn()
+        summary = summary or {}
+        fields = (summary.get("conversation_count", 0), summary.get("last_intent"), summary.get("session_start"))
+        if expected_version == 0:
+            cursor = conn.execute(
+                "INSERT INTO sessions VALUES (?, 1, ?, ?, ?, ?, ?) ON CONFLICT(session_id) DO NOTHING",
+                (session_id, blob, time.time(), *fields)
+            )
+        else:
+            cursor = conn.execute(
+                """UPDATE sessions SET version = version + 1, data = ?, updated = ?,
+                   conversation_count = ?, last_intent = ?, session_start = ?
+                   WHERE session_id = ? AND version = ?""",
+                (blob, time.time(), *fields, session_id, expected_version)
+            )
+        return cursor.rowcount == 1
+
+    def summaries(self, limit: int, cursor: str = None, intent: str = None,
+                  newest_first: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # Keyset pagination over the (last_intent,) updated, session_id indexes: cost follows the page, not the table
+        where, params = [], []
+        if intent:
+            where.append("last_intent = ?")
+            params.append(intent)
+        if cursor:
+            where.append("(updated, session_id) < (?, ?)" if newest_first else "(updated, session_id) > (?, ?)")
+            params.extend(decode_cursor(cursor))
+        direction = "DESC" if newest_first else "ASC"
+        rows = self._conn().execute(
+            f"""SELECT session_id, updated, conversation_count, last_intent, session_start FROM sessions
+                {"WHERE " + " AND ".join(where) if where else ""}
+                ORDER BY updated {direction}, session_id {direction} LIMIT ?""",
+            (*params, limit + 1)
+        ).fetchall()
+        entries = [summary_entry(session_id, {"conversation_count": count, "last_intent": last_intent,
+                                              "session_start": start}, updated)
+                   for session_id, updated, count, last_intent, start in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+        return entries, next_cursor
+
+    def delete(self, session_id: str):
+        # One transaction, so a deleted session never leaves its lease row behind; leases of
+        # crashed holders (expired, never unlocked) are swept along with it
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM session_locks WHERE session_id = ? OR expires < ?", (session_id, time.time()))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def ids(self) -> List[str]:
+        return [row[0] for row in self._conn().execute("SELECT session_id FROM sessions ORDER BY updated DESC")]
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def try_lock(self, session_id: str, owner: str, lease: float) -> bool:
+        now = time.time()
+        cursor = self._conn().execute(
+            """INSERT INTO session_locks VALUES (?, ?, ?)
+               ON CONFLICT(session_id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires
+               WHERE session_locks.expires < ?""",
+            (session_id, owner, now + lease, now)
+        )
+        return cursor.rowcount == 1
+
+    def unlock(self, session_id: str, owner: str):
+        self._conn().execute("DELETE FROM session_locks WHERE session_id = ? AND owner = ?", (session_id, owner))
+
+# ============================================================================
+# STORE
+# ============================================================================
+
+class SessionStore:
+    """Session agents for one process over a snapshot backend
+
+    Each turn takes the session's lock, reuses the locally cached agent if
+    nothing else has written since, and writes a new snapshot afterwards.
+    With MemorySessionBackend (the default) agents live only in this worker
+    and a turn just bumps the version and index entry; with a shared backend
+    any worker can serve any request.
+    """
+
+    def __init__(self, backend: SessionBackend = None, default_config: Callable[[], AgentConfig] = AgentConfig):
+        self.backend = backend if backend is not None else MemorySessionBackend()
+        self.default_config = default_config
+        self.agents: Dict[str, EnhancedAIAgent] = {}
+        self.versions: Dict[str, int] = {}
+        self._locks: Dict[str, list] = {}  # session_id -> [lock, holders and waiters]
+        self._locks_guard = threading.Lock()
+
+    @contextmanager
+    def _thread_lock(self, session_id: str):
+        """This process's lock for a session, dropped once nobody holds or waits for it"""
+        with self._locks_guard:
+            entry = self._locks.get(session_id)
+            if entry is None:
+                entry = self._locks[session_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[session_id]
+
+    def _acquire(self, session_id: str) -> str:
+        owner = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+        start = time.monotonic()
+        delay = 0.001
+        while not self.backend.try_lock(session_id, owner, SESSION_LOCK_LEASE):
+            if time.monotonic() - start > SESSION_LOCK_TIMEOUT:
+                raise SessionLockTimeout(f"Session {session_id} is locked by another worker")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        SESSION_LOCK_WAIT.observe(time.monotonic() - start)
+        return owner
+
+    def _refresh(self, session_id: str) -> Optional[EnhancedAIAgent]:
+        """Local agent, re-read from the backend only if another worker wrote a newer version"""
+        cached = self.agents.get(session_id)
+        version = self.backend.version(session_id)
+        if version is None:
+            self.agents.pop(session_id, None)
+            self.versions.pop(session_id, None)
+            return None
+        if cached is not None and self.versions.get(session_id) == version:
+            record_cache("session_snapshot", True)
+            return cached
+        record_cache("session_snapshot", False)
+        loaded = self.backend.load(session_id)
+        if loaded is None:
+            return None
+        self.versions[session_id], blob = loaded
+        agent = self.agents[session_id] = decode_agent(blob, self.default_config())
+        return agent
+
+    def _save(self, session_id: str, agent: EnhancedAIAgent):
+        blob = None
+        if self.backend.stores_snapshots:
+            blob = encode_agent(agent, self.default_config())
+            SESSION_SNAPSHOT_BYTES.observe(len(blob))
+        expected = self.versions.get(session_id, 0)
+        if self.backend.save(session_id, expected, blob, summarize_agent(agent)):
+            self.versions[session_id] = expected + 1
+            self.agents[session_id] = agent
+        else:
+            # Our lease expired mid-turn and another worker wrote first; keep theirs
+            print(f"⚠️ Session {session_id}: concurrent write detected, snapshot discarded")
+            self.agents.pop(session_id, None)
+            self.versions.pop(session_id, None)
+
+    @contextmanager
+    def _exclusive(self, session_id: str):
+        """This process's per-session lock, plus the backend's cross-process lease"""
+        with self._thread_lock(session_id):
+            owner = self._acquire(session_id)
+            try:
+                yield
+            finally:
+                self.backend.unlock(session_id, owner)
+
+    @contextmanager
+    def session(self, session_id: str, create: bool = True) -> Iterator[Optional[EnhancedAIAgent]]:
+        """Exclusive access to a session's agent for one turn (None if missing and not create)"""
+        with self._exclusive(session_id):
+            agent = self.get(session_id)
+            if agent is None and create:
+                agent = EnhancedAIAgent(self.default_config())
+            try:
+                yield agent
+            except BaseException:
+                # The turn may have half-updated the agent - reload it next time (if there is a snapshot)
+                if self.backend.stores_snapshots:
+                    self.agents.pop(session_id, None)
+                    self.versions.pop(session_id, None)
+                raise
+            if agent is not None:
+                self._save(session_id, agent)
+
+    def get(self, session_id: str) -> Optional[EnhancedAIAgent]:
+        """Latest agent for read-only use (stats); no lock taken"""
+        return self._refresh(session_id)
+
+    def reset(self, session_id: str) -> bool:
+        """Start the session over, keeping its config; False if it doesn't exist"""
+        with self._exclusive(session_id):
+            agent = self.get(session_id)
+            if agent is None:
+                return False
+            self._save(session_id, EnhancedAIAgent(agent.config))
+        return True
+
+    def delete(self, session_id: str):
+        with self._thread_lock(session_id):
+            self.agents.pop(session_id, None)
+            self.versions.pop(session_id, None)
+            self.backend.delete(session_id)
+
+    def items(self) -> Iterator[Tuple[str, EnhancedAIAgent]]:
+        for session_id in self.backend.ids():
+            agent = self._refresh(session_id)
+            if agent is not None:
+                yield session_id, agent
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.backend.version(session_id) is not None
+
+    def __len__(self) -> int:
+        return self.backend.count()
+
+    def summaries(self, limit: int = 50, cursor: str = None, intent: str = None,
+                  newest_first: bool = True) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """A page of session summaries by last activity (maintained per turn, not computed here)"""
+        limit = max(1, min(limit, SESSION_PAGE_MAX))
+        return self.backend.summaries(limit, cursor, intent, newest_first)
+
+def create_session_store(default_config: Callable[[], AgentConfig] = AgentConfig) -> SessionStore:
+    """Store for SESSION_BACKEND ('memory' or 'sqlite')"""
+    if SESSION_BACKEND == "sqlite":
+        return SessionStore(SQLiteSessionBackend(SESSION_DB), default_config)
+    if SESSION_BACKEND != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND} (use memory or sqlite)")
+    return SessionStore(MemorySessionBackend(), default_config)
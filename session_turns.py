@@ -0,0 +1,144 @@
+"""
+Session Turns - Per-session turn ordering for the chat servers
+Turns of one session run one at a time in arrival order; different sessions run in parallel on a thread pool
+"""
+
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
+
+from metrics import REGISTRY
+from profiling import profiled_call
+
+# ============================================================================
+# SETTINGS
+# ============================================================================
+
+SESSION_QUEUE_DEPTH = int(os.getenv("SESSION_QUEUE_DEPTH", "4"))             # Turns waiting behind the running one
+SESSION_QUEUE_TIMEOUT = float(os.getenv("SESSION_QUEUE_TIMEOUT", "30"))      # Seconds a turn may wait for its session
+SESSION_TURN_THREADS = int(os.getenv("SESSION_TURN_THREADS", "32"))          # Sessions running agent code at once
+
+TURN_QUEUE_WAIT = REGISTRY.histogram("session_turn_queue_wait_seconds", "Time a turn waited for earlier turns of its session")
+TURNS_REJECTED = REGISTRY.counter("session_turns_rejected_total", "Turns refused because their session was busy", ("reason",))
+
+class SessionBusy(Exception):
+    """The session has too much work queued; the client should retry later"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TurnQueueFull(SessionBusy):
+    """SESSION_QUEUE_DEPTH turns are already waiting for this session"""
+    pass
+
+class TurnQueueTimeout(SessionBusy):
+    """Earlier turns of the session did not finish within SESSION_QUEUE_TIMEOUT"""
+    pass
+
+# ============================================================================
+# TURN GATE
+# ============================================================================
+
+class _SessionSlot:
+    __slots__ = ("lock", "depth")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()  # FIFO: waiters are woken in arrival order
+        self.depth = 0               # Running turn + waiting turns
+
+class SessionTurnGate:
+    """Per-session FIFO lock with bounded queue depth and wait time
+
+    Slots exist only while a session has work, so idle sessions cost
+    nothing. Agent code is synchronous; run() moves it off the event loop
+    onto a shared thread pool, which is what lets sessions overlap.
+    """
+
+    def __init__(self, max_depth: int = SESSION_QUEUE_DEPTH, timeout: float = SESSION_QUEUE_TIMEOUT,
+                 threads: int = SESSION_TURN_THREADS):
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.threads = threads
+        self._slots: Dict[str, _SessionSlot] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.completed = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="session-turn")
+        return self._executor
+
+    @asynccontextmanager
+    async def turn(self, session_id: str):
+        """Hold the session for the duration of the block (raises SessionBusy instead of queueing forever)"""
+        slot = self._slots.get(session_id)
+        if slot is None:
+            slot = self._slots[session_id] = _SessionSlot()
+        if slot.depth > self.max_depth:
+            TURNS_REJECTED.labels("queue_full").inc()
+            raise TurnQueueFull(f"Session {session_id} already has {self.max_depth} turns waiting",
+                                retry_after=max(1.0, self.timeout / 4))
+        slot.depth += 1
+        start = time.perf_counter()
+        try:
+            try:
+                await asyncio.wait_for(slot.lock.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                TURNS_REJECTED.labels("timeout").inc()
+                raise TurnQueueTimeout(f"Session {session_id} is still busy after {self.timeout:.0f}s",
+                                       retry_after=max(1.0, self.timeout / 4))
+            TURN_QUEUE_WAIT.observe(time.perf_counter() - start)
+            try:
+                yield
+            finally:
+                slot.lock.release()
+                self.completed += 1
+        finally:
+            slot.depth -= 1
+            if slot.depth == 0 and self._slots.get(session_id) is slot:
+                del self._slots[session_id]
+
+    async def offload(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run blocking agent code on the turn thread pool (call inside turn())"""
+        # Context vars (LLM priority, an active request profile capture) follow the call into the
+        # worker thread; profiled_call gives the thread its own profiler while a capture is on.
+        # Turns run in shard processes (AGENT_SHARDS) are not in per-request profiles.
+        call = functools.partial(contextvars.copy_context().run, profiled_call, fn, *args, **kwargs)
+        future = asyncio.get_running_loop().run_in_executor(self.executor, call)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # Client went away: the thread can't be stopped, so keep the session held until it finishes
+            await asyncio.wait([future])
+            raise
+
+    async def run(self, session_id: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking fn(*args) as the session's next turn"""
+        async with self.turn(session_id):
+            return await self.offload(fn, *args, **kwargs)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "busy_sessions": len(self._slots),
+            "queued_turns": sum(max(0, slot.depth - 1) for slot in self._slots.values()),
+            "completed_turns": self.completed,
+            "max_depth": self.max_depth,
+            "timeout_seconds": self.timeout,
+            "threads": self.threads,
+        }
+
+# Process-wide gate shared by the servers' endpoints
+SESSION_TURNS = SessionTurnGate()
+
+REGISTRY.callback_gauge("session_turns_queued", "Turns waiting for an earlier turn of the same session",
+                        lambda: SESSION_TURNS.get_stats()["queued_turns"])
+
+def get_session_turn_stats() -> Dict[str, Any]:
+    return SESSION_TURNS.get_stats()
@@ -0,0 +1,135 @@
+"""
+Shared Resources - Process-wide clients and immutable agent data
+One pooled OpenAI client and keep-alive HTTP pool per process instead of per session
+"""
+
+import os
+import json
+import threading
+import http.client
+import urllib.parse
+from types import MappingProxyType
+from typing import Dict, Any, Tuple
+
+from metrics import record_cache
+
+# ============================================================================
+# SHARED KNOWLEDGE - read-only, referenced (never copied) by every agent
+# ============================================================================
+
+SHARED_KNOWLEDGE = MappingProxyType({
+    "greeting": ("Hello!", "Hi there!", "Good to see you!", "Welcome!"),
+    "help": "I can help with weather, time, general questions, or just chat! I use AI to understand you better.",
+    "goodbye": ("Goodbye!", "See you later!", "Take care!", "Have a great day!"),
+    "capabilities": "I can check weather, tell time, answer questions using AI, and learn from our conversations."
+})
+
+# ============================================================================
+# POOL SETTINGS
+# ============================================================================
+
+MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "30"))
+
+# ============================================================================
+# SHARED OPENAI CLIENTS
+# ============================================================================
+
+_openai_clients: Dict[Tuple[str, str], Any] = {}
+_clients_lock = threading.Lock()
+
+def get_openai_client(api_key: str, base_url: str = ""):
+    """Return the process-wide OpenAI client for this key (None if unavailable)
+
+    Clients are thread-safe and hold their own httpx connection pool, so one
+    per (api_key, base_url) serves every session.
+    """
+    if not api_key:
+        return None
+
+    key = (api_key, base_url or "")
+    client = _openai_clients.get(key)
+    record_cache("openai_client", client is not None)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _openai_clients.get(key)
+        if client is None:
+            try:
+                import httpx
+                from openai import OpenAI
+            except ImportError:
+                return None
+
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE,
+                    keepalive_expiry=KEEPALIVE_EXPIRY
+                )
+            )
+            kwargs = {"api_key": api_key, "http_client": http_client}
+            if base_url:
+                kwargs["base_url"] = base_url
+            client = OpenAI(**kwargs)
+            _openai_clients[key] = client
+    return client
+
+# ============================================================================
+# KEEP-ALIVE HTTP POOL (tool backends)
+# ============================================================================
+
+_local = threading.local()
+
+def _get_connection(scheme: str, netloc: str, timeout: float) -> http.client.HTTPConnection:
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get((scheme, netloc))
+    record_cache("http_keepalive", conn is not None)
+    if conn is None:
+        conn_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        conn = conn_class(netloc, timeout=timeout)
+        connections[(scheme, netloc)] = conn
+    else:
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+    return conn
+
+def _drop_connection(scheme: str, netloc: str):
+    conn = _local.connections.pop((scheme, netloc), None)
+    if conn is not None:
+        conn.close()
+
+def fetch_json(base_url: str, path: str, params: Dict[str, Any] = None, timeout: float = 5.0) -> Dict[str, Any]:
+    """GET a JSON document over a reused keep-alive connection (raises on HTTP errors)"""
+    parsed = urllib.parse.urlparse(base_url)
+    target = f"{parsed.path.rstrip('/')}{path}"
+    if params:
+        target += "?" + urllib.parse.urlencode(params)
+
+    # A pooled connection may have been closed by the server while idle; retry once on a fresh one
+    for attempt in range(2):
+        conn = _get_connection(parsed.scheme, parsed.netloc, timeout)
+        try:
+            conn.request("GET", target, headers={"Accept": "application/json"})
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            _drop_connection(parsed.scheme, parsed.netloc)
+            if attempt:
+                raise
+            continue
+        except Exception:
+            _drop_connection(parsed.scheme, parsed.netloc)
+            raise
+
+        if response.will_close:
+            _drop_connection(parsed.scheme, parsed.netloc)
+        if response.status >= 400:
+            raise RuntimeError(f"{base_url}{path} returned HTTP {response.status}")
+        return json.loads(body.decode("utf-8"))
@@ -0,0 +1,114 @@
+"""
+Single Flight - Coalesce identical in-flight LLM and tool calls
+The first caller for a key runs the call; concurrent callers with the same key wait and share its result
+"""
+
+import copy
+import json
+import threading
+from typing import Dict, Any, Callable, Hashable, Optional
+
+from metrics import REGISTRY
+
+SINGLE_FLIGHT_CALLS = REGISTRY.counter(
+    "single_flight_calls_total", "Calls through a single-flight group (leader = ran upstream, coalesced = shared)",
+    ("group", "role")
+)
+
+# ============================================================================
+# KEYS
+# ============================================================================
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+def chat_key(**kwargs) -> str:
+    """Key for a chat completion: model, params and whitespace-normalized messages"""
+    messages = [
+        {**message, "content": _normalize_text(message["content"])} if isinstance(message.get("content"), str) else message
+        for message in kwargs.get("messages", [])
+    ]
+    return json.dumps({**kwargs, "messages": messages}, sort_keys=True, default=str)
+
+def tool_key(backend: str, path: str, params: Dict[str, Any]) -> str:
+    normalized = {key: _normalize_text(value).lower() if isinstance(value, str) else value for key, value in params.items()}
+    return json.dumps([backend, path, normalized], sort_keys=True, default=str)
+
+# ============================================================================
+# GROUP
+# ============================================================================
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    """Duplicate suppression for calls that are in flight at the same time
+
+    Nothing is cached: the key is forgotten as soon as the leader finishes, so
+    a later call always goes upstream. Errors are shared too - every waiter of
+    a failed call sees the leader's exception. `copy` (e.g. copy.deepcopy) is
+    applied to the result handed to waiters when it may be mutated.
+    """
+
+    def __init__(self, name: str, copy: Callable[[Any], Any] = None):
+        self.name = name
+        self.copy = copy
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._leaders = SINGLE_FLIGHT_CALLS.labels(name, "leader")
+        self._coalesced = SINGLE_FLIGHT_CALLS.labels(name, "coalesced")
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """Run fn(*args, **kwargs) unless an identical call is already running in another thread"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            self._coalesced.inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return self.copy(call.result) if self.copy else call.result
+
+        self._leaders.inc()
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        leaders, coalesced = self._leaders.get(), self._coalesced.get()
+        return {
+            "in_flight": len(self._calls),
+            "upstream_calls": int(leaders),
+            "coalesced_calls": int(coalesced),
+            "coalesced_ratio": round(coalesced / (leaders + coalesced), 4) if leaders + coalesced else 0.0,
+        }
+
+# ============================================================================
+# SHARED GROUPS
+# ============================================================================
+
+# Completion objects are read-only to callers; tool JSON ends up in per-session state, so waiters get copies
+LLM_CALLS = SingleFlight("llm")
+TOOL_CALLS = SingleFlight("tool", copy=copy.deepcopy)
+
+def get_single_flight_stats() -> Dict[str, Dict[str, Any]]:
+    return {group.name: group.get_stats() for group in (LLM_CALLS, TOOL_CALLS)}
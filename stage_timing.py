@@ -0,0 +1,66 @@
+"""
+Stage Timing - Per-stage latency breakdown for the agent loop
+Sampled turns record each stage into process-wide histograms; unsampled turns pay one check
+"""
+
+import os
+import random
+from time import perf_counter_ns
+from collections import defaultdict
+from typing import Dict, Any, Optional
+
+from histograms import LatencyHistogram
+
+class TurnTiming:
+    """Lap timer for one sampled turn"""
+
+    __slots__ = ("timer", "laps", "_last", "_start")
+
+    def __init__(self, timer: "StageTimer"):
+        self.timer = timer
+        self.laps = []
+        self._start = self._last = perf_counter_ns()
+
+    def lap(self, stage: str):
+        """Close the stage that just ran"""
+        now = perf_counter_ns()
+        self.laps.append((stage, now - self._last))
+        self._last = now
+
+    def finish(self) -> Dict[str, float]:
+        """Record every lap into the histograms and return this turn's breakdown (ms)"""
+        total_ns = self._last - self._start
+        breakdown = {}
+        for stage, elapsed_ns in self.laps:
+            self.timer.histograms[stage].observe(elapsed_ns / 1e9)
+            breakdown[stage] = round(elapsed_ns / 1e6, 4)
+        self.timer.histograms["total"].observe(total_ns / 1e9)
+        breakdown["total"] = round(total_ns / 1e6, 4)
+        return breakdown
+
+class StageTimer:
+    """Process-wide stage histograms with a sampling rate (0 disables timing)"""
+
+    def __init__(self, sample_rate: float = 1.0):
+        self.sample_rate = sample_rate
+        self.histograms: Dict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+
+    def start_turn(self) -> Optional[TurnTiming]:
+        """Begin timing a turn, or return None if this turn isn't sampled"""
+        rate = self.sample_rate
+        if rate <= 0.0 or (rate < 1.0 and random.random() >= rate):
+            return None
+        return TurnTiming(self)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "stages": {stage: histogram.snapshot() for stage, histogram in list(self.histograms.items())}
+        }
+
+    def reset(self):
+        for histogram in list(self.histograms.values()):
+            histogram.reset()
+
+# Shared by every EnhancedAIAgent in the process
+AGENT_STAGE_TIMER = StageTimer(float(os.getenv("STAGE_TIMING_SAMPLE_RATE", "1.0")))
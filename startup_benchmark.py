@@ -0,0 +1,177 @@
+"""
+Startup Benchmark - Import time and time-to-first-/health for agents and servers
+Cold-start numbers checked against a tracked budget (startup_budget.json)
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+from typing import Dict, Any, List
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET = os.path.join(REPO_DIR, "startup_budget.json")
+
+IMPORT_TARGETS = ["enhanced_ai_agent", "full_langgraph_agent", "chat_server", "langgraph_chat_server"]
+SERVER_TARGETS = ["chat_server", "langgraph_chat_server"]
+
+# ============================================================================
+# IMPORT TIME
+# ============================================================================
+
+def measure_import(module: str, runs: int = 5) -> Dict[str, Any]:
+    """Import a module in fresh interpreters and report the median wall time"""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed"}
+        samples.append(float(proc.stdout.strip().splitlines()[-1]))
+    return {
+        "median_seconds": statistics.median(samples),
+        "min_seconds": min(samples),
+        "slowest_imports": slowest_imports(module)
+    }
+
+def slowest_imports(module: str, top: int = 5) -> List[Dict[str, Any]]:
+    """Parse `python -X importtime` and rank every import, nested ones included, by self time
+
+    Cumulative time only says that the target (or site) is slow; self time
+    points at the module whose own body is expensive.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=REPO_DIR, capture_output=True, text=True)
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # Header line
+        self_us, cumulative_us, name = parts
+        entries.append({"module": name.strip(), "self_ms": int(self_us) / 1000.0,
+                        "cumulative_ms": int(cumulative_us) / 1000.0})
+    entries.sort(key=lambda entry: entry["self_ms"], reverse=True)
+    return entries[:top]
+
+# ============================================================================
+# TIME TO FIRST /health 200
+# ============================================================================
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_health(module: str, timeout: float = 30.0) -> Dict[str, Any]:
+    """Launch `uvicorn module:app` and time until GET /health first returns 200"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                return {"error": (proc.stderr.read().strip().splitlines() or ["server exited"])[-1]}
+            try:
+                with urllib.request.urlopen(url, timeout=1.0) as response:
+                    if response.status == 200:
+                        return {"seconds": time.perf_counter() - start}
+            except OSError:
+                time.sleep(0.01)
+        return {"error": f"no /health 200 within {timeout}s"}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+# ============================================================================
+# BUDGET CHECK
+# ============================================================================
+
+def check_budget(results: Dict[str, Any], budget: Dict[str, Any]) -> List[str]:
+    """Return a list of budget violations (empty if everything fits)
+
+    A budgeted measurement that failed counts as a violation; only /health
+    checks skipped on purpose (--skip-health) are left out.
+    """
+    violations = []
+    for module, limit in budget.get("import_seconds", {}).items():
+        data = results["imports"].get(module, {"error": "not measured"})
+        measured = data.get("median_seconds")
+        if measured is None:
+            violations.append(f"import {module}: measurement failed ({data.get('error', 'no result')})")
+        elif measured > limit:
+            violations.append(f"import {module}: {measured:.3f}s > {limit:.3f}s")
+    if results["health"]:
+        for module, limit in budget.get("health_seconds", {}).items():
+            data = results["health"].get(module, {"error": "not measured"})
+            measured = data.get("seconds")
+            if measured is None:
+                violations.append(f"/health {module}: measurement failed ({data.get('error', 'no result')})")
+            elif measured > limit:
+                violations.append(f"/health {module}: {measured:.3f}s > {limit:.3f}s")
+    return violations
+
+def run_benchmark(runs: int = 5, skip_health: bool = False) -> Dict[str, Any]:
+    results = {"python": sys.version.split()[0], "imports": {}, "health": {}}
+    for module in IMPORT_TARGETS:
+        results["imports"][module] = measure_import(module, runs)
+    if not skip_health:
+        for module in SERVER_TARGETS:
+            results["health"][module] = measure_health(module)
+    return results
+
+def print_summary(results: Dict[str, Any], violations: List[str]):
+    print("🚀 Startup Benchmark")
+    print("=" * 50)
+    for module, data in results["imports"].items():
+        if "error" in data:
+            print(f"  import {module:<24} ❌ {data['error']}")
+            continue
+        heavy = ", ".join(f"{entry['module']} {entry['self_ms']:.0f}ms" for entry in data["slowest_imports"][:3])
+        print(f"  import {module:<24} {data['median_seconds'] * 1000:8.1f} ms   (slowest self: {heavy})")
+    for module, data in results["health"].items():
+        if "error" in data:
+            print(f"  /health {module:<23} ❌ {data['error']}")
+        else:
+            print(f"  /health {module:<23} {data['seconds'] * 1000:8.1f} ms")
+    print()
+    if violations:
+        print("❌ Over budget:")
+        for violation in violations:
+            print(f"   • {violation}")
+    else:
+        print("✅ Within startup budget")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import time and time to first /health 200")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per import measurement")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="budget JSON file")
+    parser.add_argument("--output", help="write results JSON here for tracking")
+    parser.add_argument("--skip-health", action="store_true", help="only measure imports")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.runs, args.skip_health)
+    with open(args.budget, "r", encoding="utf-8") as f:
+        budget = json.load(f)
+    violations = check_budget(results, budget)
+    results["violations"] = violations
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    print_summary(results, violations)
+    sys.exit(1 if violations else 0)
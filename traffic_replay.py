@@ -0,0 +1,261 @@
+"""
+Traffic Replay - Replay recorded JSONL chat traffic against a candidate server
+Honors recorded inter-arrival times (with a speed multiplier) and per-session ordering; writes results for diffing
+"""
+
+import sys
+import gzip
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from datetime import datetime
+from typing import Dict, Any, Iterator, Optional
+
+from load_test import HTTPConnectionPool, http_request, percentile
+
+# ============================================================================
+# INPUT
+# ============================================================================
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream records from JSONL (.gz ok, '-' for stdin)"""
+    if path == "-":
+        source = sys.stdin
+    elif path.endswith(".gz"):
+        source = gzip.open(path, "rt", encoding="utf-8")
+    else:
+        source = open(path, "r", encoding="utf-8")
+    try:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+def record_offset(record: Dict[str, Any]) -> Optional[float]:
+    """Arrival time in seconds: offset_seconds, or an ISO/epoch timestamp"""
+    if "offset_seconds" in record:
+        return float(record["offset_seconds"])
+    timestamp = record.get("timestamp")
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        return datetime.fromisoformat(timestamp).timestamp()
+    return None
+
+def record_message(record: Dict[str, Any]) -> str:
+    return record.get("message", record.get("body", ""))
+
+def extract_response(endpoint: str, body: bytes) -> str:
+    """Agent reply text from a JSON or SSE response body"""
+    text = body.decode("utf-8", errors="replace")
+    if not endpoint.endswith("/stream"):
+        try:
+            return json.loads(text).get("response", "")
+        except (ValueError, AttributeError):
+            return text
+    parts = []
+    for line in text.splitlines():
+        if line.startswith("data: "):
+            try:
+                event = json.loads(line[6:])
+            except ValueError:
+                continue
+            if event.get("type") == "text":
+                parts.append(event.get("content", ""))
+    return "".join(parts).strip()
+
+# ============================================================================
+# REPLAY
+# ============================================================================
+
+class TrafficReplayer:
+    """Schedules records at their recorded offsets; one ordered worker per active session"""
+
+    def __init__(self, base_url: str, endpoint: str = "/chat", speed: float = 1.0,
+                 concurrency: int = 256, max_pending: int = 10000, timeout: float = 60.0):
+        self.pool = HTTPConnectionPool(base_url)
+        self.endpoint = endpoint
+        self.speed = speed                      # 2.0 = twice as fast; 0 = no delays
+        self.limiter = asyncio.Semaphore(concurrency)
+        self.max_pending = max_pending          # Queued + in-flight records before reading pauses
+        self.timeout = timeout
+        self.sessions: Dict[str, asyncio.Queue] = {}
+        self.pending = 0
+        self.drained = asyncio.Condition()
+        self.results: list = []
+        self.output = None
+
+    async def _send(self, record: Dict[str, Any], scheduled: float) -> Dict[str, Any]:
+        endpoint = record.get("endpoint", self.endpoint)
+        session_id = record.get("session_id", "default")
+        async with self.limiter:
+            sent = time.perf_counter()
+            replay = {"send_lag_ms": round((sent - scheduled) * 1000, 3)}
+            try:
+                result = await asyncio.wait_for(
+                    http_request(self.pool, "POST", endpoint, {"message": record_message(record), "session_id": session_id}),
+                    self.timeout
+                )
+                replay.update({
+                    "status": result["status"],
+                    "latency_ms": round(result["latency"] * 1000, 3),
+                    "ttfb_ms": round(result["ttfb"] * 1000, 3),
+                    "response": extract_response(endpoint, result["body"]),
+                })
+            except asyncio.TimeoutError:
+                replay.update({"status": 0, "error": "timeout", "latency_ms": round(self.timeout * 1000, 3)})
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                replay.update({"status": 0, "error": type(e).__name__,
+                               "latency_ms": round((time.perf_counter() - sent) * 1000, 3)})
+        return {**record, "replay": replay}
+
+    async def _finished(self, count: int = 1):
+        async with self.drained:
+            self.pending -= count
+            self.drained.notify_all()
+
+    async def _session_worker(self, session_id: str, queue: asyncio.Queue):
+        # Turns of one session run strictly in recorded order
+        try:
+            while True:
+                try:
+                    record, scheduled = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    try:
+                        result = await self._send(record, scheduled)
+                    except Exception as e:
+                        # e.g. an unexpected response shape: record it, keep replaying the session
+                        result = {**record, "replay": {"status": 0, "error": f"{type(e).__name__}: {e}"}}
+                    self._emit(result)
+                finally:
+                    await self._finished()
+        finally:
+            # Also when the worker dies (e.g. the output can't be written): records left in the
+            # queue must release their pending slots, or replay() blocks at max_pending
+            del self.sessions[session_id]
+            if queue.qsize():
+                await self._finished(queue.qsize())
+
+    def _emit(self, result: Dict[str, Any]):
+        replay = result["replay"]
+        # Keep only numbers (and a mismatch flag) so summaries of huge replays stay small
+        recorded = result.get("response")
+        mismatch = None if recorded is None else recorded != replay.get("response")
+        self.results.append((replay.get("latency_ms"), replay.get("status"), replay.get("send_lag_ms"),
+                             result.get("latency_ms"), mismatch))
+        if self.output:
+            self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    async def replay(self, records: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        first_offset = None
+        workers = []
+
+        for record in records:
+            offset = record_offset(record)
+            if offset is not None and first_offset is None:
+                first_offset = offset
+            scheduled = time.perf_counter()
+            if self.speed > 0 and offset is not None:
+                scheduled = start + (offset - first_offset) / self.speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            async with self.drained:
+                await self.drained.wait_for(lambda: self.pending < self.max_pending)
+                self.pending += 1
+
+            session_id = record.get("session_id", "default")
+            queue = self.sessions.get(session_id)
+            if queue is None:
+                queue = self.sessions[session_id] = asyncio.Queue()
+                queue.put_nowait((record, scheduled))
+                workers.append(asyncio.create_task(self._session_worker(session_id, queue)))
+                if len(workers) > 4096:
+                    workers = [worker for worker in workers if not worker.done()]
+            else:
+                queue.put_nowait((record, scheduled))
+
+        await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - start
+        await self.pool.close()
+        return self.summary(elapsed)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        latencies = [row[0] for row in self.results if row[1] and row[1] < 400]
+        lags = [row[2] for row in self.results if row[2] is not None]
+        errors = sum(1 for row in self.results if not row[1] or row[1] >= 400)
+        summary = {
+            "requests": len(self.results),
+            "elapsed_seconds": round(elapsed, 3),
+            "rps": round(len(self.results) / elapsed, 2) if elapsed else 0.0,
+            "errors": errors,
+            "latency_ms": {f"p{p}": percentile(latencies, p) for p in (50, 95, 99)},
+            "send_lag_ms": {f"p{p}": percentile(lags, p) for p in (50, 99)},
+        }
+
+        # Diff against the recorded run when the input carries its latencies/responses
+        paired = [(row[3], row[0]) for row in self.results if row[3] is not None and row[0] is not None]
+        if paired:
+            summary["original_latency_ms"] = {f"p{p}": percentile([old for old, _ in paired], p) for p in (50, 95, 99)}
+            summary["latency_ratio_p50"] = round(percentile([new / old for old, new in paired if old > 0], 50) or 0, 3)
+        compared = [row[4] for row in self.results if row[4] is not None]
+        if compared:
+            summary["response_mismatches"] = sum(compared)
+        return summary
+
+def print_summary(summary: Dict[str, Any]):
+    print("🔁 Traffic Replay")
+    print("=" * 50)
+    print(f"  {summary['requests']} requests in {summary['elapsed_seconds']:.2f}s ({summary['rps']:.1f} req/s), "
+          f"{summary['errors']} errors")
+    latency = summary["latency_ms"]
+    print(f"  latency p50/p95/p99: {latency['p50']} / {latency['p95']} / {latency['p99']} ms")
+    print(f"  send lag p50/p99:    {summary['send_lag_ms']['p50']} / {summary['send_lag_ms']['p99']} ms")
+    if "original_latency_ms" in summary:
+        original = summary["original_latency_ms"]
+        print(f"  original p50/p95/p99: {original['p50']} / {original['p95']} / {original['p99']} ms "
+              f"(median ratio {summary['latency_ratio_p50']}x)")
+    if "response_mismatches" in summary:
+        print(f"  responses differing from recording: {summary['response_mismatches']}")
+
+async def main(args) -> Dict[str, Any]:
+    replayer = TrafficReplayer(args.url, args.endpoint, args.speed, args.concurrency, args.max_pending, args.timeout)
+    records = read_records(args.input)
+    if args.limit:
+        records = itertools.islice(records, args.limit)
+    if args.output:
+        replayer.output = gzip.open(args.output, "wt", encoding="utf-8") if args.output.endswith(".gz") \
+            else open(args.output, "w", encoding="utf-8")
+    try:
+        return await replayer.replay(records)
+    finally:
+        if replayer.output:
+            replayer.output.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded JSONL traffic against a chat server")
+    parser.add_argument("input", help="JSONL records (body/message, session_id, offset_seconds or timestamp)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="chat_server or langgraph_chat_server base URL")
+    parser.add_argument("--endpoint", default="/chat", help="default endpoint when a record has none")
+    parser.add_argument("--speed", type=float, default=1.0, help="time multiplier (2 = twice as fast, 0 = no waits)")
+    parser.add_argument("--concurrency", type=int, default=256, help="max requests in flight")
+    parser.add_argument("--max-pending", type=int, default=10000, help="queued records before reading pauses")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--limit", type=int, help="replay only the first N records")
+    parser.add_argument("--output", help="results JSONL: each input record plus a 'replay' object")
+    parser.add_argument("--summary", help="write the summary JSON here")
+    args = parser.parse_args()
+
+    summary = asyncio.run(main(args))
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    print_summary(summary)